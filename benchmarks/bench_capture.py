@@ -0,0 +1,60 @@
+"""
+Batch capture latency of the in-process capture engine.
+
+Uses ``FileCamera`` fake devices, so it runs anywhere. Point ``--frames`` at a
+directory of sample JPEGs, otherwise random 300 KB blobs are served. Use
+``--delay`` to mimic per-frame device latency. Run from the repository root:
+
+    python benchmarks/bench_capture.py --frames samples/ --cameras 3 --batches 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from gatex_camera import CaptureEngine, FileCamera  # noqa: E402
+from gatex_metrics import percentile  # noqa: E402
+
+
+def load_frames(directory):
+    if not directory:
+        return [os.urandom(300 * 1024) for _ in range(4)]
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.lower().endswith(('.jpg', '.jpeg'))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--frames', help="Directory of sample JPEGs")
+    parser.add_argument('--cameras', type=int, default=3)
+    parser.add_argument('--batches', type=int, default=50)
+    parser.add_argument('--delay', type=float, default=0.03, help="Seconds per frame grab")
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames)
+    cameras = {f"camera{i + 1}": FileCamera(frames, delay=args.delay) for i in range(args.cameras)}
+    engine = CaptureEngine(cameras)
+
+    latencies = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for batch_id in range(args.batches):
+            paths = {name: os.path.join(out_dir, f"000111batch{batch_id}{name}_bench.jpeg")
+                     for name in cameras}
+            start = time.perf_counter()
+            engine.capture(paths)
+            latencies.append(time.perf_counter() - start)
+    engine.close()
+
+    print(f"cameras {args.cameras}  batches {args.batches}  "
+          f"p50 {percentile(latencies, 50) * 1000:.1f}ms  "
+          f"p99 {percentile(latencies, 99) * 1000:.1f}ms  "
+          f"mean {statistics.mean(latencies) * 1000:.1f}ms  "
+          f"(sequential grabs would take {args.cameras * args.delay * 1000:.1f}ms)")
+
+
+if __name__ == '__main__':
+    main()
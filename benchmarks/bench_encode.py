@@ -0,0 +1,57 @@
+"""
+Bytes saved and encode time of the per-camera encoding profiles.
+
+Runs every JPEG in a sample corpus through each profile used by
+``push button.py``. Needs Pillow. Run from the repository root:
+
+    python benchmarks/bench_encode.py samples/
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from gatex_encode import EncodeProfile, encode_bytes  # noqa: E402
+
+PROFILES = {
+    'id_card': EncodeProfile(max_size=(1280, 720), quality=85, grayscale=True),
+    'face': EncodeProfile(max_size=(1280, 720), quality=80),
+    'plate': EncodeProfile(max_size=(1280, 720), quality=85),
+    'id_card_roi': EncodeProfile(max_size=(1280, 720), quality=85, grayscale=True,
+                                 crop=(0.2, 0.2, 0.8, 0.8)),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('corpus', help="Directory of sample JPEGs")
+    args = parser.parse_args()
+
+    corpus = []
+    for name in sorted(os.listdir(args.corpus)):
+        if name.lower().endswith(('.jpg', '.jpeg')):
+            with open(os.path.join(args.corpus, name), 'rb') as file:
+                corpus.append(file.read())
+    if not corpus:
+        sys.exit(f"No JPEGs found in {args.corpus}")
+
+    original = sum(len(data) for data in corpus)
+    print(f"{len(corpus)} images, {original / len(corpus) / 1024:.0f} KB average")
+    for name, profile in PROFILES.items():
+        timings = []
+        encoded = 0
+        for data in corpus:
+            start = time.perf_counter()
+            encoded += len(encode_bytes(data, profile))
+            timings.append(time.perf_counter() - start)
+        print(f"{name:<12} {encoded / len(corpus) / 1024:7.0f} KB avg  "
+              f"saved {1 - encoded / original:6.1%}  "
+              f"encode p50 {statistics.median(timings) * 1000:6.1f}ms  "
+              f"max {max(timings) * 1000:6.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
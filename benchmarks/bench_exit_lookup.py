@@ -0,0 +1,113 @@
+"""
+Exit matching cost: full scan of open visits vs. the indexed name_key lookup.
+
+Seeds a scratch ``trans`` table with ``--open-rows`` open visits on one device
+and times both strategies over ``--lookups`` exits. Needs a local MySQL and
+mysql-connector-python; everything happens in the ``--database`` scratch
+schema, which is created if missing. Run from the repository root:
+
+    DB_HOST=127.0.0.1 DB_USER=root DB_PASSWORD=secret \
+        python benchmarks/bench_exit_lookup.py --open-rows 10000
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from gatex_metrics import percentile  # noqa: E402
+from gatex_names import extract_name_details, name_key  # noqa: E402
+
+DEVICE_ID = '000111'
+
+
+def random_name():
+    return ''.join(random.choice(string.ascii_uppercase) for _ in range(random.randint(5, 14)))
+
+
+def seed(cursor, conn, open_rows):
+    cursor.execute("DROP TABLE IF EXISTS trans")
+    cursor.execute("""
+        CREATE TABLE trans (
+            device_id VARCHAR(6), batch_id INT, date DATE, entry_time TIME, exit_time TIME NULL,
+            visitor_ID_Details TEXT, name_key VARCHAR(10) NULL,
+            INDEX idx_trans_exit_lookup (device_id, name_key, exit_time)
+        )
+    """)
+    names = [random_name() for _ in range(open_rows)]
+    rows = []
+    for batch_id, name in enumerate(names):
+        text = f"GOVERNMENT OF INDIA Name: {name} DOB 01/01/1990"
+        rows.append((DEVICE_ID, batch_id, '2024-01-01', '09:00:00', text, name_key(text)))
+    cursor.executemany("""
+        INSERT INTO trans (device_id, batch_id, date, entry_time, visitor_ID_Details, name_key)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, rows)
+    conn.commit()
+    return names
+
+
+def scan_lookup(cursor, name):
+    # The pre-index strategy: fetch every open visit and parse it in Python
+    target = extract_name_details(f"Name: {name}")
+    cursor.execute("SELECT batch_id, visitor_ID_Details FROM trans WHERE device_id = %s AND exit_time IS NULL",
+                   (DEVICE_ID,))
+    for batch_id, text in cursor.fetchall():
+        existing = extract_name_details(text)
+        if existing and existing[:10] == target[:10]:
+            return batch_id
+    return None
+
+
+def indexed_lookup(cursor, name):
+    cursor.execute("""
+        SELECT batch_id FROM trans
+        WHERE device_id = %s AND name_key = %s AND exit_time IS NULL
+        ORDER BY date DESC, entry_time DESC LIMIT 1
+    """, (DEVICE_ID, name_key(f"Name: {name}")))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def timed(fn, cursor, names):
+    timings = []
+    for name in names:
+        start = time.perf_counter()
+        fn(cursor, name)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--open-rows', type=int, default=10000)
+    parser.add_argument('--lookups', type=int, default=200)
+    parser.add_argument('--database', default='gatex_bench')
+    args = parser.parse_args()
+
+    import mysql.connector
+    conn = mysql.connector.connect(host=os.environ.get('DB_HOST', '127.0.0.1'),
+                                   user=os.environ.get('DB_USER', 'root'),
+                                   password=os.environ.get('DB_PASSWORD', ''))
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS {args.database}")
+    cursor.execute(f"USE {args.database}")
+
+    names = seed(cursor, conn, args.open_rows)
+    probes = random.sample(names, min(args.lookups, len(names)))
+    for label, fn in (('scan', scan_lookup), ('indexed', indexed_lookup)):
+        timings = timed(fn, cursor, probes)
+        print(f"{label:<8} open_rows {args.open_rows}  "
+              f"p50 {percentile(timings, 50) * 1000:8.2f}ms  "
+              f"p99 {percentile(timings, 99) * 1000:8.2f}ms  "
+              f"mean {statistics.mean(timings) * 1000:8.2f}ms")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Match quality and latency of the fuzzy exit matcher on real visitor names.
+
+Simulates ``--devices`` gates, each with ``--open`` open visits whose names
+are drawn from a corpus of common first names (name_key only keeps the first
+name, so near-identical keys such as MOHAMMED/MOHAMMAD are routine). Every
+gate is probed with exits whose names went through simulated OCR noise
+(confusable substitutions, dropped and inserted characters), and with new
+visitors whose name has no open visit there. Reports how often each rule
+closes the right visit, closes the wrong person's visit, and matches a new
+visitor to someone else's visit (the costly error: that visit is closed and
+the new entry lost), for the plain trigram threshold and for
+ExitMatcher.pick. Pure Python, run from the repository root:
+
+    python benchmarks/bench_exit_matcher.py --open 60 --devices 200
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from gatex_matcher import ExitMatcher, TrigramIndex, ocr_distance  # noqa: E402
+from gatex_metrics import percentile  # noqa: E402
+from gatex_names import NAME_KEY_LENGTH  # noqa: E402
+
+# Common first names at the sites, with the spelling variants that make exit matching hard
+NAMES = """
+MOHAMMED MOHAMMAD MUHAMMED MUHAMMAD MOHAMED AHMED AHMAD ALI ABDULLAH ABDUL OMAR UMAR YUSUF YOUSEF IBRAHIM
+HASSAN HUSSAIN HUSSEIN KHALID KHALED SAEED SAID FAISAL FAHAD SULTAN HAMAD HAMID HAMZA IMRAN IRFAN ASIF
+AMIR AAMIR SALMAN SULAIMAN RASHID RASHEED NASSER NASIR TARIQ ZAYED ZAID MUSTAFA MOSTAFA MAHMOUD YASIR
+FATIMA FATMA AISHA AYESHA MARIAM MARYAM NOOR NOORA SARA SARAH HANA HINA ZAINAB ZEINAB LAILA LEILA SALMA
+RAJESH RAJESHKUMAR RAJ RAJU RAMESH SURESH MAHESH MUKESH DINESH GANESH NARESH RITESH HITESH PARESH
+RAHUL ROHIT ROHAN MOHAN SOHAN AMIT SUMIT ANKIT ANKITA ANITA SUNITA SUNIL ANIL KAPIL NIKHIL AKHIL
+PRIYA PRIYANKA PRIYANKAA DEEPA DEEPAK DEEPIKA POOJA PUJA NEHA SNEHA REKHA LEKHA KAVITA KAVYA DIVYA
+SHARMA SHARMILA SHARMIN SANJAY SANJEEV SANJANA VIJAY AJAY VINAY VINOD PRAMOD PRAKASH AKASH VIKAS
+ARJUN KARAN KIRAN KUNAL VISHAL VIKRAM VIKRANT SACHIN SAGAR SAMEER SAMIR SHAHID SHAHEED JAVED ZAHID
+MANOJ SAROJ SANTOSH SATISH HARISH GIRISH SRINIVAS SRINIVASAN VENKAT VENKATESH GOPAL GOVIND ARVIND
+LAKSHMI LAXMI MEENA MEERA NEELAM SEEMA REENA RINA TINA GEETA GITA SITA SAVITA LALITA ANJALI ANJU
+JOSE JOSEPH JOHN JUAN MARK MARC MARIA MARIE ANNA ANNE JOY JOEL JOSHUA RICHARD ROBERT ROBERTO RAMON
+MICHAEL MICHELLE DANIEL DANIELA CHRISTOPHER CHRISTIAN KRISTINE CHRISTINE JENNIFER JEFFREY ANGELO ANGELA
+""".split()
+
+CONFUSIONS = {'O': '0', 'I': '1', 'S': '5', 'B': '8', 'Z': '2', 'G': '6', 'E': 'F', 'M': 'N', 'U': 'V',
+              'L': 'I', 'D': 'O', 'R': 'P'}
+
+
+def key(name):
+    return name[:NAME_KEY_LENGTH]
+
+
+def ocr_noise(name, errors, rng):
+    """Misread ``name`` the way OCR does: mostly confusable swaps, sometimes a dropped or extra letter."""
+    chars = list(name)
+    for _ in range(errors):
+        op = rng.random()
+        pos = rng.randrange(len(chars))
+        if op < 0.7:
+            chars[pos] = CONFUSIONS.get(chars[pos], rng.choice(string.ascii_uppercase))
+        elif op < 0.85 and len(chars) > 4:
+            del chars[pos]
+        else:
+            chars.insert(pos, rng.choice(string.ascii_uppercase))
+    return key(''.join(chars))
+
+
+def plain_rule(threshold):
+    def match(index, probe):
+        return index.search(probe, threshold, limit=1)
+    return match
+
+
+def evaluate(match, gates):
+    """Rates of right visit, wrong person and stranger matches of ``match(index, probe)`` over ``gates``."""
+    right = wrong = strangers = false_matches = probes = 0
+    confusable = confusable_right = 0
+    latencies = []
+    for index, names, exits, newcomers in gates:
+        for true_name, probe in exits:
+            start = time.perf_counter()
+            result = match(index, probe)
+            latencies.append(time.perf_counter() - start)
+            probes += 1
+            # Misreads made only of confusable letter swaps, the common OCR failure
+            only_swaps = ocr_distance(probe, true_name, plain_cost=2.0) <= 1.0
+            confusable += only_swaps
+            if result and names[result[0][1]] == true_name:
+                right += 1
+                confusable_right += only_swaps
+            elif result:
+                wrong += 1
+        for probe in newcomers:
+            strangers += 1
+            if match(index, probe):
+                false_matches += 1
+    return (right / probes, confusable_right / max(1, confusable), wrong / probes,
+            false_matches / max(1, strangers), latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--open', type=int, default=60, help="Open visits per device")
+    parser.add_argument('--probes', type=int, default=20, help="Noisy exits per device")
+    parser.add_argument('--strangers', type=int, default=20, help="New visitors per device")
+    parser.add_argument('--errors', type=int, default=1, help="OCR errors per probe")
+    parser.add_argument('--threshold', type=float, default=0.6, help="Similarity of the plain trigram rule")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    # Exits whose misread happens to equal their own key would take the exact path, so they are not probes
+    gates = []
+    for _ in range(args.devices):
+        index = TrigramIndex()
+        names = {}
+        for batch_id in range(args.open):
+            name = rng.choice(NAMES)
+            names[str(batch_id)] = key(name)
+            index.add(str(batch_id), key(name))
+        open_names = set(names.values())
+        exits = []
+        while len(exits) < args.probes:
+            true_name = names[rng.choice(list(names))]
+            probe = ocr_noise(true_name, args.errors, rng)
+            if probe not in open_names:
+                exits.append((true_name, probe))
+        absent = [key(name) for name in NAMES if key(name) not in open_names]
+        newcomers = [rng.choice(absent) for _ in range(args.strangers)] if absent else []
+        gates.append((index, names, exits, newcomers))
+
+    matcher = ExitMatcher()
+    print(f"{args.devices} devices x {args.open} open visits, {len(NAMES)} distinct names, "
+          f"{args.errors} OCR error(s) per exit")
+    for label, match in ((f"trigram >= {args.threshold}", plain_rule(args.threshold)),
+                         (f"ExitMatcher (>= {matcher.threshold}, ocr distance <= {matcher.max_distance}, "
+                          f"margin {matcher.margin})", matcher.pick)):
+        right, confusable_right, wrong, false_matches, latencies = evaluate(match, gates)
+        print(f"{label}")
+        print(f"  exits matched to the right visitor {right:6.1%}   to another visitor {wrong:6.1%}")
+        print(f"  confusable-letter misreads matched {confusable_right:6.1%}")
+        print(f"  new visitors taken for an exit     {false_matches:6.1%}")
+        print(f"  lookup p50 {percentile(latencies, 50) * 1000:.3f}ms  "
+              f"p99 {percentile(latencies, 99) * 1000:.3f}ms")
+
+
+if __name__ == '__main__':
+    main()
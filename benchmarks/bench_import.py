@@ -0,0 +1,92 @@
+"""
+Cold start import profile of the two Lambdas, from ``python -X importtime``.
+
+Imports sqlRekognitionLambda and gatex-email-notification ``--runs`` times,
+each in a fresh interpreter with ``-X importtime`` and dummy DB settings,
+the way a new Lambda container runs the module's init. Reports the median
+wall time of the import and the ``--top`` slowest modules by cumulative
+import time, so a heavy dependency creeping back into module scope shows
+up. Nothing connects to AWS or MySQL. Run from the repository root:
+
+    python benchmarks/bench_import.py --runs 10
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Runs a Lambda file's module code the way the runtime's init does and prints how long it took. The marker on
+# stderr separates the Lambda's own imports from the interpreter's startup imports.
+LOADER = """
+import importlib.util, sys, time
+spec = importlib.util.spec_from_file_location('lambda_under_test', {path!r})
+module = importlib.util.module_from_spec(spec)
+sys.stderr.write('-- init --\\n')
+start = time.perf_counter()
+spec.loader.exec_module(module)
+print(f'init_ms={{(time.perf_counter() - start) * 1000:.3f}}')
+"""
+LAMBDAS = ('sqlRekognitionLambda.py', 'gatex-email-notification.py')
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+LAMBDA_ENV = {
+    'DB_HOST': '127.0.0.1', 'DB_USER': 'bench', 'DB_PASSWORD': 'bench', 'DB_DATABASE': 'bench',
+    'DB_NAME': 'bench', 'AWS_DEFAULT_REGION': 'us-east-1', 'SES_SENDER_EMAIL': 'bench@example.com',
+}
+
+
+def profile(path):
+    """
+    Import once in a fresh interpreter.
+
+    :return: ``(init_ms, {module: (self_us, cumulative_us, depth)})``
+    """
+    env = dict(os.environ, **LAMBDA_ENV)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', LOADER.format(path=path)],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(result.stderr.strip().splitlines()[-1])
+    modules = {}
+    for line in result.stderr.split('-- init --', 1)[-1].splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+    init_ms = float(re.search(r'init_ms=([\d.]+)', result.stdout).group(1))
+    return init_ms, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=12)
+    args = parser.parse_args()
+
+    for name in LAMBDAS:
+        timings = []
+        cumulative = {}
+        loaded = set()
+        for _ in range(args.runs):
+            init_ms, modules = profile(name)
+            timings.append(init_ms)
+            loaded.update(module.split('.')[0] for module in modules)
+            for module, (_, cumulative_us, depth) in modules.items():
+                if depth == 0:  # Imported by the Lambda itself, not by one of its dependencies
+                    cumulative.setdefault(module, []).append(cumulative_us)
+        print(f"{name}: init p50 {statistics.median(timings):.1f}ms, max {max(timings):.1f}ms "
+              f"over {args.runs} fresh interpreters")
+        heaviest = sorted(cumulative.items(), key=lambda item: -statistics.median(item[1]))[:args.top]
+        for module, values in heaviest:
+            print(f"  {statistics.median(values) / 1000:8.1f}ms  {module}")
+        for heavy in ('boto3', 'PIL', 'mysql'):
+            if heavy in loaded:
+                print(f"  note: {heavy} is imported at module load")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Overstay notifier run time and database round trips against the number of alerts.
+
+For each ``--alerts`` size, seeds a scratch database (created from
+sql/schema.sql) with that many overdue visits and their due alerts spread over ``--customers``
+customers, then runs gatex-email-notification's check_and_send_messages
+against a stub SES client that answers after ``--ses-latency`` ms. Also
+times the old one-UPDATE-and-commit-per-alert loop on the same rows for
+comparison. Needs a local MySQL, mysql-connector-python and
+python-dateutil. Run from the repository root:
+
+    DB_HOST=127.0.0.1 DB_USER=root DB_PASSWORD=secret \
+        python benchmarks/bench_notifier.py --alerts 10 100 1000 10000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+
+
+def seed(database, alerts, customers):
+    harness.create_schema(database)
+    conn = harness.connect(database)
+    cursor = conn.cursor()
+    for customer in range(customers):
+        devices = json.dumps([customer * 10 + n for n in range(3)])
+        cursor.execute("INSERT INTO customer_master (customer_id, device_id, contact_person_emailID) VALUES (%s, %s, %s)",
+                       (f"C{customer}", devices, f"customer{customer}@example.com"))
+        cursor.execute("INSERT INTO location_master (customer_id, device_id, project_name, building_name) "
+                       "VALUES (%s, %s, %s, %s)", (f"C{customer}", devices, f"Project {customer}", "Tower A"))
+    cursor.executemany("""
+        INSERT INTO trans (device_id, batch_id, date, entry_time, email_sent)
+        VALUES (%s, %s, CURDATE() - INTERVAL 1 DAY, '00:00:00', 0)
+    """, [((n % customers) * 10 + n % 3, n) for n in range(alerts)])
+    cursor.execute("INSERT INTO overstay_alert (device_id, batch_id, due_at) "
+                   "SELECT device_id, batch_id, TIMESTAMP(date, entry_time) + INTERVAL 120 MINUTE FROM trans")
+    conn.commit()
+    conn.close()
+
+
+def per_alert_updates(database, alerts):
+    # The notifier's previous flagging: one UPDATE and one commit per alert
+    conn = harness.connect(database)
+    cursor = conn.cursor()
+    cursor.execute("SELECT device_id, entry_time FROM trans WHERE exit_time IS NULL AND email_sent = 0")
+    rows = cursor.fetchall()
+    start = time.perf_counter()
+    for device_id, entry_time in rows:
+        cursor.execute("UPDATE trans SET email_sent = 1 WHERE device_id = %s AND entry_time = %s",
+                       (device_id, entry_time))
+        conn.commit()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed, len(rows) * 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--alerts', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--customers', type=int, default=20)
+    parser.add_argument('--ses-latency', type=float, default=40.0, help="Stub SES latency in ms")
+    parser.add_argument('--database', default='gatex_bench_notifier')
+    args = parser.parse_args()
+
+    harness.install_boto3_stub()
+    notifier = harness.load_notifier(args.database)
+    from gatex_mailer import SesSender
+    notifier.logger.setLevel('WARNING')
+
+    for alerts in args.alerts:
+        seed(args.database, alerts, args.customers)
+        ses = harness.SESStub(args.ses_latency / 1000)
+        sender = SesSender(ses, 'bench@example.com', max_rate=1000)
+        notifier.device_directory = type(notifier.device_directory)()
+        round_trips = harness.RoundTrips()
+        conn = harness.connect(args.database)
+        cursor = harness.CountingCursor(conn.cursor(), round_trips)
+        start = time.perf_counter()
+        notifier.check_and_send_messages(cursor, conn, sender=sender)
+        elapsed = time.perf_counter() - start
+        run_round_trips = round_trips.count
+        cursor.execute("SELECT COUNT(*) FROM trans WHERE email_sent = 1")
+        flagged = cursor.fetchone()[0]
+        conn.close()
+
+        seed(args.database, alerts, args.customers)
+        old_elapsed, old_round_trips = per_alert_updates(args.database, alerts)
+        print(f"alerts {alerts:>7}  run {elapsed * 1000:9.1f}ms  emails {len(ses.sent):>4}  "
+              f"round trips {run_round_trips:>4}  flagged {flagged:>7}  |  "
+              f"per-alert flagging {old_elapsed * 1000:9.1f}ms  round trips {old_round_trips:>7}")
+
+
+if __name__ == '__main__':
+    main()
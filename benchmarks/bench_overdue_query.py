@@ -0,0 +1,149 @@
+"""
+Overdue-visit query: the old time-of-day scan of trans against the overstay_alert due queue.
+
+Seeds a scratch ``trans`` table (from sql/schema.sql) with ``--rows`` visits
+spread over ``--days`` days of history, almost all of them exited and
+alerted, plus ``--overdue`` open visits from the last few hours. Then runs
+the notifier's old overdue query and the overstay_alert pop it uses now, and reports latency, rows
+returned, rows examined according to EXPLAIN, and peak Python memory while
+reading the result. Needs a local MySQL and mysql-connector-python. Seeding
+millions of rows takes a few minutes; pass ``--reuse`` to skip it on later
+runs. Run from the repository root:
+
+    DB_HOST=127.0.0.1 DB_USER=root DB_PASSWORD=secret \
+        python benchmarks/bench_overdue_query.py --rows 2000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+
+SEED_CHUNK = 10000
+
+OLD_QUERY = """
+    SELECT device_id, batch_id, entry_time
+    FROM trans
+    WHERE exit_time IS NULL
+    AND entry_time <= %s
+    AND email_sent = 0
+"""
+
+DUE_QUERY = """
+    SELECT a.device_id, a.batch_id, t.entry_time, t.exit_time, t.email_sent
+    FROM overstay_alert a
+    LEFT JOIN trans t ON t.device_id = a.device_id AND t.batch_id = a.batch_id
+    WHERE a.due_at <= %s
+    ORDER BY a.due_at
+"""
+
+
+def seed(database, rows, days, overdue, now):
+    harness.create_schema(database)
+    conn = harness.connect(database)
+    cursor = conn.cursor()
+
+    insert = """
+        INSERT INTO trans (device_id, batch_id, date, entry_time, exit_time, email_sent)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """
+    start = time.perf_counter()
+    batch = []
+    for n in range(rows + overdue):
+        if n < rows:
+            # History: exited visits, a tenth of which stayed long enough to be alerted
+            entered = now - timedelta(days=random.uniform(0.5, days))
+            exited = (entered + timedelta(minutes=random.randint(5, 300))).time()
+            email_sent = 1 if random.random() < 0.1 else 0
+        else:
+            entered = now - timedelta(minutes=random.randint(10, 360))
+            exited, email_sent = None, 0
+        batch.append((n % 500, n, entered.date(), entered.time().replace(microsecond=0), exited, email_sent))
+        if len(batch) == SEED_CHUNK:
+            cursor.executemany(insert, batch)
+            conn.commit()
+            batch = []
+    if batch:
+        cursor.executemany(insert, batch)
+    # What sqlRekognitionLambda schedules for each open visit
+    cursor.execute("INSERT INTO overstay_alert (device_id, batch_id, due_at) "
+                   "SELECT device_id, batch_id, TIMESTAMP(date, entry_time) + INTERVAL 120 MINUTE FROM trans "
+                   "WHERE exit_time IS NULL AND email_sent = 0")
+    conn.commit()
+    cursor.execute("ANALYZE TABLE trans, overstay_alert")
+    cursor.fetchall()
+    conn.close()
+    print(f"seeded {rows + overdue} rows in {time.perf_counter() - start:.0f}s")
+
+
+def examined(cursor, query, param):
+    cursor.execute("EXPLAIN " + query, (param,))
+    names = [column[0] for column in cursor.description]
+    return sum(int(dict(zip(names, row))['rows'] or 0) for row in cursor.fetchall())
+
+
+def run(conn, query, param, chunk):
+    cursor = conn.cursor()
+    tracemalloc.start()
+    start = time.perf_counter()
+    cursor.execute(query, (param,))
+    count = 0
+    if chunk:
+        while True:
+            rows = cursor.fetchmany(chunk)
+            if not rows:
+                break
+            count += len(rows)
+    else:
+        count = len(cursor.fetchall())
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    cursor.close()
+    return elapsed, count, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1000000, help="Historical visits")
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--overdue', type=int, default=200, help="Open visits from the last few hours")
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--chunk', type=int, default=500, help="fetchmany() size for the due queue")
+    parser.add_argument('--database', default='gatex_bench_overdue')
+    parser.add_argument('--reuse', action='store_true', help="Keep the seeded table from a previous run")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    now = datetime.now().replace(microsecond=0)
+    cutoff = now - timedelta(hours=2)
+    if not args.reuse:
+        seed(args.database, args.rows, args.days, args.overdue, now)
+
+    conn = harness.connect(args.database)
+    cursor = conn.cursor()
+    for label, query, param, chunk in (('time-of-day + fetchall', OLD_QUERY, cutoff.strftime('%H:%M:%S'), 0),
+                                       ('due alerts + fetchmany', DUE_QUERY, now.strftime('%Y-%m-%d %H:%M:%S'),
+                                        args.chunk)):
+        rows_examined = examined(cursor, query, param)
+        timings, peaks = [], []
+        for _ in range(args.runs):
+            elapsed, count, peak = run(conn, query, param, chunk)
+            timings.append(elapsed)
+            peaks.append(peak)
+        print(f"{label:<24} returned {count:>8}  examined ~{rows_examined:>9}  "
+              f"p50 {harness.percentile(timings, 50) * 1000:8.2f}ms  "
+              f"p99 {harness.percentile(timings, 99) * 1000:8.2f}ms  "
+              f"peak mem {max(peaks) / 1024:8.1f}KiB")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
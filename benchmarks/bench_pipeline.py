@@ -0,0 +1,134 @@
+"""
+Offline end-to-end throughput of the ingest Lambda and the overstay notifier.
+
+Generates ``--batches`` synthetic visitor batches (three camera images each,
+a share of them exits), uploads them to a stub S3, and feeds them to
+sqlRekognitionLambda.lambda_handler as S3 or SQS events of ``--per-event``
+records, with Rekognition, S3 and SES stubbed at the given latencies and a
+scratch MySQL database built from sql/schema.sql. Then runs the notifier
+once over the visits that are past their overstay limit. Reports images/s,
+p50/p99 handler latency, DB round trips per image and the notifier run.
+
+Save a run with ``--save`` and compare later runs against it with
+``--baseline``; the exit status is 1 if throughput, p99 or round trips per
+image regressed by more than ``--tolerance``. Needs a local MySQL,
+mysql-connector-python, Pillow and python-dateutil; nothing talks to AWS.
+Run from the repository root:
+
+    DB_HOST=127.0.0.1 DB_USER=root DB_PASSWORD=secret \
+        python benchmarks/bench_pipeline.py --batches 500 --rekognition-ms 120 --save baseline.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+
+BUCKET = 'raspberrypi4b-images'
+DEVICES = ('000111', '000112', '000113')
+
+
+def compare(results, baseline, tolerance):
+    """Return the metrics that got worse than ``baseline`` by more than ``tolerance``."""
+    regressions = []
+    checks = (('images_per_second', -1), ('handler_p99_ms', 1), ('db_round_trips_per_image', 1))
+    for name, direction in checks:
+        old, new = baseline.get(name), results.get(name)
+        if not old or new is None:
+            continue
+        change = (new - old) / old * direction
+        if change > tolerance:
+            regressions.append(f"{name}: {old:.2f} -> {new:.2f} ({change:+.0%} worse)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--batches', type=int, default=200)
+    parser.add_argument('--per-event', type=int, default=1, help="Records per Lambda event")
+    parser.add_argument('--sqs', action='store_true', help="Deliver records as SQS messages wrapping S3 events")
+    parser.add_argument('--exit-fraction', type=float, default=0.3)
+    parser.add_argument('--rekognition-ms', type=float, default=0.0)
+    parser.add_argument('--s3-ms', type=float, default=0.0)
+    parser.add_argument('--ses-ms', type=float, default=0.0)
+    parser.add_argument('--database', default='gatex_bench_pipeline')
+    parser.add_argument('--save', help="Write the results to this JSON file")
+    parser.add_argument('--baseline', help="Compare against results saved with --save")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    clients = harness.install_boto3_stub(args.rekognition_ms / 1000, args.s3_ms / 1000, args.ses_ms / 1000)
+    harness.create_schema(args.database)
+    harness.seed_customers(args.database, DEVICES)
+
+    ingest_trips = harness.RoundTrips()
+    notifier_trips = harness.RoundTrips()
+    lambda_module = harness.load_lambda(args.database, ingest_trips)
+    notifier = harness.load_notifier(args.database, notifier_trips)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    # Visits start three hours ago in the devices' time zone, so entries that never exit are overdue by the end
+    start = datetime.now(notifier.tz.gettz('Asia/Dubai')).replace(tzinfo=None) - timedelta(hours=3)
+    batches = harness.synthetic_batches(args.batches, DEVICES, start, args.exit_fraction, args.seed)
+    images = {camera: harness.jpeg_bytes(seed=n) for n, camera in enumerate(('1', '2', '3'))}
+    keys = []
+    for batch in batches:
+        keys.extend(harness.register_batch(clients, BUCKET, batch, images))
+    make_event = harness.sqs_event if args.sqs else harness.s3_event
+
+    latencies = []
+    statuses = {}
+    started = time.perf_counter()
+    for n in range(0, len(keys), args.per_event):
+        event = make_event(BUCKET, keys[n:n + args.per_event])
+        call_start = time.perf_counter()
+        response = lambda_module.lambda_handler(event, None)
+        latencies.append((time.perf_counter() - call_start) * 1000)
+        statuses[response['statusCode']] = statuses.get(response['statusCode'], 0) + 1
+    elapsed = time.perf_counter() - started
+
+    notifier_start = time.perf_counter()
+    notifier_response = notifier.lambda_handler({}, None)
+    notifier_ms = (time.perf_counter() - notifier_start) * 1000
+
+    results = {
+        'images': len(keys),
+        'images_per_second': len(keys) / elapsed,
+        'handler_p50_ms': harness.percentile(latencies, 50),
+        'handler_p99_ms': harness.percentile(latencies, 99),
+        'db_round_trips_per_image': ingest_trips.count / len(keys),
+        'rekognition_calls': sum(clients['rekognition'].calls.values()),
+        's3_calls': sum(clients['s3'].calls.values()),
+        'notifier_ms': notifier_ms,
+        'notifier_status': notifier_response['statusCode'],
+        'notifier_db_round_trips': notifier_trips.count,
+        'emails_sent': len(clients['ses'].sent),
+    }
+    print(f"{results['images']} images in {elapsed:.2f}s: {results['images_per_second']:.1f} images/s, "
+          f"handler p50 {results['handler_p50_ms']:.1f}ms p99 {results['handler_p99_ms']:.1f}ms, "
+          f"{results['db_round_trips_per_image']:.2f} DB round trips/image, statuses {statuses}")
+    print(f"rekognition calls {results['rekognition_calls']}, s3 calls {results['s3_calls']}")
+    print(f"notifier: {results['notifier_ms']:.1f}ms, status {results['notifier_status']}, "
+          f"{results['emails_sent']} emails, {results['notifier_db_round_trips']} DB round trips")
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+CPU time per frame and reject rate of the on-device frame quality gate.
+
+Runs a sample corpus through gatex_quality.QualityGate with the thresholds
+from ``push button.py``, batch by batch as the Pi does, and reports CPU time
+per check (p50/p99), how many frames were rejected by reason, and how many
+batches were dropped as double presses or uploaded as suspected repeats. A corpus directory is grouped into
+batches by the ``batchN`` and ``cameraN`` parts of its file names, taken
+``--interval`` seconds apart. Without one a synthetic corpus is generated:
+visitor batches with some dark and blurred frames, real double presses two
+seconds after the previous batch, and consecutive visitors holding ID cards
+of the same template, which must not be dropped. Needs NumPy and Pillow.
+Run on the Pi from the repository root:
+
+    python benchmarks/bench_quality.py samples/
+"""
+import argparse
+import io
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from gatex_metrics import percentile  # noqa: E402
+from gatex_quality import QualityGate, QualityThresholds  # noqa: E402
+
+THRESHOLDS = {
+    'camera1': QualityThresholds(min_brightness=40, min_sharpness=60.0, max_hash_distance=None),
+    'camera2': QualityThresholds(min_brightness=30, min_sharpness=25.0),
+    'camera3': QualityThresholds(min_brightness=25, min_sharpness=40.0),
+}
+NAME_PATTERN = re.compile(r'batch(\d+)(camera\d+)')
+
+
+def load_corpus(directory, interval):
+    """Batches as ``(label, seconds since the previous batch, {camera: jpeg bytes})``."""
+    batches = {}
+    for name in sorted(os.listdir(directory)):
+        match = NAME_PATTERN.search(name)
+        if match and name.lower().endswith(('.jpg', '.jpeg')):
+            with open(os.path.join(directory, name), 'rb') as file:
+                batches.setdefault(int(match.group(1)), {})[match.group(2)] = file.read()
+    return [('sample', interval, frames) for _, frames in sorted(batches.items())]
+
+
+def scene(rng, width, height):
+    from PIL import Image, ImageDraw
+
+    image = Image.new('L', (width, height), rng.randrange(90, 170))
+    draw = ImageDraw.Draw(image)
+    for _ in range(60):
+        x, y = rng.randrange(width), rng.randrange(height)
+        draw.rectangle((x, y, x + rng.randrange(10, 200), y + rng.randrange(5, 60)), fill=rng.randrange(256))
+    return image
+
+
+def id_card(template, name_seed, width, height):
+    """The same card layout with a different name and photo: nearly the same whole-frame hash."""
+    from PIL import ImageDraw
+
+    image = template.copy()
+    rng = random.Random(name_seed)
+    draw = ImageDraw.Draw(image)
+    for n in range(8):
+        draw.rectangle((width // 2 + n * 18, height // 3, width // 2 + n * 18 + 12, height // 3 + 20),
+                       fill=rng.randrange(256))
+    draw.rectangle((width // 10, height // 4, width // 10 + 120, height // 4 + 150), fill=rng.randrange(256))
+    return image
+
+
+def synthetic_corpus(batches, width, height, seed):
+    from PIL import ImageFilter
+
+    rng = random.Random(seed)
+    template = scene(random.Random(seed + 1), width, height)
+    corpus = []
+    previous = None
+    for n in range(batches):
+        kind = rng.choices(('visitor', 'double press', 'dark', 'blurred'), weights=(75, 9, 8, 8))[0]
+        if kind == 'double press' and previous:
+            corpus.append((kind, 2, previous))
+            continue
+        kind = 'visitor' if kind == 'double press' else kind
+        images = {'camera1': id_card(template, n, width, height),
+                  'camera2': scene(rng, width, height), 'camera3': scene(rng, width, height)}
+        bad = rng.choice(list(images))
+        if kind == 'dark':
+            images[bad] = images[bad].point(lambda value: value // 10)
+        elif kind == 'blurred':
+            images[bad] = images[bad].filter(ImageFilter.GaussianBlur(12))
+        frames = {}
+        for camera, image in images.items():
+            buffer = io.BytesIO()
+            image.convert('RGB').save(buffer, 'JPEG', quality=85)
+            frames[camera] = buffer.getvalue()
+        corpus.append((kind, 20, frames))
+        previous = frames
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('corpus', nargs='?', help="Directory of sample JPEGs (default: synthetic)")
+    parser.add_argument('--batches', type=int, default=100, help="Synthetic batches")
+    parser.add_argument('--interval', type=float, default=20.0, help="Seconds between sample batches")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = load_corpus(args.corpus, args.interval)
+        if not corpus:
+            sys.exit(f"No batchNcameraN JPEGs found in {args.corpus}")
+    else:
+        corpus = synthetic_corpus(args.batches, args.width, args.height, args.seed)
+
+    now = [0.0]
+    gate = QualityGate(THRESHOLDS, default=QualityThresholds(), clock=lambda: now[0])
+    cpu_times = []
+    rejected = {}
+    outcomes = {}
+    frames = 0
+    for label, gap, batch in corpus:
+        now[0] += gap
+        verdicts = []
+        for camera, data in batch.items():
+            start = time.process_time()
+            verdict = gate.check(camera, data)
+            cpu_times.append(time.process_time() - start)
+            verdicts.append(verdict)
+            frames += 1
+            if verdict.reason:
+                rejected[verdict.reason] = rejected.get(verdict.reason, 0) + 1
+        if gate.is_double_press(verdicts):
+            outcome = 'dropped as double press'
+        elif gate.is_suspected_repeat(verdicts):
+            outcome = 'uploaded as suspected repeat'
+        elif any(verdict.reason for verdict in verdicts):
+            outcome = 'frame rejected'
+        else:
+            outcome = 'uploaded'
+        outcomes.setdefault(label, {}).setdefault(outcome, 0)
+        outcomes[label][outcome] += 1
+
+    total = sum(rejected.values())
+    print(f"{len(corpus)} batches, {frames} frames, CPU per check p50 {percentile(cpu_times, 50) * 1000:.2f}ms "
+          f"p99 {percentile(cpu_times, 99) * 1000:.2f}ms")
+    print(f"frames rejected {total} ({total / frames:.1%}): "
+          + ", ".join(f"{reason} {count}" for reason, count in sorted(rejected.items())))
+    for label, counts in sorted(outcomes.items()):
+        print(f"  {label:<13} -> " + ", ".join(f"{outcome} {count}" for outcome, count in sorted(counts.items())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Daily attendance report time from raw trans rows vs. the trans_rollup table.
+
+Seeds a scratch database (from sql/schema.sql) with ``--days`` days of
+``--visits-per-day`` visits on each device, fills trans_rollup with
+gatex_rollup.rebuild, then times the report for a ``--range``-day window:
+aggregating trans the way the dashboard does now, and reading
+gatex_rollup.daily_summary. Also times the incremental record_entry /
+record_exit updates the ingest Lambda adds per visit. Needs a local MySQL and
+mysql-connector-python. Run from the repository root:
+
+    DB_HOST=127.0.0.1 DB_USER=root DB_PASSWORD=secret \
+        python benchmarks/bench_rollup.py --days 365 --visits-per-day 300
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+import gatex_rollup  # noqa: E402
+
+DEVICES = list(range(111, 116))
+FIRST_DAY = date(2024, 1, 1)
+
+# The report computed from every visit, as the dashboard does today
+TRANS_REPORT = f"""
+    SELECT device_id, date, COUNT(*), COUNT(*) - COUNT(exit_time),
+           AVG(IF(exit_time IS NULL, NULL, {gatex_rollup.DWELL_SECONDS})),
+           MAX(IF(exit_time IS NULL, NULL, {gatex_rollup.DWELL_SECONDS}))
+    FROM trans
+    WHERE device_id IN ({{placeholders}}) AND date BETWEEN %s AND %s
+    GROUP BY device_id, date
+"""
+
+
+def seed(database, days, visits_per_day, seed_value):
+    harness.create_schema(database)
+    conn = harness.connect(database)
+    cursor = conn.cursor()
+    rng = random.Random(seed_value)
+    insert = """
+        INSERT INTO trans (device_id, batch_id, date, entry_time, exit_time, visitor_ID_Details)
+        VALUES (%s, %s, %s, %s, %s, 'Name: VISITOR')
+    """
+    batch_id = 0
+    for day in range(days):
+        rows = []
+        for device_id in DEVICES:
+            for _ in range(visits_per_day):
+                batch_id += 1
+                entry = rng.randrange(7 * 3600, 20 * 3600)
+                exit_time = None
+                if rng.random() < 0.9:
+                    exit_time = str(timedelta(seconds=min(entry + rng.randrange(600, 4 * 3600), 86399)))
+                rows.append((device_id, batch_id, FIRST_DAY + timedelta(days=day), str(timedelta(seconds=entry)), exit_time))
+        cursor.executemany(insert, rows)
+        conn.commit()
+    start = time.perf_counter()
+    written = gatex_rollup.rebuild(cursor)
+    conn.commit()
+    print(f"seeded {batch_id} visits, rebuilt {written} rollup rows in {time.perf_counter() - start:.1f}s")
+    conn.close()
+    return batch_id
+
+
+def time_report(cursor, query, days, window, runs):
+    timings = []
+    for _ in range(runs):
+        first = FIRST_DAY + timedelta(days=random.randrange(max(1, days - window + 1)))
+        devices = random.sample(DEVICES, 3)
+        start = time.perf_counter()
+        query(cursor, devices, first, first + timedelta(days=window - 1))
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings
+
+
+def from_trans(cursor, devices, start, end):
+    placeholders = ", ".join(["%s"] * len(devices))
+    cursor.execute(TRANS_REPORT.format(placeholders=placeholders), (*devices, start, end))
+    return cursor.fetchall()
+
+
+def report(label, timings):
+    print(f"{label:<12} p50 {harness.percentile(timings, 50) * 1000:8.2f}ms  "
+          f"p99 {harness.percentile(timings, 99) * 1000:8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--visits-per-day', type=int, default=200)
+    parser.add_argument('--range', type=int, default=30, help="Days per report")
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--database', default='gatex_bench_rollup')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    last_batch = seed(args.database, args.days, args.visits_per_day, args.seed)
+    conn = harness.connect(args.database)
+    cursor = conn.cursor()
+    report('trans', time_report(cursor, from_trans, args.days, args.range, args.runs))
+    report('rollup', time_report(cursor, gatex_rollup.daily_summary, args.days, args.range, args.runs))
+
+    # Cost the ingest Lambda pays per visit: one entry and one exit update
+    timings = []
+    for n in range(args.runs):
+        batch_id = last_batch + n + 1
+        day = FIRST_DAY + timedelta(days=args.days)
+        start = time.perf_counter()
+        cursor.execute("""
+            INSERT INTO trans (device_id, batch_id, date, entry_time, exit_time)
+            VALUES (%s, %s, %s, '09:00:00', '10:30:00')
+        """, (DEVICES[0], batch_id, day))
+        gatex_rollup.record_entry(cursor, DEVICES[0], day, '09:00:00')
+        gatex_rollup.record_exit(cursor, DEVICES[0], batch_id)
+        conn.commit()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    report('visit+rollup', timings)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
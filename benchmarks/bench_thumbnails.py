@@ -0,0 +1,111 @@
+"""
+trans row size and dashboard query time with thumbnails inline vs. in the thumbnail store.
+
+Seeds a scratch trans table (from sql/schema.sql) with ``--rows`` visits
+carrying ``--thumbnail-kb`` KB thumbnail blobs, measures the table size and
+the dashboard's ``SELECT * FROM trans WHERE device_id IN (...)``, then runs
+gatex_jobs.migrate_thumbnails into a LocalThumbnailStore in a temporary
+directory, rebuilds the table and measures again. Needs a local MySQL and
+mysql-connector-python. Run from the repository root:
+
+    DB_HOST=127.0.0.1 DB_USER=root DB_PASSWORD=secret \
+        python benchmarks/bench_thumbnails.py --rows 50000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+from gatex_db import ConnectionManager  # noqa: E402
+from gatex_jobs import migrate_thumbnails  # noqa: E402
+from gatex_thumbnails import LocalThumbnailStore  # noqa: E402
+
+DEVICES = list(range(111, 121))
+
+
+def seed(database, rows, thumbnail_bytes):
+    harness.create_schema(database)
+    conn = harness.connect(database)
+    cursor = conn.cursor()
+    # A fake JPEG: a real header so the migration can read its size, then incompressible filler
+    header = bytes.fromhex('ffd8ffc0001108010001000300000000000000000000')
+    insert = """
+        INSERT INTO trans (device_id, batch_id, date, entry_time, visitor_ID_Details, vehicle_no, visitor_image_thumbnail)
+        VALUES (%s, %s, '2024-01-01', '09:00:00', 'Name: VISITOR', 'KA01AB1234', %s)
+    """
+    batch = []
+    for n in range(rows):
+        batch.append((DEVICES[n % len(DEVICES)], n, header + os.urandom(thumbnail_bytes - len(header))))
+        if len(batch) == 500:
+            cursor.executemany(insert, batch)
+            conn.commit()
+            batch = []
+    if batch:
+        cursor.executemany(insert, batch)
+    conn.commit()
+    conn.close()
+
+
+def measure(database, runs):
+    conn = harness.connect(database)
+    cursor = conn.cursor()
+    cursor.execute("OPTIMIZE TABLE trans")
+    cursor.fetchall()
+    cursor.execute("""
+        SELECT data_length, avg_row_length FROM information_schema.tables
+        WHERE table_schema = %s AND table_name = 'trans'
+    """, (database,))
+    data_length, avg_row_length = cursor.fetchone()
+
+    placeholders = ", ".join(["%s"] * 3)
+    timings = []
+    transferred = 0
+    for _ in range(runs):
+        devices = random.sample(DEVICES, 3)
+        start = time.perf_counter()
+        cursor.execute(f"SELECT * FROM trans WHERE device_id IN ({placeholders})", devices)
+        rows = cursor.fetchall()
+        timings.append(time.perf_counter() - start)
+        transferred = sum(len(value) for row in rows for value in row if isinstance(value, (bytes, bytearray, str)))
+    conn.close()
+    timings.sort()
+    return data_length, avg_row_length, timings, transferred
+
+
+def report(label, data_length, avg_row_length, timings, transferred):
+    print(f"{label:<8} table {data_length / 2 ** 20:9.1f}MiB  avg row {avg_row_length:>7}B  "
+          f"dashboard query p50 {harness.percentile(timings, 50) * 1000:8.1f}ms  "
+          f"p99 {harness.percentile(timings, 99) * 1000:8.1f}ms  "
+          f"~{transferred / 2 ** 20:.1f}MiB per query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--thumbnail-kb', type=int, default=15)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--chunk-size', type=int, default=200)
+    parser.add_argument('--database', default='gatex_bench_thumbnails')
+    args = parser.parse_args()
+
+    seed(args.database, args.rows, args.thumbnail_kb * 1024)
+    report('inline', *measure(args.database, args.runs))
+
+    db = ConnectionManager(host=os.environ.get('DB_HOST', '127.0.0.1'), user=os.environ.get('DB_USER', 'root'),
+                           password=os.environ.get('DB_PASSWORD', ''), database=args.database)
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        moved = migrate_thumbnails(db, LocalThumbnailStore(directory), args.chunk_size)
+        elapsed = time.perf_counter() - start
+        print(f"migrated {moved} thumbnails in {elapsed:.1f}s ({moved / elapsed:.0f}/s)")
+        db.discard()
+        report('stored', *measure(args.database, args.runs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Trigger-to-capture latency of the button backends, without GPIO hardware.
+
+Compares the interrupt-style queue used by ``gatex_gpio`` against the old
+100 ms polling loop from ``push button.py``. Run from the repository root:
+
+    python benchmarks/bench_trigger.py --presses 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from gatex_gpio import SimulatedTrigger  # noqa: E402
+from gatex_metrics import percentile  # noqa: E402
+
+
+def report(name, latencies, pressed):
+    print(f"{name:<10} detected {len(latencies)}/{pressed}  "
+          f"p50 {percentile(latencies, 50) * 1000:7.2f}ms  "
+          f"p99 {percentile(latencies, 99) * 1000:7.2f}ms  "
+          f"mean {statistics.mean(latencies) * 1000:7.2f}ms")
+
+
+def bench_queue(presses, gap, hold):
+    trigger = SimulatedTrigger(debounce=gap / 2, maxsize=presses)
+    latencies = []
+
+    def consume():
+        for _ in range(presses):
+            press = trigger.wait(timeout=5)
+            if press is None:
+                return
+            latencies.append(press.latency())
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    for _ in range(presses):
+        trigger.press()
+        time.sleep(hold)
+        time.sleep(random.uniform(gap, gap * 2))
+    consumer.join()
+    report('interrupt', latencies, presses)
+
+
+def bench_polling(presses, gap, hold, interval=0.1):
+    # A press is only seen if the pin is low at one of the poll instants.
+    state = {'low': False, 'since': 0.0}
+    latencies = []
+    done = threading.Event()
+
+    def poll():
+        seen = False
+        while not done.is_set():
+            if state['low'] and not seen:
+                latencies.append(time.monotonic() - state['since'])
+                seen = True
+            elif not state['low']:
+                seen = False
+            time.sleep(interval)
+
+    poller = threading.Thread(target=poll)
+    poller.start()
+    for _ in range(presses):
+        state['since'] = time.monotonic()
+        state['low'] = True
+        time.sleep(hold)
+        state['low'] = False
+        time.sleep(random.uniform(gap, gap * 2))
+    done.set()
+    poller.join()
+    report('polling', latencies, presses)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--presses', type=int, default=100)
+    parser.add_argument('--gap', type=float, default=0.12, help="Minimum seconds between presses")
+    parser.add_argument('--hold', type=float, default=0.03, help="Seconds the button is held down")
+    args = parser.parse_args()
+
+    bench_queue(args.presses, args.gap, args.hold)
+    bench_polling(args.presses, args.gap, args.hold)
+
+
+if __name__ == '__main__':
+    main()
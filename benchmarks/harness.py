@@ -0,0 +1,373 @@
+"""
+Offline stand-ins for the AWS services and the database used by the pipeline benchmarks.
+
+- ``install_boto3_stub`` puts a fake ``boto3`` in ``sys.modules`` whose
+  Rekognition, S3 and SES clients answer from memory after a configurable
+  delay, so the Lambdas import and run with no AWS account or network.
+- ``synthetic_batches`` / ``image_key`` / ``s3_event`` / ``sqs_event``
+  generate visitor batches with valid ``{device}batch{n}camera{k}_...jpeg``
+  keys and the events S3 or SQS would deliver for them.
+- ``create_schema`` builds a scratch MySQL database from sql/schema.sql and
+  ``CountingConnection`` counts round trips (executes and commits) on it.
+- ``load_lambda`` / ``load_notifier`` import the two Lambdas with the env
+  they read at import time, without touching anything outside the harness.
+- ``percentile`` is gatex_metrics.percentile, so every benchmark reports
+  p50/p99 the same way the Lambdas' EMF lines do.
+
+Needs mysql-connector-python and a local MySQL (or MariaDB) for the DB parts,
+plus the Lambdas' own imports (Pillow, python-dateutil).
+"""
+import importlib
+import importlib.util
+import io
+import json
+import os
+import random
+import string
+import sys
+import threading
+import time
+import types
+from datetime import timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from gatex_metrics import percentile  # noqa: E402,F401
+
+
+class ClientStub:
+    """Base for the fake AWS clients: fixed latency and a per-operation call count."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _call(self, operation):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class StubClientError(Exception):
+    """Carries ``response['Error']['Code']`` like botocore's ClientError."""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code}: {message}")
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+
+class S3Stub(ClientStub):
+    """In-memory buckets. ``objects`` maps (bucket, key) to bytes."""
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._call('put_object')
+        self.objects[(Bucket, Key)] = Body if isinstance(Body, bytes) else Body.read()
+        return {'ETag': f'"{hash(self.objects[(Bucket, Key)]) & 0xffffffff:08x}"'}
+
+    def upload_file(self, Filename, Bucket, Key, **kwargs):
+        with open(Filename, 'rb') as file:
+            self.put_object(Bucket=Bucket, Key=Key, Body=file.read())
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._call('get_object')
+        if (Bucket, Key) not in self.objects:
+            raise StubClientError('NoSuchKey', f"{Bucket}/{Key}")
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._call('head_object')
+        if (Bucket, Key) not in self.objects:
+            raise StubClientError('404', f"{Bucket}/{Key}")
+        return {'ETag': f'"{hash(self.objects[(Bucket, Key)]) & 0xffffffff:08x}"',
+                'ContentLength': len(self.objects[(Bucket, Key)])}
+
+
+class RekognitionStub(ClientStub):
+    """
+    Answers detect_text and detect_faces from what the generator registered per key.
+
+    ``texts`` maps an image key to its LINE detections; every image gets one
+    face in the middle of the frame.
+    """
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.texts = {}
+
+    @staticmethod
+    def _key(Image):
+        return Image.get('S3Object', {}).get('Name')
+
+    def detect_text(self, Image, **kwargs):
+        self._call('detect_text')
+        lines = self.texts.get(self._key(Image), [])
+        return {'TextDetections': [{'DetectedText': line, 'Type': 'LINE'} for line in lines]}
+
+    def detect_faces(self, Image, **kwargs):
+        self._call('detect_faces')
+        return {'FaceDetails': [{'BoundingBox': {'Left': 0.35, 'Top': 0.2, 'Width': 0.3, 'Height': 0.45}}]}
+
+
+class SESStub(ClientStub):
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.sent = []
+
+    def send_email(self, **kwargs):
+        self._call('send_email')
+        self.sent.append(kwargs)
+        return {'MessageId': f"stub-{len(self.sent)}"}
+
+
+def install_boto3_stub(rekognition_latency=0.0, s3_latency=0.0, ses_latency=0.0):
+    """
+    Replace ``boto3`` for everything imported afterwards.
+
+    :return: Dict of the shared stub clients by service name.
+    """
+    clients = {
+        'rekognition': RekognitionStub(rekognition_latency),
+        's3': S3Stub(s3_latency),
+        'ses': SESStub(ses_latency),
+    }
+    boto3 = types.ModuleType('boto3')
+    boto3.client = lambda service_name, *args, **kwargs: clients[service_name]
+    sys.modules['boto3'] = boto3
+    return clients
+
+
+def random_name(rng):
+    return ''.join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(5, 12)))
+
+
+def synthetic_batches(count, devices=('000111',), start=None, exit_fraction=0.3, seed=7):
+    """
+    Generate visitor batches in time order.
+
+    A fraction of the batches are exits: their ID card shows the name of a
+    visitor who entered earlier on the same device and has not left yet.
+
+    :param start: Naive datetime of the first batch. Batches follow one
+        every 5-60 seconds.
+    :return: List of dicts with device, batch_id, timestamp, name, plate and is_exit.
+    """
+    rng = random.Random(seed)
+    inside = {device: [] for device in devices}
+    batches = []
+    timestamp = start
+    for batch_id in range(1, count + 1):
+        device = rng.choice(devices)
+        timestamp += timedelta(seconds=rng.randint(5, 60))
+        is_exit = bool(inside[device]) and rng.random() < exit_fraction
+        if is_exit:
+            name = inside[device].pop(rng.randrange(len(inside[device])))
+        else:
+            name = random_name(rng)
+            inside[device].append(name)
+        plate = f"KA{rng.randint(1, 99):02d}{rng.choice(string.ascii_uppercase)}{rng.randint(1000, 9999)}"
+        batches.append({'device': device, 'batch_id': batch_id, 'timestamp': timestamp,
+                        'name': name, 'plate': plate, 'is_exit': is_exit})
+    return batches
+
+
+def image_key(batch, camera):
+    """The key push button.py uploads camera ``camera`` of ``batch`` under."""
+    return f"{batch['device']}batch{batch['batch_id']}camera{camera}_{batch['timestamp']:%Y_%m_%d_%H_%M_%S}.jpeg"
+
+
+def jpeg_bytes(width=1280, height=720, seed=0):
+    """A noisy JPEG of roughly camera size, so decode and crop costs are realistic."""
+    from PIL import Image
+    rng = random.Random(seed)
+    image = Image.frombytes('L', (width // 8, height // 8), bytes(rng.randrange(256) for _ in range(width * height // 64)))
+    image = image.resize((width, height)).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def tag_jpeg(data, text):
+    """Insert a COM segment holding ``text`` after the SOI marker; the pixels are unchanged."""
+    comment = text.encode()
+    return data[:2] + b'\xff\xfe' + (len(comment) + 2).to_bytes(2, 'big') + comment + data[2:]
+
+
+def register_batch(clients, bucket, batch, images, cameras=('1', '2', '3')):
+    """
+    Put a batch's images in the S3 stub and its text in the Rekognition stub.
+
+    :param images: {camera: jpeg bytes}, shared between batches. Each key
+        gets its own copy tagged with a JPEG comment, so content-addressed
+        caches see distinct images as they would in production.
+    :return: List of the batch's keys.
+    """
+    keys = []
+    for camera in cameras:
+        key = image_key(batch, camera)
+        clients['s3'].objects[(bucket, key)] = tag_jpeg(images[camera], key)
+        if camera == '1':
+            clients['rekognition'].texts[key] = ['GOVERNMENT OF INDIA', f"Name: {batch['name']}", 'DOB 01/01/1990']
+        elif camera == '3':
+            clients['rekognition'].texts[key] = [batch['plate']]
+        keys.append(key)
+    return keys
+
+
+def s3_record(bucket, key):
+    return {'s3': {'bucket': {'name': bucket}, 'object': {'key': key, 'eTag': f"etag-{key}"}}}
+
+
+def s3_event(bucket, keys):
+    return {'Records': [s3_record(bucket, key) for key in keys]}
+
+
+def sqs_event(bucket, keys):
+    """One SQS message per key, each wrapping an S3 notification, as an S3 -> SQS -> Lambda trigger delivers."""
+    return {'Records': [{'messageId': f"msg-{n}", 'body': json.dumps(s3_event(bucket, [key]))}
+                        for n, key in enumerate(keys)]}
+
+
+def connect(database=None):
+    import mysql.connector
+    return mysql.connector.connect(host=os.environ.get('DB_HOST', '127.0.0.1'),
+                                   user=os.environ.get('DB_USER', 'root'),
+                                   password=os.environ.get('DB_PASSWORD', ''),
+                                   database=database)
+
+
+def create_schema(database):
+    """(Re)create ``database`` from sql/schema.sql."""
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {database}")
+    cursor.execute(f"CREATE DATABASE {database}")
+    cursor.execute(f"USE {database}")
+    with open(os.path.join(ROOT, 'sql', 'schema.sql')) as file:
+        for statement in file.read().split(';'):
+            if statement.strip() and not all(line.startswith('--') for line in statement.strip().splitlines()):
+                cursor.execute(statement)
+    conn.commit()
+    conn.close()
+
+
+def seed_customers(database, devices, overstay_minutes=None):
+    """One customer and one location per device, with a contact email so the notifier has recipients."""
+    conn = connect(database)
+    cursor = conn.cursor()
+    for n, device in enumerate(devices):
+        cursor.execute("INSERT INTO customer_master (customer_id, device_id, contact_person_emailID, overstay_minutes) "
+                       "VALUES (%s, %s, %s, %s)",
+                       (f"C{n}", json.dumps([int(device)]), f"customer{n}@example.com", overstay_minutes))
+        cursor.execute("INSERT INTO location_master (customer_id, device_id, project_name, building_name) "
+                       "VALUES (%s, %s, %s, %s)", (f"C{n}", json.dumps([int(device)]), f"Project {n}", "Tower A"))
+    conn.commit()
+    conn.close()
+
+
+class RoundTrips:
+    """Thread-safe counter shared by the counting connections."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self, n=1):
+        with self._lock:
+            self.count += n
+
+
+class CountingCursor:
+    def __init__(self, cursor, round_trips):
+        self._cursor = cursor
+        self._round_trips = round_trips
+
+    def execute(self, *args, **kwargs):
+        self._round_trips.add()
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._round_trips.add()
+        return self._cursor.executemany(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class CountingConnection:
+    """Connection wrapper counting executes, commits and pings as round trips."""
+
+    def __init__(self, conn, round_trips):
+        self._conn = conn
+        self._round_trips = round_trips
+
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(self._conn.cursor(*args, **kwargs), self._round_trips)
+
+    def commit(self):
+        self._round_trips.add()
+        return self._conn.commit()
+
+    def rollback(self):
+        self._round_trips.add()
+        return self._conn.rollback()
+
+    def ping(self, *args, **kwargs):
+        self._round_trips.add()
+        return self._conn.ping(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def counting_connect(round_trips):
+    """A ``ConnectionManager(connect=...)`` factory whose connections count round trips."""
+    def factory(**kwargs):
+        import mysql.connector
+        return CountingConnection(mysql.connector.connect(**kwargs), round_trips)
+    return factory
+
+
+def _lambda_env(database):
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'ap-south-1')
+    os.environ.setdefault('DB_HOST', '127.0.0.1')
+    os.environ.setdefault('DB_USER', 'root')
+    os.environ.setdefault('DB_PASSWORD', '')
+    os.environ['DB_DATABASE'] = database
+    os.environ['DB_NAME'] = database
+    os.environ.setdefault('SES_SENDER_EMAIL', 'bench@example.com')
+
+
+def load_lambda(database, round_trips=None, metrics_path=os.devnull):
+    """
+    Import sqlRekognitionLambda against ``database``. Call ``install_boto3_stub`` first.
+
+    :param round_trips: Optional RoundTrips to count the Lambda's DB traffic in.
+    :param metrics_path: Where its EMF lines go instead of stdout.
+    """
+    _lambda_env(database)
+    sys.modules.pop('sqlRekognitionLambda', None)
+    module = importlib.import_module('sqlRekognitionLambda')
+    if round_trips is not None:
+        module.db._connect = counting_connect(round_trips)
+    module.metrics.path = metrics_path
+    return module
+
+
+def load_notifier(database, round_trips=None, metrics_path=os.devnull):
+    """Import gatex-email-notification (not importable by name) against ``database``."""
+    _lambda_env(database)
+    spec = importlib.util.spec_from_file_location('gatex_email_notification',
+                                                  os.path.join(ROOT, 'gatex-email-notification.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if round_trips is not None:
+        module.db._connect = counting_connect(round_trips)
+    module.metrics.path = metrics_path
+    return module
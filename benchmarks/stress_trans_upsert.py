@@ -0,0 +1,111 @@
+"""
+Concurrency stress run for the trans upsert in sqlRekognitionLambda.
+
+Fires parallel camera writes for the same batches at a local MySQL, the way
+2-3 concurrent Lambda invocations per visitor do, then checks that every
+batch ended up as exactly one row with all camera columns merged and the
+earliest entry time kept. Writes go through ``ConnectionManager.run`` like
+the Lambda's do, one manager per thread standing in for one warm container,
+so deadlocks and lock wait timeouts are retried and only reported. The run
+fails on duplicate rows or badly merged columns. Needs
+mysql-connector-python; AWS is stubbed by the benchmark harness. Everything happens in the ``--database`` scratch schema, which is
+created from sql/schema.sql. Run from the repository root:
+
+    DB_HOST=127.0.0.1 DB_USER=root DB_PASSWORD=secret \
+        python benchmarks/stress_trans_upsert.py --batches 500 --threads 16
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+from gatex_db import RETRYABLE_ERRNOS, ConnectionManager  # noqa: E402
+
+DEVICE_ID = '000111'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--batches', type=int, default=300)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--database', default='gatex_stress')
+    args = parser.parse_args()
+
+    # Only the Lambda's upsert is used; each thread keeps its own ConnectionManager
+    harness.install_boto3_stub()
+    lambda_module = harness.load_lambda(args.database)
+    import mysql.connector
+
+    harness.create_schema(args.database)
+
+    writes = []
+    expected_entry = {}
+    for batch_id in range(1, args.batches + 1):
+        seconds = [random.randint(0, 59) for _ in range(3)]
+        expected_entry[batch_id] = f"10:00:{min(seconds):02d}"
+        writes.append((batch_id, '1', f"10:00:{seconds[0]:02d}", f"Name: VISITOR{batch_id}"))
+        writes.append((batch_id, '2', f"10:00:{seconds[1]:02d}", b'\xff\xd8thumb'))
+        writes.append((batch_id, '3', f"10:00:{seconds[2]:02d}", f"KA01AB{batch_id:04d}"))
+    random.shuffle(writes)
+
+    managers = []
+    local = threading.local()
+    exhausted = []
+
+    def write(item):
+        batch_id, camera, entry_time, value = item
+        if not hasattr(local, 'db'):
+            local.db = ConnectionManager(connect=harness.connect, database=args.database)
+            managers.append(local.db)
+        try:
+            local.db.run(lambda conn, cursor: lambda_module.update_or_insert_db(
+                cursor, DEVICE_ID, batch_id, '2024-01-01', entry_time, {camera: value}), dictionary=True)
+        except mysql.connector.Error as e:
+            if e.errno not in RETRYABLE_ERRNOS:
+                raise
+            # Out of retries; the Lambda would report the record and SQS redeliver it
+            exhausted.append((batch_id, camera, e.errno))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(write, writes))
+    elapsed = time.perf_counter() - start
+    for db in managers:
+        db.discard()
+
+    conn = harness.connect(args.database)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT batch_id, COUNT(*) AS copies FROM trans GROUP BY batch_id HAVING COUNT(*) > 1")
+    duplicates = cursor.fetchall()
+    cursor.execute("SELECT batch_id, entry_time, visitor_ID_Details, vehicle_no, visitor_image_thumbnail, name_key FROM trans")
+    problems = []
+    for row in cursor.fetchall():
+        entry_time = str(row['entry_time']).zfill(8)
+        if any(batch_id == row['batch_id'] for batch_id, _, _ in exhausted):
+            continue  # A write is missing, not merged wrongly
+        if entry_time != expected_entry[row['batch_id']]:
+            problems.append(f"batch {row['batch_id']}: entry_time {entry_time}, expected {expected_entry[row['batch_id']]}")
+        if not (row['visitor_ID_Details'] and row['vehicle_no'] and row['visitor_image_thumbnail'] and row['name_key']):
+            problems.append(f"batch {row['batch_id']}: missing camera columns")
+    conn.close()
+
+    print(f"{len(writes)} writes on {args.threads} threads in {elapsed:.2f}s "
+          f"({len(writes) / elapsed:.0f} writes/s)")
+    print(f"deadlock or lock wait timeout retries: {sum(db.deadlocks for db in managers)}, "
+          f"writes out of retries: {len(exhausted)}")
+    for batch_id, camera, errno in exhausted[:10]:
+        print(f"  batch {batch_id} camera {camera}: errno {errno}")
+    print(f"duplicate batches: {len(duplicates)}, rows with problems: {len(problems)}")
+    for problem in problems[:10]:
+        print(f"  {problem}")
+    sys.exit(1 if duplicates or problems else 0)
+
+
+if __name__ == '__main__':
+    main()
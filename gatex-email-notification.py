@@ -1,11 +1,14 @@
 import os
 import json
-import boto3
-from botocore.exceptions import ClientError
-import mysql.connector
 from datetime import datetime, timedelta
 import logging
 from dateutil import tz
+import gatex_alerts
+from gatex_clients import LazyClient
+from gatex_db import ConnectionManager
+from gatex_directory import DeviceDirectory
+from gatex_mailer import Email, SesSender
+from gatex_metrics import Metrics, log_event
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s: %(levelname)s: %(message)s')
@@ -18,142 +21,189 @@ DB_USER = os.getenv('DB_USER')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
 DB_NAME = os.getenv('DB_NAME')
 
+# Created once per container so warm invocations reuse the open MySQL connection. mysql.connector is imported on
+# the first connect.
+db = ConnectionManager(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
+
+# Device -> (customer email, location, overstay limit) map, kept across warm invocations and reloaded when the master tables change
+device_directory = DeviceDirectory(ttl=float(os.getenv('DEVICE_DIRECTORY_TTL', '300')),
+                                   default_overstay_minutes=int(os.getenv('OVERSTAY_MINUTES', '120')))
+
 # Environment variable for SES sender email
 SES_SENDER_EMAIL = os.getenv('SES_SENDER_EMAIL')
 
-# Initialize boto3 SES client
-ses_client = boto3.client('ses')
+# SES client, created when the first digest is sent, so runs with nothing due never import boto3
+ses_client = LazyClient('ses')
 
-def send_email(recipient_email, subject, body):
-    logger.info("Function send_email called.")
-    logger.info(f"Sending email to {recipient_email} with subject: {subject}")
-    try:
-        response = ses_client.send_email(
-            Source=SES_SENDER_EMAIL,
-            Destination={'ToAddresses': [recipient_email]},
-            Message={
-                'Subject': {'Data': subject, 'Charset': 'UTF-8'},
-                'Body': {'Text': {'Data': body, 'Charset': 'UTF-8'}},
-            },
-        )
-        logger.info(f"SES send_email response: {response}")
-    except ClientError as e:
-        logger.error(f"SES ClientError: {e.response}")
-        raise
-
-def check_and_send_messages(cursor,connection):
-    logger.info("Function check_and_send_messages called.")
-    # Assuming local_time is the current time in IST
-    local_time = datetime.now(tz.gettz('Asia/Dubai'))
+# Query and SES timings, printed as one EMF line per run for CloudWatch to pick up
+metrics = Metrics('Gatex/Notifier', {'Function': 'gatex-email-notification'})
+
+# Digests go out concurrently, kept under the account's SES sending rate (messages per second)
+ses_sender = SesSender(ses_client, SES_SENDER_EMAIL,
+                       max_rate=float(os.getenv('SES_MAX_SEND_RATE', '14')),
+                       workers=int(os.getenv('SES_SEND_WORKERS', '4')),
+                       metrics=metrics)
+
+# Alerts being sent are leased for this long instead of deleted. If a run dies before recording the result,
+# they fall due again after the lease; the visit may or may not have been emailed, so it is never sent again
+# automatically. It is logged and counted as claims_expired every lease period until an operator requeues it
+# (gatex_jobs.py requeue-claims) or the visitor exits. Keep it above the Lambda timeout.
+CLAIM_LEASE_MINUTES = int(os.getenv('CLAIM_LEASE_MINUTES', '20'))
+
+# Alerts of devices without a customer contact are kept and looked at again this much later
+NO_CONTACT_RETRY_MINUTES = int(os.getenv('NO_CONTACT_RETRY_MINUTES', '60'))
+
+# Rows pulled per fetchmany() while streaming the due alerts
+FETCH_CHUNK = int(os.getenv('OVERDUE_FETCH_CHUNK', '500'))
 
-    # Calculating "two hours ago"
-    two_hours_ago = local_time - timedelta(hours=2)
-    two_hours_ago_time_str = two_hours_ago.strftime('%H:%M:%S')
-
-    # Formatting today's date
-    today_date_str = local_time.strftime('%Y-%m-%d')
-
-    logger.info(f"Time two hours ago in IST (HH:MM:SS) and the date is: {two_hours_ago_time_str} and {today_date_str}")
-    logger.info("Querying customer_master table.")
-    customer_query = "SELECT customer_id, device_id, contact_person_emailID FROM customer_master"
-    cursor.execute(customer_query)
-    customer_devices = {}
-    logger.info("Fetching customer_master data.")
-    customer_data = cursor.fetchall()
-    logger.info(f"Fetched data: {customer_data}")
-    for customer_id, device_id_json, contact_email in customer_data:
-        logger.info(f"Processing customer ID: {customer_id}")
-        try:
-            device_ids = json.loads(device_id_json)
-            logger.info(f"Device IDs for customer {customer_id}: {device_ids}")
-            for device_id in device_ids:
-                # Convert device_id to integer before using it as a key
-                customer_devices[int(device_id)] = contact_email
-        except json.JSONDecodeError:
-            logger.error(f"JSON decoding error for customer {customer_id}")
-        except ValueError:
-            logger.error(f"Value error for customer {customer_id}, device ID: {device_id}")
-
-    logger.info("Querying trans table with date and email_sent filter.")
-    trans_query = """
-    SELECT device_id,batch_id, entry_time
-    FROM trans
-    WHERE exit_time IS NULL 
-    AND entry_time <= %s
-    AND email_sent = 0
+def fetch_in_chunks(cursor, size=FETCH_CHUNK):
+    """Yield the rows of the last query FETCH_CHUNK at a time instead of materializing them with fetchall()."""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
+def build_digests(trans_data, customer_devices):
     """
-    cursor.execute(trans_query, (two_hours_ago_time_str,))
-    trans_data = cursor.fetchall()
-    logger.info(f"Trans table data: {trans_data}")
+    Group overdue visits into one digest email per customer contact.
 
-    for (device_id,batch_id, entry_time) in trans_data:
-        logger.info(f"Processing trans table device ID: {device_id} and the customer_devices are {customer_devices}")
+    :param trans_data: Iterable of (device_id, batch_id, entry_time) rows of overdue visits.
+    :param customer_devices: Device map from the device directory.
+    :return: List of Email, each carrying the rows it alerts for in ``alerts``.
+    """
+    by_recipient = {}
+    for (device_id, batch_id, entry_time) in trans_data:
         # Make sure to convert device_id to integer before comparison
-        if int(device_id) in customer_devices:
-            contact_email = customer_devices[int(device_id)]
-            logger.info(f"Device ID {device_id} found in customer_devices.")
-
-            device_id_json = json.dumps([str(device_id)])  # Ensure device_id is converted to string and then to JSON array format
-            # device_id_json=json.dumps([str(111)]) 
-            location_query = """
-            SELECT lm.project_name, lm.building_name
-            FROM location_master lm
-            WHERE JSON_CONTAINS(lm.device_id, %s)
-            """
-            cursor.execute(location_query, (device_id_json,))
-            location_info = cursor.fetchone()
-
-            logger.info(f"Location info: {location_info}")
-
-            project_name, building_name = location_info if location_info else ("Unknown", "Unknown")
-            logger.info(f"Location info for device ID {device_id}: Project Name - {project_name}, Building Name - {building_name}")
-
-            # Assuming contact_email is determined before this code block
-            subject = "Gatex Visitor Alert !"
-            body = f"""\
-            Gatex Visitor Alert !
-            
-            A person is inside of Batch ID: {batch_id}
-            Project Name: {project_name}, 
-            Building Name: {building_name} 
-            
-            for more than 2 hours.
-            """
-
-            project_name, building_name = location_info if location_info else ("Unknown", "Unknown")
-            send_email(contact_email, subject, body)
-
-            # Update email_sent to 1 for the current record
-            update_query = """
-            UPDATE trans
-            SET email_sent = 1
-            WHERE device_id = %s AND entry_time = %s
-            """
-            cursor.execute(update_query, (device_id, entry_time))
-            logger.info(f"Updated email_sent for device ID: {device_id}, entry time: {entry_time}")
-            connection.commit()
+        device = customer_devices.get(int(device_id))
+        if device and device.contact_email:
+            by_recipient.setdefault(device.contact_email, []).append((device, device_id, batch_id, entry_time))
+        else:
+            metrics.count('alerts_without_contact')
+            log_event(logger, logging.DEBUG, 'alert_skipped', device_id=device_id, batch_id=batch_id,
+                      reason='no customer contact')
+
+    digests = []
+    for contact_email, alerts in by_recipient.items():
+        lines = [f"Batch ID: {batch_id}, Entry Time: {entry_time}, "
+                 f"Project Name: {device.project_name}, Building Name: {device.building_name}, "
+                 f"Limit: {device.overstay_minutes} minutes"
+                 for (device, device_id, batch_id, entry_time) in alerts]
+        subject = "Gatex Visitor Alert !" if len(alerts) == 1 else f"Gatex Visitor Alert ! ({len(alerts)} visitors)"
+        body = "Gatex Visitor Alert !\n\n" \
+               f"{len(alerts)} visitor(s) have been inside for longer than the overstay limit:\n\n" + "\n".join(lines) + "\n"
+        digests.append(Email(contact_email, subject, body,
+                             [(device_id, batch_id, entry_time) for (device, device_id, batch_id, entry_time) in alerts]))
+    return digests
+
+# email_sent states. A visit is claimed before its digest is sent and flagged once SES accepted it
+EMAIL_PENDING, EMAIL_SENT, EMAIL_CLAIMED = 0, 1, 2
+
+def set_email_sent(cursor, keys, value, current):
+    """
+    Move visits from one email_sent state to another with one keyed UPDATE per chunk of visits.
+
+    Rows are matched on the unique (device_id, batch_id) key and only while
+    they are still in ``current``, so repeating a call is a no-op. The caller
+    commits.
 
+    :param keys: (device_id, batch_id) pairs.
+    :return: Number of rows changed.
+    """
+    changed = 0
+    for placeholders, params in gatex_alerts.keyed_chunks(keys):
+        cursor.execute(f"""
+        UPDATE trans
+        SET email_sent = %s
+        WHERE email_sent = %s
+        AND (device_id, batch_id) IN ({placeholders})
+        """, [value, current] + params)
+        changed += cursor.rowcount
+    return changed
+
+def check_and_send_messages(cursor, connection, sender=None):
+    logger.info("Function check_and_send_messages called.")
+    sender = sender or ses_sender
+    # Entry times come from the devices' local clock, so due times are compared in that zone
+    local_time = datetime.now(tz.gettz('Asia/Dubai'))
+    now_str = local_time.strftime('%Y-%m-%d %H:%M:%S')
+
+    # One lookup structure for the whole run instead of a location_master scan per alert
+    with metrics.span('db_device_directory'):
+        customer_devices = device_directory.devices(cursor)
+
+    # Only the alerts that fell due are read, through idx_overstay_alert_due; trans is not scanned
+    logger.info("Popping overstay alerts due by %s.", now_str)
+    stale, due_rows, expired_claims = [], [], []
+    with metrics.span('db_pop_due'):
+        gatex_alerts.due(cursor, now_str)
+        for (device_id, batch_id, entry_time, exit_time, email_sent) in fetch_in_chunks(cursor):
+            if exit_time is None and email_sent == EMAIL_PENDING:
+                due_rows.append((device_id, batch_id, entry_time))
+            elif exit_time is None and email_sent == EMAIL_CLAIMED:
+                # Claimed by a run that died before recording the result; SES may have accepted its digest
+                expired_claims.append((device_id, batch_id))
+            else:
+                stale.append((device_id, batch_id))
+    metrics.count('alerts_popped', len(stale) + len(due_rows) + len(expired_claims))
+    logger.info("Popped %d alerts, %d for visits still inside.",
+                len(stale) + len(due_rows) + len(expired_claims), len(due_rows))
+    if expired_claims:
+        metrics.count('claims_expired', len(expired_claims))
+        logger.warning("%d visits are still claimed after their lease ran out and are not re-sent; requeue them "
+                       "with gatex_jobs.py requeue-claims once SES shows they were not emailed: %s",
+                       len(expired_claims), " ".join(f"{device_id}:{batch_id}" for device_id, batch_id in expired_claims))
+
+    digests = build_digests(due_rows, customer_devices)
+    alerts = [(device_id, batch_id) for digest in digests for (device_id, batch_id, entry_time) in digest.alerts]
+    without_contact = set((device_id, batch_id) for (device_id, batch_id, entry_time) in due_rows) - set(alerts)
+    # Claim the visits and lease their alerts before sending: a digest SES accepted is never sent again, and if
+    # this run dies before recording the result the alert row survives and a later run reports the visit
+    lease_until = (local_time + timedelta(minutes=CLAIM_LEASE_MINUTES)).strftime('%Y-%m-%d %H:%M:%S')
+    retry_at = (local_time + timedelta(minutes=NO_CONTACT_RETRY_MINUTES)).strftime('%Y-%m-%d %H:%M:%S')
+    with metrics.span('db_claim'):
+        gatex_alerts.delete(cursor, stale)
+        gatex_alerts.postpone(cursor, alerts, lease_until)
+        gatex_alerts.postpone(cursor, expired_claims, lease_until)  # Kept so the visit is not lost; reported again
+        gatex_alerts.postpone(cursor, without_contact, retry_at)  # A contact may be added to the customer later
+        set_email_sent(cursor, alerts, EMAIL_CLAIMED, EMAIL_PENDING)
+        connection.commit()
+
+    logger.info("Sending %d digest emails for %d visits.", len(digests), len(alerts))
+    with metrics.span('send_all'):
+        sent = [digest for digest in sender.send_all(digests) if digest.sent]
+    sent_alerts = [(device_id, batch_id) for digest in sent for (device_id, batch_id, entry_time) in digest.alerts]
+    failed_alerts = set(alerts) - set(sent_alerts)
+
+    # One transaction for the whole run: flag what was sent and drop its alerts, put failures back so the
+    # next run retries them
+    with metrics.span('db_flag'):
+        flagged = set_email_sent(cursor, sent_alerts, EMAIL_SENT, EMAIL_CLAIMED)
+        gatex_alerts.delete(cursor, sent_alerts)
+        set_email_sent(cursor, failed_alerts, EMAIL_PENDING, EMAIL_CLAIMED)
+        gatex_alerts.postpone(cursor, failed_alerts, now_str)
+        connection.commit()
+    metrics.count('digests_sent', len(sent))
+    metrics.count('visits_alerted', flagged)
+    logger.info("Updated email_sent for %d visits.", flagged)
+    logger.info("Sent %d of %d digest emails.", len(sent), len(digests))
+    if len(sent) < len(digests):
+        raise RuntimeError(f"{len(digests) - len(sent)} digest emails could not be sent")
 
 
 def lambda_handler(event, context):
     logger.info("Lambda handler called.")
-    connection = None
     try:
-        logger.info("Connecting to the database.")
-        connection = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
-        logger.info("Database connection established.")
-
-        with connection.cursor() as cursor:
+        with db.transaction() as (connection, cursor):
             logger.info("Cursor created.")
             check_and_send_messages(cursor,connection)  # Pass the IST datetime object to the function
             logger.info("Function check_and_send_messages executed.")
     except Exception as e:
-        logger.error(f"Exception in lambda_handler: {e}")
+        logger.error("Exception in lambda_handler: %s", e)
         return {'statusCode': 500, 'body': json.dumps('Error processing your request.')}
     finally:
-        if connection and connection.is_connected():
-            logger.info("Closing database connection.")
-            connection.close()
+        db.log_stats()
+        metrics.flush()
 
     logger.info("Lambda function execution complete.")
     return {'statusCode': 200, 'body': json.dumps('Process completed successfully!')}
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""
+Due-alert store for overstay notifications.
+
+Instead of the notifier scanning ``trans`` for visits older than the limit,
+sqlRekognitionLambda schedules one ``overstay_alert`` row when it creates a
+visit, with the time the alert falls due, and deletes it again when the exit
+is recorded. The notifier pops the rows whose ``due_at`` has passed through
+an index on ``due_at``, so a run costs in proportion to the alerts that are
+due, not to the size of ``trans``. See sql/004_overstay_alert.sql.
+"""
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger()
+
+# Keys per statement, keeping statements well under max_allowed_packet
+KEY_CHUNK = 500
+
+
+def keyed_chunks(keys, size=KEY_CHUNK):
+    """
+    Split (device_id, batch_id) pairs into chunks for ``(device_id, batch_id) IN (...)`` statements.
+
+    :return: Iterator of (placeholders, params) per chunk, duplicates removed.
+    """
+    keys = sorted(set((int(device_id), int(batch_id)) for device_id, batch_id in keys))
+    for start in range(0, len(keys), size):
+        chunk = keys[start:start + size]
+        yield ", ".join(["(%s, %s)"] * len(chunk)), [value for key in chunk for value in key]
+
+
+def due_time(date, entry_time, minutes):
+    """
+    When the visit that entered at ``date`` ``entry_time`` becomes overdue.
+
+    :param date: 'YYYY-MM-DD' string or date.
+    :param entry_time: 'HH:MM:SS' string or time.
+    """
+    entered = datetime.strptime(f"{date} {entry_time}", '%Y-%m-%d %H:%M:%S')
+    return entered + timedelta(minutes=minutes)
+
+
+def schedule(cursor, device_id, batch_id, due_at):
+    """Schedule the alert of a visit, keeping the earlier due time if it is already scheduled."""
+    cursor.execute("""
+        INSERT INTO overstay_alert (device_id, batch_id, due_at)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE due_at = LEAST(due_at, VALUES(due_at))
+    """, (device_id, batch_id, due_at))
+
+
+def cancel(cursor, device_id, batch_id):
+    """Drop the alert of a visit that has exited. A no-op if none is scheduled."""
+    cursor.execute("DELETE FROM overstay_alert WHERE device_id = %s AND batch_id = %s", (device_id, batch_id))
+
+
+def due(cursor, now):
+    """
+    Run the query for the alerts due at ``now`` and lock them and their visits.
+
+    Rows are (device_id, batch_id, entry_time, exit_time, email_sent); read them
+    with fetchmany(). Visits that already exited, were alerted or no longer
+    exist (email_sent NULL) are returned too, so the caller can drop their
+    stale alerts.
+    """
+    cursor.execute("""
+        SELECT a.device_id, a.batch_id, t.entry_time, t.exit_time, t.email_sent
+        FROM overstay_alert a
+        LEFT JOIN trans t ON t.device_id = a.device_id AND t.batch_id = a.batch_id
+        WHERE a.due_at <= %s
+        ORDER BY a.due_at
+        FOR UPDATE
+    """, (now,))
+
+
+def delete(cursor, keys):
+    """Remove the alerts of the given (device_id, batch_id) visits. The caller commits."""
+    removed = 0
+    for placeholders, params in keyed_chunks(keys):
+        cursor.execute(f"DELETE FROM overstay_alert WHERE (device_id, batch_id) IN ({placeholders})", params)
+        removed += cursor.rowcount
+    return removed
+
+
+def postpone(cursor, keys, due_at):
+    """
+    Move existing alerts to ``due_at``, later or earlier. The caller commits.
+
+    The notifier uses it as a lease: alerts whose emails are being sent are
+    pushed past the run's lifetime instead of deleted, so if the run dies
+    they fall due again.
+    """
+    for placeholders, params in keyed_chunks(keys):
+        cursor.execute(f"UPDATE overstay_alert SET due_at = %s WHERE (device_id, batch_id) IN ({placeholders})",
+                       [due_at] + params)
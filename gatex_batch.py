@@ -0,0 +1,86 @@
+"""
+One-object-per-batch upload format shared by the Pi and the Lambda.
+
+In batch mode the Pi packs every camera image of a visitor plus a small JSON
+manifest into a single uncompressed zip object named
+``{device_id}batch{batch_id}_{YYYY_MM_DD_HH_MM_SS}.zip``. One S3 object means
+one Lambda invocation and one database transaction per visitor, instead of
+one per camera racing on the same ``trans`` row.
+"""
+import json
+import os
+import re
+import zipfile
+from io import BytesIO
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+BATCH_KEY_PATTERN = re.compile(r'(\d{6})batch(\d+)_(\d{4})_(\d{2})_(\d{2})_(\d{2})_(\d{2})_(\d{2})\.zip$')
+IMAGE_NAME_PATTERN = re.compile(r'\d{6}batch\d+camera(\d+)_')
+
+
+class BatchFormatError(Exception):
+    """Raised when a batch archive or its manifest is malformed."""
+
+
+def batch_key(device_id, batch_id, timestamp_formatted):
+    return f"{device_id}batch{batch_id}_{timestamp_formatted}.zip"
+
+
+def write_batch_archive(directory, device_id, batch_id, timestamp_formatted, images):
+    """
+    Pack a batch of captured images into one archive.
+
+    :param directory: Where to write the archive.
+    :param images: Mapping of camera name to image path.
+    :return: Path of the written archive.
+    """
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'device_id': device_id,
+        'batch_id': batch_id,
+        'timestamp': timestamp_formatted,
+        'images': [],
+    }
+    path = os.path.join(directory, batch_key(device_id, batch_id, timestamp_formatted))
+    tmp_path = path + '.tmp'
+    # JPEGs do not compress further, so store them as-is
+    with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for camera_name, image_path in sorted(images.items()):
+            name = os.path.basename(image_path)
+            archive.write(image_path, name)
+            manifest['images'].append({
+                'camera': camera_name,
+                'name': name,
+                'size': os.path.getsize(image_path),
+            })
+        # The manifest goes last so a truncated archive fails to open rather
+        # than looking like a batch with fewer cameras
+        archive.writestr(MANIFEST_NAME, json.dumps(manifest))
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_batch_archive(data):
+    """
+    Unpack a batch archive.
+
+    :param data: Archive bytes as read from S3.
+    :return: ``(manifest, images)`` where images maps camera number (as a
+        string, matching the per-image filename regex) to JPEG bytes.
+    """
+    try:
+        with zipfile.ZipFile(BytesIO(data)) as archive:
+            manifest = json.loads(archive.read(MANIFEST_NAME))
+            if manifest.get('version') != MANIFEST_VERSION:
+                raise BatchFormatError(f"Unsupported manifest version: {manifest.get('version')}")
+            images = {}
+            for entry in manifest['images']:
+                match = IMAGE_NAME_PATTERN.match(entry['name'])
+                if not match:
+                    raise BatchFormatError(f"Unexpected image name in manifest: {entry['name']}")
+                images[match.group(1)] = archive.read(entry['name'])
+    except (zipfile.BadZipFile, KeyError, ValueError) as e:
+        raise BatchFormatError(f"Malformed batch archive: {str(e)}") from e
+    return manifest, images
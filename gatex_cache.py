@@ -0,0 +1,128 @@
+"""
+Rekognition result cache for the Gatex Lambda.
+
+Responses are keyed by the detector operation and the image identity, which
+is ``(bucket, key, ETag)`` for S3 objects and a content hash for inline
+bytes. An in-memory tier removes repeat calls on the same image within one
+invocation, e.g. an object delivered twice in one batched event. The optional
+S3 sidecar tier keeps responses across retries and redeliveries of the same
+object. Keep the sidecar bucket separate from the upload bucket, otherwise
+every sidecar write fires another Lambda invocation.
+"""
+import hashlib
+import json
+import logging
+import threading
+
+logger = logging.getLogger()
+
+
+class DetectionCache:
+    """
+    Two-tier cache for Rekognition responses.
+
+    :param s3_client: Client used for ETag lookups and the sidecar tier.
+    :param sidecar_bucket: Bucket for durable sidecar objects. ``None``
+        disables the durable tier.
+    :param sidecar_prefix: Key prefix for sidecar objects.
+    """
+
+    def __init__(self, s3_client, sidecar_bucket=None, sidecar_prefix='detection-cache/'):
+        self.s3_client = s3_client
+        self.sidecar_bucket = sidecar_bucket
+        self.sidecar_prefix = sidecar_prefix
+        self._etags = {}
+        self._memory = {}
+        # Detectors run on a thread pool, so counter updates are guarded
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.durable_hits = 0
+        self.misses = 0
+
+    def begin_invocation(self):
+        """Reset the in-memory tier and counters at the start of an invocation."""
+        self._etags.clear()
+        self._memory.clear()
+        self.hits = self.durable_hits = self.misses = 0
+
+    def remember_etag(self, bucket_name, image_key, etag):
+        """Record an ETag from the S3 event so no HeadObject call is needed."""
+        if etag:
+            self._etags[(bucket_name, image_key)] = etag.strip('"')
+
+    def _etag(self, bucket_name, image_key):
+        etag = self._etags.get((bucket_name, image_key))
+        if etag is None:
+            response = self.s3_client.head_object(Bucket=bucket_name, Key=image_key)
+            etag = response['ETag'].strip('"')
+            self._etags[(bucket_name, image_key)] = etag
+        return etag
+
+    def cache_key(self, operation, bucket_name, image_key, image_bytes=None):
+        if image_bytes is not None:
+            identity = 'sha256-' + hashlib.sha256(image_bytes).hexdigest()
+        else:
+            identity = f"{bucket_name}/{image_key}@{self._etag(bucket_name, image_key)}"
+        return f"{operation}/{identity}"
+
+    def _sidecar_key(self, cache_key):
+        return self.sidecar_prefix + hashlib.sha256(cache_key.encode()).hexdigest() + '.json'
+
+    def _read_sidecar(self, cache_key):
+        try:
+            response = self.s3_client.get_object(Bucket=self.sidecar_bucket, Key=self._sidecar_key(cache_key))
+            return json.loads(response['Body'].read())
+        except self.s3_client.exceptions.NoSuchKey:
+            return None
+        except Exception as e:
+            logger.warning("Detection cache sidecar read failed: %s", e)
+            return None
+
+    def _write_sidecar(self, cache_key, result):
+        try:
+            self.s3_client.put_object(Bucket=self.sidecar_bucket, Key=self._sidecar_key(cache_key),
+                                      Body=json.dumps(result), ContentType='application/json')
+        except Exception as e:
+            logger.warning("Detection cache sidecar write failed: %s", e)
+
+    def get_or_call(self, operation, bucket_name, image_key, image_bytes, call):
+        """
+        Return the cached response for this image and operation, or run ``call()`` and cache it.
+
+        :param operation: Detector operation name, e.g. ``detect_text``.
+        :param call: Zero-argument callable performing the Rekognition request.
+        """
+        try:
+            cache_key = self.cache_key(operation, bucket_name, image_key, image_bytes)
+        except Exception as e:
+            # Without an image identity we cannot cache safely, so just call through
+            logger.warning("Detection cache disabled for %s: %s", image_key, e)
+            self._count('misses')
+            return call()
+
+        if cache_key in self._memory:
+            self._count('hits')
+            return self._memory[cache_key]
+
+        if self.sidecar_bucket:
+            result = self._read_sidecar(cache_key)
+            if result is not None:
+                self._count('durable_hits')
+                self._memory[cache_key] = result
+                return result
+
+        self._count('misses')
+        result = call()
+        # Drop the HTTP metadata, it differs per call and is not needed downstream
+        result = {k: v for k, v in result.items() if k != 'ResponseMetadata'}
+        self._memory[cache_key] = result
+        if self.sidecar_bucket:
+            self._write_sidecar(cache_key, result)
+        return result
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def log_stats(self):
+        logger.info("Detection cache: hits=%d durable_hits=%d misses=%d", self.hits, self.durable_hits, self.misses)
@@ -0,0 +1,249 @@
+"""
+In-process camera capture engine for the Gatex edge device.
+
+Each configured camera is opened once and kept streaming on its own reader
+thread, which only grabs frames without decoding them, so a capture only has
+to decode and encode the most recent frame instead of reopening the V4L2
+device and waiting for auto-exposure like ``fswebcam`` does. ``FileCamera``
+serves frames from JPEG files on disk and stands in for real devices in
+tests and benchmarks. With a ``gatex_quality.QualityGate`` the engine
+retakes dark or blurred frames and keeps rejected ones out of the upload
+path.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gatex_quality import DUPLICATE
+
+
+class CameraError(Exception):
+    """Raised when a camera cannot be opened or has no frame to give."""
+
+
+class V4L2Camera:
+    """
+    A USB webcam kept open through OpenCV's V4L2 backend.
+
+    :param device: Device node, e.g. ``/dev/video0``.
+    :param width: Requested frame width.
+    :param height: Requested frame height.
+    :param quality: JPEG quality used when a frame is captured.
+    :param warmup_frames: Frames discarded after opening while exposure settles.
+    """
+
+    def __init__(self, device, width=1920, height=1080, quality=90, warmup_frames=10):
+        import cv2
+        self._cv2 = cv2
+        self.device = device
+        self.quality = quality
+
+        self._cap = cv2.VideoCapture(device, cv2.CAP_V4L2)
+        if not self._cap.isOpened():
+            raise CameraError(f"Could not open camera {device}")
+        # MJPG keeps 1080p within USB 2.0 bandwidth when several cameras stream at once
+        self._cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        for _ in range(warmup_frames):
+            self._cap.grab()
+
+        self._frame_at = 0.0
+        # VideoCapture is not thread safe; the lock also keeps a retrieve() from landing between two grab()s
+        self._lock = threading.Lock()
+        self._running = True
+        self._reader = threading.Thread(target=self._read_loop, name=f"camera-{device}", daemon=True)
+        self._reader.start()
+
+    def _read_loop(self):
+        # grab() only dequeues the MJPG buffer so the driver always holds the newest frame; decoding 30 frames a
+        # second per camera only to keep one would cost a Pi core
+        while self._running:
+            with self._lock:
+                ok = self._cap.grab()
+                if ok:
+                    self._frame_at = time.monotonic()
+            if not ok:
+                logging.error("Camera %s returned no frame. Retrying.", self.device)
+                time.sleep(0.5)
+
+    def read_jpeg(self):
+        """Decode the latest grabbed frame and encode it as JPEG bytes."""
+        with self._lock:
+            if not self._frame_at:
+                raise CameraError(f"Camera {self.device} has not produced a frame yet")
+            ok, frame = self._cap.retrieve()
+        if not ok:
+            raise CameraError(f"Failed to decode frame from {self.device}")
+        ok, buf = self._cv2.imencode('.jpg', frame, [self._cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise CameraError(f"Failed to encode frame from {self.device}")
+        return buf.tobytes()
+
+    def close(self):
+        self._running = False
+        self._reader.join(timeout=2)
+        self._cap.release()
+
+
+class FileCamera:
+    """
+    Fake camera that cycles through JPEG files, for tests and benchmarks.
+
+    :param paths: JPEG files to serve, in order. Raw bytes are also accepted.
+    :param delay: Seconds each capture takes, to mimic a real device.
+    """
+
+    def __init__(self, paths, delay=0.0):
+        frames = []
+        for path in paths:
+            if isinstance(path, bytes):
+                frames.append(path)
+            else:
+                with open(path, 'rb') as file:
+                    frames.append(file.read())
+        if not frames:
+            raise CameraError("FileCamera needs at least one frame")
+        self._frames = itertools.cycle(frames)
+        self._lock = threading.Lock()
+        self.delay = delay
+
+    def read_jpeg(self):
+        if self.delay:
+            time.sleep(self.delay)
+        with self._lock:
+            return next(self._frames)
+
+    def close(self):
+        pass
+
+
+class CaptureEngine:
+    """
+    Keeps every configured camera open and captures them in parallel.
+
+    :param cameras: Mapping of camera name to an opened camera object
+        (``V4L2Camera``, ``FileCamera`` or anything with ``read_jpeg()``).
+    :param gate: Optional ``gatex_quality.QualityGate`` every frame must pass.
+    :param retakes: Further frames read when one is dark, bright or blurred.
+    :param retake_delay: Seconds to wait before a retake, so the reader
+        thread has a new frame.
+    :param reject_dir: Directory rejected frames are written to for
+        inspection instead of being uploaded. None discards them.
+    :param reject_keep: Most recent rejected frames kept in ``reject_dir``.
+        It usually shares the SD card with the upload spool, so older ones
+        are deleted rather than left to fill it.
+    """
+
+    def __init__(self, cameras, gate=None, retakes=1, retake_delay=0.2, reject_dir=None, reject_keep=200):
+        self.cameras = dict(cameras)
+        self.gate = gate
+        self.retakes = retakes
+        self.retake_delay = retake_delay
+        self.reject_dir = reject_dir
+        self.reject_keep = reject_keep
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.cameras)),
+                                        thread_name_prefix='capture')
+
+    @classmethod
+    def open_v4l2(cls, camera_usb_ports, gate=None, reject_dir=None, **options):
+        """Open every device in a ``{device: camera_name}`` mapping."""
+        cameras = {}
+        for device, camera_name in camera_usb_ports.items():
+            try:
+                cameras[camera_name] = V4L2Camera(device, **options)
+            except CameraError as e:
+                logging.error("Failed to open %s on %s: %s", camera_name, device, e)
+        return cls(cameras, gate=gate, reject_dir=reject_dir)
+
+    def _take(self, camera_name):
+        """
+        Read a frame, retaking it while the gate rejects it as dark, bright or blurred.
+
+        :return: ``(data, verdict)``; verdict is None without a gate. None if the camera failed.
+        """
+        start = time.monotonic()
+        camera = self.cameras[camera_name]
+        try:
+            data = camera.read_jpeg()
+            verdict = self.gate.check(camera_name, data) if self.gate else None
+            for _ in range(self.retakes):
+                if verdict is None or verdict.ok:
+                    break
+                time.sleep(self.retake_delay)
+                data = camera.read_jpeg()
+                verdict = self.gate.check(camera_name, data)
+        except Exception as e:
+            logging.error("Failed to capture photo from %s: %s", camera_name, e)
+            return None
+        logging.info("Captured %s in %.3fs", camera_name, time.monotonic() - start)
+        return data, verdict
+
+    def _flag(self, camera_name, path, data, reason):
+        logging.warning("Not uploading %s frame for %s: %s", camera_name, path, reason)
+        if not self.reject_dir:
+            return
+        try:
+            os.makedirs(self.reject_dir, exist_ok=True)
+            with open(os.path.join(self.reject_dir, f"{reason}_{os.path.basename(path)}"), 'wb') as file:
+                file.write(data)
+            # File names start with the reason, so sort by age to keep the newest
+            entries = sorted(os.scandir(self.reject_dir), key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:max(0, len(entries) - self.reject_keep)]:
+                os.remove(entry.path)
+        except OSError as e:
+            logging.error("Failed to keep rejected frame %s: %s", path, e)
+
+    def capture(self, paths):
+        """
+        Capture all cameras at once and write each frame to its path.
+
+        Frames the gate rejects are flagged instead of written, and so is the
+        whole batch when the gate sees it as a double press.
+
+        :param paths: Mapping of camera name to destination file path. The
+            caller builds these from one shared batch timestamp.
+        :return: Mapping of camera name to the written path, or None for
+            cameras that failed or whose frame was not written.
+        """
+        futures = {}
+        results = {}
+        for camera_name, path in paths.items():
+            results[camera_name] = None
+            if camera_name not in self.cameras:
+                logging.error("Camera %s is not open.", camera_name)
+                continue
+            futures[camera_name] = self._pool.submit(self._take, camera_name)
+        taken = {camera_name: future.result() for camera_name, future in futures.items()}
+        taken = {camera_name: frame for camera_name, frame in taken.items() if frame is not None}
+
+        verdicts = [verdict for _, verdict in taken.values()]
+        double_press = self.gate is not None and self.gate.is_double_press(verdicts)
+        if not double_press and self.gate is not None and self.gate.is_suspected_repeat(verdicts):
+            logging.warning("Batch %s may repeat the previous one, too few cameras agree to drop it. Uploading it.",
+                            ', '.join(os.path.basename(paths[camera_name]) for camera_name in taken))
+        for camera_name, (data, verdict) in taken.items():
+            path = paths[camera_name]
+            if double_press:
+                self._flag(camera_name, path, data, DUPLICATE)
+                continue
+            if verdict is not None and not verdict.ok:
+                self._flag(camera_name, path, data, verdict.reason)
+                continue
+            try:
+                with open(path, 'wb') as file:
+                    file.write(data)
+            except OSError as e:
+                logging.error("Failed to write photo from %s: %s", camera_name, e)
+                continue
+            results[camera_name] = path
+        return results
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        for camera in self.cameras.values():
+            camera.close()
@@ -0,0 +1,48 @@
+"""
+AWS clients that are only built when first used.
+
+Importing boto3 and creating a client is a large part of a Lambda's cold
+start init, and an invocation that never calls S3 or SES should not pay for
+them. A ``LazyClient`` stands in for the client at module level and is
+passed around like one. The first method call imports boto3, builds the
+client and keeps it for the life of the container, so warm invocations pay
+nothing.
+"""
+import threading
+
+
+class LazyClient:
+    """
+    A boto3 client created on first attribute access.
+
+    :param service_name: e.g. ``'s3'``.
+    :param client_kwargs: Passed to ``boto3.client``.
+    """
+
+    def __init__(self, service_name, **client_kwargs):
+        self._service_name = service_name
+        self._client_kwargs = client_kwargs
+        self._client = None
+        # Detector threads may make the first call at the same time
+        self._lock = threading.Lock()
+
+    @property
+    def built(self):
+        return self._client is not None
+
+    def get(self):
+        """Return the real client, creating it on the first call."""
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    import boto3
+                    self._client = boto3.client(self._service_name, **self._client_kwargs)
+                client = self._client
+        return client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __repr__(self):
+        return f"LazyClient({self._service_name!r}, built={self.built})"
@@ -0,0 +1,144 @@
+"""
+MySQL connection reuse for the Gatex Lambdas.
+
+A ``ConnectionManager`` lives at module level, so its connection survives
+across warm invocations of the same Lambda container. Every use goes through
+``transaction()``, which health-checks the connection, reconnects if it has
+gone away, and commits or rolls back the invocation's work. ``run()`` wraps
+it and retries the work when InnoDB picks it as a deadlock victim, which
+concurrent ``INSERT ... ON DUPLICATE KEY UPDATE`` on the same key does.
+"""
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger()
+
+# MySQL errors that only mean the transaction lost a race and can run again: lock wait timeout, deadlock
+RETRYABLE_ERRNOS = (1205, 1213)
+
+
+class ConnectionManager:
+    """
+    Keeps one MySQL connection open between invocations.
+
+    :param connect: Callable returning a new DB-API connection. Defaults to
+        ``mysql.connector.connect``. Pass a stand-in for tests.
+    :param ping_after: Seconds a connection may sit idle before it is pinged
+        on the next use. Connections used more recently are trusted.
+    :param deadlock_retries: Times ``run()`` repeats work that hit a
+        deadlock or lock wait timeout before giving up.
+    :param connect_kwargs: Passed to ``connect``.
+    """
+
+    def __init__(self, connect=None, ping_after=5.0, deadlock_retries=3, **connect_kwargs):
+        self._connect = connect
+        self.ping_after = ping_after
+        self.deadlock_retries = deadlock_retries
+        self.connect_kwargs = connect_kwargs
+        self._conn = None
+        self._last_used = 0.0
+        self.connects = 0
+        self.reuses = 0
+        self.connect_seconds = 0.0
+        self.deadlocks = 0
+
+    def _open(self):
+        if self._connect is None:
+            import mysql.connector
+            self._connect = mysql.connector.connect
+        start = time.monotonic()
+        conn = self._connect(**self.connect_kwargs)
+        elapsed = time.monotonic() - start
+        self.connects += 1
+        self.connect_seconds += elapsed
+        logger.info("Opened database connection in %.1fms", elapsed * 1000)
+        return conn
+
+    def _healthy(self, conn):
+        if time.monotonic() - self._last_used < self.ping_after:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception as e:
+            logger.warning("Database connection failed health check: %s", e)
+            return False
+
+    def connection(self):
+        """Return a live connection, reusing the warm one when it is still healthy."""
+        if self._conn is not None and self._healthy(self._conn):
+            self.reuses += 1
+        else:
+            self.discard()
+            self._conn = self._open()
+        self._last_used = time.monotonic()
+        return self._conn
+
+    @contextmanager
+    def transaction(self, **cursor_kwargs):
+        """
+        Run a unit of work on the warm connection.
+
+        Commits when the block exits normally and rolls back if it raises. A
+        connection that errors during rollback is discarded so the next
+        invocation starts from a fresh one.
+
+        :param cursor_kwargs: Passed to ``conn.cursor()``, e.g. ``dictionary=True``.
+        :return: Yields ``(conn, cursor)``.
+        """
+        conn = self.connection()
+        cursor = conn.cursor(**cursor_kwargs)
+        try:
+            yield conn, cursor
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception as e:
+                logger.error("Rollback failed, dropping connection: %s", e)
+                self.discard()
+            raise
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+            self._last_used = time.monotonic()
+
+    def run(self, work, **cursor_kwargs):
+        """
+        Call ``work(conn, cursor)`` in a transaction and return its result.
+
+        When MySQL rolls the transaction back as a deadlock victim or after a
+        lock wait timeout, the whole unit of work runs again, after a short
+        jittered backoff, up to ``deadlock_retries`` times. Any other error,
+        or the last retryable one, is raised. ``work`` must be safe to repeat.
+        """
+        for attempt in range(self.deadlock_retries + 1):
+            try:
+                with self.transaction(**cursor_kwargs) as (conn, cursor):
+                    return work(conn, cursor)
+            except Exception as e:
+                if getattr(e, 'errno', None) not in RETRYABLE_ERRNOS or attempt == self.deadlock_retries:
+                    raise
+                self.deadlocks += 1
+                delay = 0.02 * 2 ** attempt * random.uniform(0.5, 1.5)
+                logger.warning("Transaction lost a lock race (%s), retrying in %.0fms", e.errno, delay * 1000)
+                time.sleep(delay)
+
+    def discard(self):
+        """Close and forget the current connection."""
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def log_stats(self):
+        avg_connect = self.connect_seconds / self.connects if self.connects else 0.0
+        logger.info("DB connections: opened=%d reused=%d avg_connect=%.1fms connect_time_avoided=%.0fms "
+                    "deadlock_retries=%d", self.connects, self.reuses, avg_connect * 1000,
+                    self.reuses * avg_connect * 1000, self.deadlocks)
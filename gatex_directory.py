@@ -0,0 +1,129 @@
+"""
+Device-keyed view of the Gatex master tables.
+
+``customer_master`` and ``location_master`` both store their devices as a
+JSON array in ``device_id``. Looking a device up with ``JSON_CONTAINS`` is a
+full table scan per alert, so ``DeviceDirectory`` loads both tables once into
+a dict keyed by integer device ID and keeps it across warm invocations. It
+reloads when ``CHECKSUM TABLE`` reports a change or the TTL runs out, so a run
+costs a fixed number of queries however many alerts are due.
+
+Each customer can set its own overstay limit in
+``customer_master.overstay_minutes``; devices of customers without one use
+the directory's default.
+"""
+import json
+import logging
+import time
+
+logger = logging.getLogger()
+
+# Overstay limit for customers that have not set their own
+DEFAULT_OVERSTAY_MINUTES = 120
+
+
+class DeviceInfo:
+    """Who to alert for a device and where the device is installed."""
+
+    __slots__ = ('device_id', 'customer_id', 'contact_email', 'project_name', 'building_name', 'overstay_minutes')
+
+    def __init__(self, device_id, customer_id=None, contact_email=None,
+                 project_name="Unknown", building_name="Unknown", overstay_minutes=DEFAULT_OVERSTAY_MINUTES):
+        self.device_id = device_id
+        self.customer_id = customer_id
+        self.contact_email = contact_email
+        self.project_name = project_name
+        self.building_name = building_name
+        self.overstay_minutes = overstay_minutes
+
+    def __repr__(self):
+        return (f"DeviceInfo({self.device_id}, customer={self.customer_id}, "
+                f"project={self.project_name!r}, building={self.building_name!r})")
+
+
+def _rows(cursor):
+    """Fetch all rows as dicts, whichever cursor type the caller uses."""
+    rows = cursor.fetchall()
+    if rows and not isinstance(rows[0], dict):
+        names = [column[0] for column in cursor.description]
+        rows = [dict(zip(names, row)) for row in rows]
+    return rows
+
+
+def _device_ids(device_id_json, owner):
+    try:
+        return [int(device_id) for device_id in json.loads(device_id_json or '[]')]
+    except (ValueError, TypeError):
+        logger.error("Invalid device_id JSON for %s: %r", owner, device_id_json)
+        return []
+
+
+class DeviceDirectory:
+    """
+    Cached ``{device_id: DeviceInfo}`` built from the master tables.
+
+    :param ttl: Seconds after which the tables are reloaded even if their
+        checksum did not change.
+    :param checksum_interval: Seconds between checksum checks. 0 checks on
+        every call; callers on a hot path trade that much staleness for the
+        extra round trip.
+    :param default_overstay_minutes: Limit for customers without their own.
+    """
+
+    def __init__(self, ttl=300.0, checksum_interval=0.0, default_overstay_minutes=DEFAULT_OVERSTAY_MINUTES):
+        self.ttl = ttl
+        self.checksum_interval = checksum_interval
+        self.default_overstay_minutes = default_overstay_minutes
+        self._devices = None
+        self._checksum = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+
+    def _table_checksum(self, cursor):
+        cursor.execute("CHECKSUM TABLE customer_master, location_master")
+        return tuple((row['Table'], row['Checksum']) for row in _rows(cursor))
+
+    def _load(self, cursor):
+        devices = {}
+        cursor.execute("SELECT customer_id, device_id, contact_person_emailID, overstay_minutes FROM customer_master")
+        for row in _rows(cursor):
+            # 0 is a real setting (alert on any visit still open), only NULL falls back
+            minutes = self.default_overstay_minutes if row['overstay_minutes'] is None else row['overstay_minutes']
+            for device_id in _device_ids(row['device_id'], f"customer {row['customer_id']}"):
+                devices[device_id] = DeviceInfo(device_id, row['customer_id'], row['contact_person_emailID'],
+                                                overstay_minutes=minutes)
+
+        cursor.execute("SELECT device_id, project_name, building_name FROM location_master")
+        for row in _rows(cursor):
+            for device_id in _device_ids(row['device_id'], f"location {row['project_name']}"):
+                info = devices.setdefault(device_id, DeviceInfo(device_id, overstay_minutes=self.default_overstay_minutes))
+                # The first location listing a device wins, as JSON_CONTAINS ... fetchone() did
+                if info.project_name == "Unknown" and info.building_name == "Unknown":
+                    info.project_name = row['project_name']
+                    info.building_name = row['building_name']
+        return devices
+
+    def devices(self, cursor):
+        """Return the device map, reloading it if the master tables changed or the TTL expired."""
+        now = time.monotonic()
+        expired = now - self._loaded_at > self.ttl
+        if self._devices is not None and not expired and now - self._checked_at < self.checksum_interval:
+            return self._devices
+        checksum = self._table_checksum(cursor)
+        self._checked_at = now
+        if self._devices is None or expired or checksum != self._checksum:
+            start = time.monotonic()
+            self._devices = self._load(cursor)
+            self._checksum = checksum
+            self._loaded_at = time.monotonic()
+            logger.info("Loaded device directory: %d devices in %.1fms", len(self._devices),
+                        (self._loaded_at - start) * 1000)
+        return self._devices
+
+    def get(self, cursor, device_id):
+        return self.devices(cursor).get(int(device_id))
+
+    def overstay_minutes(self, cursor, device_id):
+        """Overstay limit of the customer owning ``device_id``, or the default for unknown devices."""
+        device = self.get(cursor, device_id)
+        return device.overstay_minutes if device else self.default_overstay_minutes
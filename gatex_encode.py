@@ -0,0 +1,117 @@
+"""
+Per-camera resize/recompress profiles applied on the Pi before upload.
+
+Rekognition's ``detect_text`` and ``detect_faces`` do not need full 1080p
+frames, and every byte we keep costs uplink time and S3 transfer. Each
+camera gets an ``EncodeProfile`` that bounds the output dimensions, sets the
+JPEG quality and can convert to grayscale or crop to a region of interest.
+"""
+import logging
+import os
+import time
+from io import BytesIO
+
+
+class EncodeProfile:
+    """
+    How one camera's photos are re-encoded before upload.
+
+    :param max_size: ``(width, height)`` bound. Aspect ratio is preserved and
+        images are never upscaled.
+    :param quality: JPEG quality, 1-95.
+    :param grayscale: Convert to single-channel grayscale.
+    :param crop: Optional region of interest as fractions of the frame,
+        ``(left, top, right, bottom)``, applied before resizing.
+    """
+
+    def __init__(self, max_size=(1920, 1080), quality=85, grayscale=False, crop=None):
+        self.max_size = tuple(max_size)
+        self.quality = quality
+        self.grayscale = grayscale
+        self.crop = crop
+
+    def __repr__(self):
+        return (f"EncodeProfile(max_size={self.max_size}, quality={self.quality}, "
+                f"grayscale={self.grayscale}, crop={self.crop})")
+
+
+def encode_bytes(data, profile):
+    """
+    Re-encode JPEG bytes according to ``profile``.
+
+    :return: The re-encoded JPEG bytes.
+    """
+    from PIL import Image
+
+    img = Image.open(BytesIO(data))
+    target = profile.max_size
+    if profile.crop:
+        # The crop is a fraction of the frame, so scale the draft target up to
+        # still have enough pixels left after cropping.
+        left, top, right, bottom = profile.crop
+        target = (int(target[0] / max(right - left, 0.01)), int(target[1] / max(bottom - top, 0.01)))
+    # JPEG draft mode lets libjpeg decode at 1/2, 1/4 or 1/8 scale directly
+    img.draft('L' if profile.grayscale else 'RGB', target)
+
+    if profile.crop:
+        left, top, right, bottom = profile.crop
+        img = img.crop((int(left * img.width), int(top * img.height),
+                        int(right * img.width), int(bottom * img.height)))
+    if profile.grayscale:
+        img = img.convert('L')
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.thumbnail(profile.max_size, Image.LANCZOS)
+
+    out = BytesIO()
+    img.save(out, format='JPEG', quality=profile.quality, optimize=True)
+    return out.getvalue()
+
+
+def encode_file(path, profile):
+    """
+    Re-encode a JPEG file in place.
+
+    The original is kept when re-encoding would not make it smaller.
+
+    :return: ``(original_bytes, encoded_bytes, seconds)``
+    """
+    start = time.monotonic()
+    with open(path, 'rb') as file:
+        data = file.read()
+    encoded = encode_bytes(data, profile)
+    if len(encoded) < len(data):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(encoded)
+        os.replace(tmp_path, path)
+        size = len(encoded)
+    else:
+        size = len(data)
+    return len(data), size, time.monotonic() - start
+
+
+def encode_batch(images, profiles):
+    """
+    Apply each camera's profile to a batch of captured files.
+
+    :param images: Mapping of camera name to file path.
+    :param profiles: Mapping of camera name to ``EncodeProfile``. Cameras
+        without a profile are uploaded untouched.
+    :return: ``(bytes_saved, seconds)`` for the whole batch.
+    """
+    saved = 0
+    elapsed = 0.0
+    for camera_name, path in images.items():
+        profile = profiles.get(camera_name)
+        if profile is None:
+            continue
+        try:
+            original, encoded, seconds = encode_file(path, profile)
+        except Exception as e:
+            # An unencoded photo is still better than no photo
+            logging.error("Failed to encode %s: %s", path, e)
+            continue
+        saved += original - encoded
+        elapsed += seconds
+    return saved, elapsed
@@ -0,0 +1,108 @@
+"""
+Button trigger backends for the Gatex edge device.
+
+A trigger turns button presses into ``PressEvent`` objects on a queue that
+the capture loop consumes. ``RPiGPIOTrigger`` uses edge interrupts from
+RPi.GPIO, ``SimulatedTrigger`` is driven from code so trigger-to-capture
+latency can be measured on a machine without GPIO hardware.
+"""
+import logging
+import queue
+import threading
+import time
+
+
+class PressEvent:
+    """A debounced button press. ``pressed_at`` is a time.monotonic() value."""
+
+    __slots__ = ('pressed_at',)
+
+    def __init__(self, pressed_at):
+        self.pressed_at = pressed_at
+
+    def latency(self):
+        """Seconds since the press was detected."""
+        return time.monotonic() - self.pressed_at
+
+
+class ButtonTrigger:
+    """
+    Common debounce and queueing logic for button backends.
+
+    :param debounce: Software debounce window in seconds. Edges closer than
+        this to the previous accepted press are dropped.
+    :param maxsize: Bound of the press queue. Presses arriving while it is
+        full are dropped and logged.
+    """
+
+    def __init__(self, debounce=0.2, maxsize=16):
+        self.debounce = debounce
+        self.presses = queue.Queue(maxsize=maxsize)
+        self._last_press = None
+        self._lock = threading.Lock()
+        self.stale_presses = 0
+
+    def _on_edge(self, *args):
+        now = time.monotonic()
+        with self._lock:
+            if self._last_press is not None and now - self._last_press < self.debounce:
+                return
+            self._last_press = now
+        try:
+            self.presses.put_nowait(PressEvent(now))
+        except queue.Full:
+            logging.warning("Press queue full. Dropping button press.")
+
+    def wait(self, timeout=None, max_age=None):
+        """
+        Return the next press, or None if ``timeout`` expires first.
+
+        :param max_age: Presses that waited in the queue longer than this many
+            seconds, e.g. while a capture ran or capture was throttled, are
+            discarded instead of replayed as new visitors.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                press = self.presses.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if max_age is None or press.latency() <= max_age:
+                return press
+            self.stale_presses += 1
+            logging.warning("Discarding button press from %.1fs ago.", press.latency())
+
+    def close(self):
+        pass
+
+
+class RPiGPIOTrigger(ButtonTrigger):
+    """
+    Falling-edge interrupt on a BCM pin wired to ground through the button.
+
+    RPi.GPIO's own ``bouncetime`` filters contact bounce in the kernel
+    callback thread, the software window in ``ButtonTrigger`` covers the
+    rest.
+    """
+
+    def __init__(self, pin, debounce=0.2, maxsize=16):
+        super().__init__(debounce, maxsize)
+        import RPi.GPIO as GPIO
+        self._gpio = GPIO
+        self.pin = pin
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # Using pull-up resistor
+        GPIO.add_event_detect(pin, GPIO.FALLING, callback=self._on_edge,
+                              bouncetime=max(1, int(debounce * 1000)))
+
+    def close(self):
+        self._gpio.remove_event_detect(self.pin)
+        self._gpio.cleanup()
+
+
+class SimulatedTrigger(ButtonTrigger):
+    """Trigger backend driven by ``press()`` calls, for tests and benchmarks."""
+
+    def press(self):
+        self._on_edge()
@@ -0,0 +1,296 @@
+"""
+Maintenance jobs for the Gatex database.
+
+Run from a machine that can reach the database, with the same DB_HOST,
+DB_USER, DB_PASSWORD and DB_DATABASE (or DB_NAME) environment variables the
+Lambdas use:
+
+    python gatex_jobs.py backfill-name-key --chunk-size 1000
+    python gatex_jobs.py dedupe-batches
+    THUMBNAIL_BUCKET=... python gatex_jobs.py migrate-thumbnails --chunk-size 200
+    python gatex_jobs.py rebuild-rollups --since 2024-01-01
+    python gatex_jobs.py requeue-claims 111:4021 111:4022
+"""
+import argparse
+import logging
+import os
+import time
+
+import gatex_alerts
+import gatex_rollup
+from gatex_db import ConnectionManager
+from gatex_names import name_key
+from gatex_thumbnails import store_from_env, store_thumbnail
+
+logger = logging.getLogger()
+
+
+def _require_trans_id(db):
+    """Refuse to page by trans.id on a table created before the column existed."""
+    with db.transaction() as (conn, cursor):
+        cursor.execute("""
+            SELECT 1
+            FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'trans' AND COLUMN_NAME = 'id'
+        """)
+        if cursor.fetchone() is None:
+            raise RuntimeError("trans has no id column to page by, see sql/schema.sql")
+
+
+def backfill_name_keys(db, chunk_size=1000):
+    """
+    Compute trans.name_key for rows written before the column existed.
+
+    Walks trans in ``id`` order, ``chunk_size`` rows at a time, one
+    transaction each, so it can run against a live database and be
+    interrupted and resumed. Paging by id instead of re-selecting
+    ``name_key IS NULL`` means a row whose key stays NULL is read once,
+    not on every chunk.
+
+    :return: Number of rows updated.
+    """
+    _require_trans_id(db)
+
+    total = 0
+    last_id = 0
+    while True:
+        with db.transaction(dictionary=True) as (conn, cursor):
+            cursor.execute("""
+                SELECT id, visitor_ID_Details
+                FROM trans
+                WHERE id > %s AND name_key IS NULL
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, chunk_size))
+            rows = cursor.fetchall()
+            if rows:
+                cursor.executemany("""
+                    UPDATE trans
+                    SET name_key = %s
+                    WHERE id = %s AND name_key IS NULL
+                """, [(name_key(row['visitor_ID_Details']), row['id']) for row in rows])
+        if not rows:
+            return total
+        last_id = rows[-1]['id']
+        total += len(rows)
+        logger.info("Backfilled name_key for %d rows", total)
+        if len(rows) < chunk_size:
+            return total
+
+
+def dedupe_batches(db):
+    """
+    Merge duplicate trans rows of the same (device_id, batch_id).
+
+    Rows written by concurrent camera invocations before the unique key
+    existed are folded into one: earliest date and entry_time, latest
+    exit_time, first non-empty value of every detected column, and
+    email_sent if any copy was alerted. Run before
+    sql/002_trans_device_batch_unique.sql.
+
+    :return: Number of duplicate rows removed.
+    """
+    with db.transaction(dictionary=True) as (conn, cursor):
+        cursor.execute("""
+            SELECT device_id, batch_id, COUNT(*) AS copies
+            FROM trans
+            GROUP BY device_id, batch_id
+            HAVING COUNT(*) > 1
+        """)
+        groups = cursor.fetchall()
+
+    removed = 0
+    for group in groups:
+        with db.transaction(dictionary=True) as (conn, cursor):
+            cursor.execute("""
+                SELECT date, day, entry_time, exit_time, visitor_ID_Details, vehicle_no,
+                       visitor_image_thumbnail, email_sent, name_key
+                FROM trans
+                WHERE device_id = %s AND batch_id = %s
+                ORDER BY date, entry_time
+                FOR UPDATE
+            """, (group['device_id'], group['batch_id']))
+            rows = cursor.fetchall()
+            merged = dict(rows[0])
+            for row in rows[1:]:
+                for column in ('visitor_ID_Details', 'vehicle_no', 'visitor_image_thumbnail', 'name_key'):
+                    if not merged[column] and row[column]:
+                        merged[column] = row[column]
+                if row['exit_time'] is not None and (merged['exit_time'] is None or row['exit_time'] > merged['exit_time']):
+                    merged['exit_time'] = row['exit_time']
+                merged['email_sent'] = max(merged['email_sent'] or 0, row['email_sent'] or 0)
+
+            # Make every copy identical, then drop all but one
+            cursor.execute("""
+                UPDATE trans
+                SET date = %s, day = %s, entry_time = %s, exit_time = %s, visitor_ID_Details = %s,
+                    vehicle_no = %s, visitor_image_thumbnail = %s, email_sent = %s, name_key = %s
+                WHERE device_id = %s AND batch_id = %s
+            """, (merged['date'], merged['day'], merged['entry_time'], merged['exit_time'],
+                  merged['visitor_ID_Details'], merged['vehicle_no'], merged['visitor_image_thumbnail'],
+                  merged['email_sent'], merged['name_key'], group['device_id'], group['batch_id']))
+            cursor.execute("DELETE FROM trans WHERE device_id = %s AND batch_id = %s LIMIT %s",
+                           (group['device_id'], group['batch_id'], len(rows) - 1))
+            removed += len(rows) - 1
+    logger.info("Merged %d duplicated batches, removed %d rows", len(groups), removed)
+    return removed
+
+
+def migrate_thumbnails(db, store, chunk_size=200):
+    """
+    Move face thumbnails from trans.visitor_image_thumbnail into ``store``.
+
+    Walks trans in ``id`` order, ``chunk_size`` rows at a time, so at most
+    one chunk of blobs is held in memory. Each chunk is read without locking
+    rows, written to the store outside any transaction, then recorded with a
+    short UPDATE that only touches rows whose blob is still there, so the
+    Lambda never waits on rows held across uploads. An interrupted run
+    resumes where it stopped: migrated rows no longer match. Rows with an
+    empty blob (no face found) are only cleared.
+
+    Pages by trans.id, the AUTO_INCREMENT primary key in sql/schema.sql;
+    refuses to run on a table without it.
+
+    :return: Number of thumbnails moved.
+    """
+    _require_trans_id(db)
+
+    moved = 0
+    last_id = 0
+    while True:
+        with db.transaction(dictionary=True) as (conn, cursor):
+            cursor.execute("""
+                SELECT id, device_id, batch_id, visitor_image_thumbnail
+                FROM trans
+                WHERE id > %s AND visitor_image_thumbnail IS NOT NULL
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, chunk_size))
+            rows = cursor.fetchall()
+        if not rows:
+            return moved
+        last_id = rows[-1]['id']
+
+        updates = []
+        for row in rows:
+            stored = store_thumbnail(store, row['device_id'], row['batch_id'], row['visitor_image_thumbnail'])
+            if stored:
+                updates.append((stored.key, stored.width, stored.height, row['id']))
+            else:
+                updates.append((None, None, None, row['id']))
+
+        with db.transaction() as (conn, cursor):
+            cursor.executemany("""
+                UPDATE trans
+                SET visitor_thumbnail_key = COALESCE(%s, visitor_thumbnail_key),
+                    visitor_thumbnail_width = COALESCE(%s, visitor_thumbnail_width),
+                    visitor_thumbnail_height = COALESCE(%s, visitor_thumbnail_height),
+                    visitor_image_thumbnail = NULL
+                WHERE id = %s AND visitor_image_thumbnail IS NOT NULL
+            """, updates)
+        moved += sum(1 for update in updates if update[0])
+        logger.info("Moved %d thumbnails to the thumbnail store", moved)
+        if len(rows) < chunk_size:
+            return moved
+
+
+def requeue_claims(db, keys):
+    """
+    Put visits the notifier left claimed back in the queue, so the next run emails them.
+
+    The notifier never re-sends a visit whose claim outlived its lease, since
+    the run that claimed it may have died after SES accepted the digest. It
+    logs them instead; once the SES logs show they were not emailed, pass
+    their (device_id, batch_id) keys here. Only open visits still claimed
+    are moved back to pending, and their alert is made due now.
+
+    :return: Number of visits requeued.
+    """
+    requeued = 0
+    with db.transaction() as (conn, cursor):
+        for placeholders, params in gatex_alerts.keyed_chunks(keys):
+            cursor.execute(f"""
+                UPDATE trans
+                SET email_sent = 0
+                WHERE email_sent = 2 AND exit_time IS NULL
+                AND (device_id, batch_id) IN ({placeholders})
+            """, params)
+            requeued += cursor.rowcount
+            cursor.execute(f"""
+                INSERT INTO overstay_alert (device_id, batch_id, due_at)
+                SELECT device_id, batch_id, NOW()
+                FROM trans
+                WHERE email_sent = 0 AND exit_time IS NULL
+                AND (device_id, batch_id) IN ({placeholders})
+                ON DUPLICATE KEY UPDATE due_at = LEAST(due_at, VALUES(due_at))
+            """, params)
+    logger.info("Requeued %d of %d claimed visits", requeued, len(keys))
+    return requeued
+
+
+def rebuild_rollups(db, since=None):
+    """
+    Recompute trans_rollup from trans, for all dates or from ``since`` on.
+
+    Runs as one transaction, so the dashboard never sees a half-built day.
+
+    :return: Number of rollup rows written.
+    """
+    with db.transaction() as (conn, cursor):
+        written = gatex_rollup.rebuild(cursor, since)
+    logger.info("Wrote %d rollup rows from %s", written, since or "the start")
+    return written
+
+
+def connection_from_env():
+    return ConnectionManager(
+        host=os.environ['DB_HOST'],
+        user=os.environ['DB_USER'],
+        password=os.environ['DB_PASSWORD'],
+        database=os.environ.get('DB_DATABASE') or os.environ['DB_NAME'],
+    )
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s: %(levelname)s: %(message)s')
+    parser = argparse.ArgumentParser(description="Gatex database maintenance jobs")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    backfill = commands.add_parser('backfill-name-key', help="Fill trans.name_key for existing rows")
+    backfill.add_argument('--chunk-size', type=int, default=1000)
+
+    commands.add_parser('dedupe-batches', help="Merge duplicate trans rows before adding the unique key")
+
+    thumbnails = commands.add_parser('migrate-thumbnails',
+                                     help="Move thumbnail blobs to THUMBNAIL_BUCKET (or THUMBNAIL_DIR)")
+    thumbnails.add_argument('--chunk-size', type=int, default=200)
+
+    requeue = commands.add_parser('requeue-claims', help="Let the notifier email visits whose claim expired")
+    requeue.add_argument('visits', nargs='+', metavar='DEVICE:BATCH',
+                         help="Keys from the notifier's expired claims warning")
+
+    rollups = commands.add_parser('rebuild-rollups', help="Recompute trans_rollup from trans")
+    rollups.add_argument('--since', help="First date to rebuild (YYYY-MM-DD); all dates if omitted")
+
+    args = parser.parse_args()
+    db = connection_from_env()
+    start = time.monotonic()
+    if args.command == 'backfill-name-key':
+        backfill_name_keys(db, args.chunk_size)
+    elif args.command == 'dedupe-batches':
+        dedupe_batches(db)
+    elif args.command == 'migrate-thumbnails':
+        store = store_from_env()
+        if store is None:
+            parser.error("set THUMBNAIL_BUCKET or THUMBNAIL_DIR")
+        migrate_thumbnails(db, store, args.chunk_size)
+    elif args.command == 'requeue-claims':
+        requeue_claims(db, [tuple(visit.split(':', 1)) for visit in args.visits])
+    elif args.command == 'rebuild-rollups':
+        rebuild_rollups(db, args.since)
+    logger.info("%s finished in %.1fs", args.command, time.monotonic() - start)
+    db.discard()
+
+
+if __name__ == '__main__':
+    main()
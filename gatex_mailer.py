@@ -0,0 +1,129 @@
+"""
+Rate-limited concurrent SES sending for the Gatex notifier.
+
+``SesSender`` sends a list of emails on a small thread pool, keeps the
+aggregate rate under the account's SES sending limit with a token bucket and
+retries throttling errors with exponential backoff. It only needs an object
+with SES's ``send_email`` signature, so a stub client works for tests.
+"""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gatex_metrics import NULL_METRICS
+
+logger = logging.getLogger()
+
+# SES error codes that mean "slow down" rather than "this message is bad"
+THROTTLING_CODES = {'Throttling', 'ThrottlingException', 'MaxSendingRateExceeded', 'TooManyRequestsException'}
+
+
+class Email:
+    """One outgoing email and the alert rows it covers."""
+
+    __slots__ = ('recipient', 'subject', 'body', 'alerts', 'message_id', 'error')
+
+    def __init__(self, recipient, subject, body, alerts=()):
+        self.recipient = recipient
+        self.subject = subject
+        self.body = body
+        self.alerts = list(alerts)
+        self.message_id = None
+        self.error = None
+
+    @property
+    def sent(self):
+        return self.message_id is not None
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` acquisitions per second, shared between threads."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def error_code(error):
+    return getattr(error, 'response', {}).get('Error', {}).get('Code')
+
+
+class SesSender:
+    """
+    Sends emails concurrently through SES.
+
+    :param ses_client: boto3 SES client or a stub with the same ``send_email``.
+    :param source: Verified sender address.
+    :param max_rate: Messages per second, at most the account's SES sending rate.
+    :param workers: Concurrent ``send_email`` calls.
+    :param max_attempts: Attempts per message when SES throttles.
+    :param metrics: ``gatex_metrics.Metrics`` receiving ``ses_send`` timings
+        and ``ses_throttled`` / ``ses_failures`` counts.
+    """
+
+    def __init__(self, ses_client, source, max_rate=14.0, workers=4, max_attempts=5, base_backoff=0.5,
+                 metrics=None):
+        self.ses_client = ses_client
+        self.source = source
+        self.limiter = RateLimiter(max_rate)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.metrics = metrics or NULL_METRICS
+
+    def _send(self, email):
+        for attempt in range(1, self.max_attempts + 1):
+            self.limiter.acquire()
+            try:
+                with self.metrics.span('ses_send'):
+                    response = self.ses_client.send_email(
+                        Source=self.source,
+                        Destination={'ToAddresses': [email.recipient]},
+                        Message={
+                            'Subject': {'Data': email.subject, 'Charset': 'UTF-8'},
+                            'Body': {'Text': {'Data': email.body, 'Charset': 'UTF-8'}},
+                        },
+                    )
+                email.message_id = response.get('MessageId', '')
+                logger.info("Sent email to %s: %s", email.recipient, email.message_id)
+                return email
+            except Exception as e:
+                if error_code(e) in THROTTLING_CODES and attempt < self.max_attempts:
+                    self.metrics.count('ses_throttled')
+                    delay = self.base_backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.0)
+                    logger.warning("SES throttled email to %s (attempt %d). Retrying in %.2fs",
+                                   email.recipient, attempt, delay)
+                    time.sleep(delay)
+                    continue
+                email.error = e
+                self.metrics.count('ses_failures')
+                logger.error("Failed to send email to %s: %s", email.recipient, getattr(e, 'response', e))
+                return email
+        return email
+
+    def send_all(self, emails):
+        """
+        Send every email. Failures are recorded on the email, not raised.
+
+        :return: The same emails; check ``sent`` and ``error`` on each.
+        """
+        if not emails:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(emails))) as pool:
+            return list(pool.map(self._send, emails))
@@ -0,0 +1,243 @@
+"""
+OCR-tolerant exit matching for the Gatex Lambda.
+
+Rekognition regularly misreads a character or two on ID cards (``O``/``0``,
+``I``/``1``, a dropped letter), which breaks exact ``name_key`` equality and
+leaves the visit open forever. ``TrigramIndex`` is an inverted index from
+character trigrams to open visits; a query only scores visits that share at
+least one trigram with the probe, so lookups stay cheap as the number of
+open visits grows. ``ExitMatcher`` keeps one index per device across warm
+invocations and refreshes it from ``trans`` when it gets old.
+
+Trigram similarity alone cannot tell an OCR misread from a different
+person: MOHAMMED/MOHAMMAD or ANITA/ANKITA score as high as a one-character
+misread, and a wrong match closes someone else's visit while the new
+visitor's entry is never recorded. A missed exit only leaves a visit open,
+so a fuzzy match is accepted only when it is near-unique: similar length,
+a small OCR-weighted edit distance on the folded keys, and a clear lead
+over the next candidate.
+"""
+import logging
+import time
+from collections import defaultdict
+
+logger = logging.getLogger()
+
+# Characters Rekognition commonly confuses on ID cards, folded before
+# trigrams are built so these misreads cost nothing
+OCR_FOLD = str.maketrans({'0': 'O', '1': 'I', '5': 'S', '8': 'B', '2': 'Z', '6': 'G'})
+
+# Names shorter than this have too few trigrams to match fuzzily
+MIN_FUZZY_LENGTH = 4
+
+# Groups of letters Rekognition misreads for each other that OCR_FOLD does
+# not already fold. Trigrams treat a group as one letter, so these misreads
+# keep the full similarity, and swapping within a group costs half an edit.
+OCR_CONFUSABLE = ('ODQ', 'IJL', 'HMN', 'UVY', 'EF', 'CG', 'PR', 'KX')
+CONFUSABLE_FOLD = str.maketrans({letter: group[0] for group in OCR_CONFUSABLE for letter in group[1:]})
+
+# Any other substitution, insertion or deletion is only tolerated in keys at
+# least this long (a full, truncated name_key): in a shorter name a single
+# plain edit is as likely to be a different person as a misread.
+MIN_PLAIN_EDIT_LENGTH = 10
+
+
+def trigrams(name):
+    """Set of padded character trigrams of a normalized name."""
+    padded = f"$${name.translate(OCR_FOLD).translate(CONFUSABLE_FOLD)}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def ocr_distance(a, b, plain_cost=1.0):
+    """
+    Edit distance between two names after OCR_FOLD, where swapping two
+    letters of one OCR_CONFUSABLE group costs 0.5 and any other edit costs
+    ``plain_cost``.
+    """
+    a, b = a.translate(OCR_FOLD), b.translate(OCR_FOLD)
+    previous = [j * plain_cost for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        current = [i * plain_cost]
+        for j, char_b in enumerate(b, 1):
+            if char_a == char_b:
+                substitution = 0.0
+            elif char_a.translate(CONFUSABLE_FOLD) == char_b.translate(CONFUSABLE_FOLD):
+                substitution = 0.5
+            else:
+                substitution = plain_cost
+            current.append(min(previous[j] + plain_cost, current[j - 1] + plain_cost,
+                               previous[j - 1] + substitution))
+        previous = current
+    return previous[-1]
+
+
+def plausible_misread(probe, name, max_distance=1.0):
+    """
+    Whether ``probe`` could be ``name`` as read by OCR, not another person.
+
+    Lengths may differ by at most one character and the OCR distance may not
+    exceed ``max_distance``. Edits other than confusable letter swaps are
+    only allowed when both keys have at least MIN_PLAIN_EDIT_LENGTH characters.
+    """
+    if abs(len(probe) - len(name)) > 1 or ocr_distance(probe, name) > max_distance:
+        return False
+    if min(len(probe), len(name)) >= MIN_PLAIN_EDIT_LENGTH:
+        return True
+    # Priced above the budget, a single plain edit rules the pair out
+    return ocr_distance(probe, name, plain_cost=max_distance + 1) <= max_distance
+
+
+def similarity(a, b):
+    """Dice coefficient of two trigram sets, between 0 and 1."""
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class TrigramIndex:
+    """Inverted trigram index over visitor names, keyed by an opaque visit ID."""
+
+    def __init__(self):
+        self._postings = defaultdict(set)
+        self._grams = {}
+        self._names = {}
+
+    def __len__(self):
+        return len(self._grams)
+
+    def __contains__(self, visit_id):
+        return visit_id in self._grams
+
+    def add(self, visit_id, name):
+        self.remove(visit_id)
+        grams = trigrams(name)
+        self._grams[visit_id] = grams
+        self._names[visit_id] = name
+        for gram in grams:
+            self._postings[gram].add(visit_id)
+
+    def remove(self, visit_id):
+        grams = self._grams.pop(visit_id, None)
+        self._names.pop(visit_id, None)
+        for gram in grams or ():
+            postings = self._postings[gram]
+            postings.discard(visit_id)
+            if not postings:
+                del self._postings[gram]
+
+    def name(self, visit_id):
+        return self._names.get(visit_id)
+
+    def search(self, name, threshold, limit=3):
+        """
+        Best-scoring visits for ``name``.
+
+        :param threshold: Minimum Dice similarity for a candidate to be returned.
+        :param limit: Maximum number of candidates, or None for all of them.
+        :return: List of ``(score, visit_id)``, best first.
+        """
+        probe = trigrams(name)
+        shared = defaultdict(int)
+        for gram in probe:
+            for visit_id in self._postings.get(gram, ()):
+                shared[visit_id] += 1
+
+        # Dice only needs the shared count and both set sizes
+        size = len(probe)
+        results = []
+        for visit_id, common in shared.items():
+            score = 2 * common / (size + len(self._grams[visit_id]))
+            if score >= threshold:
+                results.append((score, visit_id))
+        results.sort(key=lambda result: (-result[0], str(result[1])))
+        return results[:limit]
+
+
+class ExitMatcher:
+    """
+    Per-device trigram indexes over the name keys of open visits.
+
+    :param threshold: Minimum trigram similarity for a fuzzy exit match.
+    :param max_distance: Largest ``ocr_distance`` accepted, see ``plausible_misread``.
+    :param margin: How much more similar the best candidate must be than the
+        next one; closer than that, the exit is ambiguous and not matched.
+    :param refresh_seconds: Age after which a device's index is rebuilt from
+        the database on its next use.
+    """
+
+    def __init__(self, threshold=0.7, max_distance=1.0, margin=0.1, refresh_seconds=300.0):
+        self.threshold = threshold
+        self.max_distance = max_distance
+        self.margin = margin
+        self.refresh_seconds = refresh_seconds
+        self._indexes = {}
+        self._loaded_at = {}
+
+    def _index(self, cursor, device_id):
+        loaded_at = self._loaded_at.get(device_id)
+        if loaded_at is None or time.monotonic() - loaded_at > self.refresh_seconds:
+            start = time.monotonic()
+            cursor.execute("""
+                SELECT batch_id, name_key
+                FROM trans
+                WHERE device_id = %s AND exit_time IS NULL AND name_key IS NOT NULL AND name_key <> ''
+            """, (device_id,))
+            index = TrigramIndex()
+            for row in cursor.fetchall():
+                index.add(str(row['batch_id']), row['name_key'])
+            self._indexes[device_id] = index
+            self._loaded_at[device_id] = time.monotonic()
+            logger.info("Loaded exit match index for device %s: %d open visits in %.1fms",
+                        device_id, len(index), (time.monotonic() - start) * 1000)
+        return self._indexes[device_id]
+
+    def pick(self, index, name_key, exclude=None):
+        """
+        The one visit in ``index`` that ``name_key`` is a near-unique misread of.
+
+        :param exclude: Visit id never to return, the batch being processed.
+        :return: List holding ``(score, visit_id)``, or an empty list.
+        """
+        if len(name_key) < MIN_FUZZY_LENGTH:
+            return []
+        results = index.search(name_key, max(0.0, self.threshold - self.margin), limit=None)
+        if exclude is not None:
+            results = [result for result in results if result[1] != str(exclude)]
+        if not results or results[0][0] < self.threshold:
+            return []
+        score, visit_id = results[0]
+        best_name = index.name(visit_id)
+        # Open visits with the same key are one name, not an ambiguity; like the exact match, take the latest
+        same_name = [result[1] for result in results if index.name(result[1]) == best_name]
+        visit_id = max(same_name, key=lambda candidate: (len(candidate), candidate))
+        # The runner-up is searched with a lower bar so a close second name still makes the match ambiguous
+        runner_up = next((result[0] for result in results if index.name(result[1]) != best_name), None)
+        if runner_up is not None and score - runner_up < self.margin:
+            return []
+        if not plausible_misread(name_key, best_name, self.max_distance):
+            return []
+        return [(score, visit_id)]
+
+    def candidates(self, cursor, device_id, name_key, exclude_batch_id=None):
+        """
+        Fuzzy candidate for ``name_key`` among the device's open visits.
+
+        :param exclude_batch_id: The batch being processed, which may already
+            be open as an entry written by another camera's invocation.
+        :return: List of at most one ``(score, batch_id)``, batch_id as a string.
+        """
+        if len(name_key) < MIN_FUZZY_LENGTH:
+            return []
+        return self.pick(self._index(cursor, device_id), name_key, exclude_batch_id)
+
+    def visit_opened(self, device_id, batch_id, name_key):
+        """Add a new visit to an already loaded index."""
+        index = self._indexes.get(device_id)
+        if index is not None and name_key:
+            index.add(str(batch_id), name_key)
+
+    def visit_closed(self, device_id, batch_id):
+        """Drop a visit that has exited, or turned out to be closed already."""
+        index = self._indexes.get(device_id)
+        if index is not None:
+            index.remove(str(batch_id))
@@ -0,0 +1,181 @@
+"""
+Timing spans, metrics and structured logging shared by the Gatex scripts.
+
+``Metrics`` collects span durations and counters in memory and ``flush()``
+writes them as one JSON line in CloudWatch Embedded Metric Format (EMF): in
+Lambda, a line printed to stdout becomes CloudWatch metrics with no API
+calls, and on the Pi the same lines go to a local file. Every flushed metric
+carries its raw values (EMF keeps up to 100 per line) plus p50/p90/p99
+properties, so a line can be read on its own. To summarize a file locally:
+
+    python gatex_metrics.py /home/rahultanwar/PythonFiles/metrics.jsonl
+
+``log_event`` is the structured logging side: it does nothing, not even
+formatting, when the level is disabled, and values passed as callables are
+only computed when the line is actually written.
+"""
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# EMF accepts at most this many values per metric in one line
+EMF_MAX_VALUES = 100
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def log_event(logger, level, event, **fields):
+    """
+    Log ``event`` with ``fields`` as one JSON object, if ``level`` is enabled.
+
+    Field values that are callables are called first, so expensive summaries
+    cost nothing at disabled levels: ``log_event(logger, logging.DEBUG,
+    'devices', count=lambda: len(devices))``.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    record = {'event': event}
+    for name, value in fields.items():
+        record[name] = value() if callable(value) else value
+    logger.log(level, json.dumps(record, default=str))
+
+
+class Metrics:
+    """
+    In-memory metric collector with EMF output.
+
+    :param namespace: CloudWatch namespace, e.g. ``Gatex/Lambda``.
+    :param dimensions: Fixed low-cardinality dimensions added to every line.
+    :param path: File to append lines to. Defaults to stdout, which is what
+        Lambda's EMF integration reads.
+    :param enabled: When False every method is a no-op.
+    """
+
+    def __init__(self, namespace, dimensions=None, path=None, enabled=True):
+        self.namespace = namespace
+        self.dimensions = dict(dimensions or {})
+        self.path = path
+        self.enabled = enabled
+        self._values = {}
+        self._units = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, value, unit='Milliseconds'):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._values.setdefault(name, []).append(value)
+            self._units[name] = unit
+
+    def count(self, name, value=1):
+        self.record(name, value, unit='Count')
+
+    @contextmanager
+    def span(self, name):
+        """Time the block and record its duration in milliseconds under ``name``, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def percentiles(self, name, pcts=(50, 90, 99)):
+        """Percentiles of what was recorded under ``name`` since the last flush, for local inspection."""
+        with self._lock:
+            values = list(self._values.get(name, ()))
+        return {f"p{pct}": percentile(values, pct) for pct in pcts} if values else {}
+
+    def flush(self, **properties):
+        """
+        Write everything recorded since the last flush as one EMF line and reset.
+
+        :param properties: Extra searchable fields that are not dimensions,
+            e.g. ``batch_id``.
+        :return: The emitted document, or None if nothing was recorded.
+        """
+        with self._lock:
+            values, units = self._values, self._units
+            self._values, self._units = {}, {}
+        if not self.enabled or not values:
+            return None
+
+        document = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': [list(self.dimensions)],
+                    'Metrics': [{'Name': name, 'Unit': units[name]} for name in values],
+                }],
+            },
+        }
+        document.update(self.dimensions)
+        document.update(properties)
+        for name, recorded in values.items():
+            document[name] = recorded[-EMF_MAX_VALUES:] if len(recorded) > 1 else recorded[0]
+            if units[name] == 'Milliseconds':
+                for pct in (50, 90, 99):
+                    document[f"{name}.p{pct}"] = round(percentile(recorded, pct), 3)
+            else:
+                document[f"{name}.sum"] = sum(recorded)
+        self._write(json.dumps(document, default=str))
+        return document
+
+    def _write(self, line):
+        if self.path:
+            with open(self.path, 'a') as file:
+                file.write(line + '\n')
+        else:
+            print(line, flush=True)
+
+
+# Stand-in for components constructed without a collector
+NULL_METRICS = Metrics('', enabled=False)
+
+
+def summarize(lines):
+    """
+    Aggregate EMF lines written by ``Metrics.flush``.
+
+    :return: {metric name: (unit, [values])} over all lines.
+    """
+    totals = {}
+    for line in lines:
+        try:
+            document = json.loads(line)
+        except ValueError:
+            continue
+        for directive in document.get('_aws', {}).get('CloudWatchMetrics', ()):
+            for metric in directive.get('Metrics', ()):
+                value = document.get(metric['Name'])
+                recorded = value if isinstance(value, list) else [value]
+                unit, values = totals.setdefault(metric['Name'], (metric.get('Unit'), []))
+                values.extend(v for v in recorded if v is not None)
+    return totals
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.exit("usage: python gatex_metrics.py METRICS_FILE...")
+    lines = []
+    for path in sys.argv[1:]:
+        with open(path) as file:
+            lines.extend(file)
+    for name, (unit, values) in sorted(summarize(lines).items()):
+        if not values:
+            continue
+        if unit == 'Milliseconds':
+            print(f"{name:<28} n {len(values):>7}  p50 {percentile(values, 50):9.2f}ms  "
+                  f"p90 {percentile(values, 90):9.2f}ms  p99 {percentile(values, 99):9.2f}ms  "
+                  f"max {max(values):9.2f}ms")
+        else:
+            print(f"{name:<28} n {len(values):>7}  sum {sum(values):>12}")
+
+
+if __name__ == '__main__':
+    main()
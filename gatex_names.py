@@ -0,0 +1,42 @@
+"""
+Visitor name extraction shared by the ingestion Lambda and maintenance jobs.
+
+The exit check compares the name printed on the ID card at entry and at exit.
+``name_key()`` computes the comparison key once, at entry time, so it can be
+stored in an indexed ``trans.name_key`` column instead of re-parsing every
+open visit's OCR text on each exit.
+"""
+import re
+
+# Only this many leading characters of the normalized name are compared
+NAME_KEY_LENGTH = 10
+
+# Stored for rows whose ID text has no recognizable name, so backfills can
+# tell "no name" apart from "not computed yet" (NULL)
+NO_NAME_KEY = ''
+
+
+def normalize_text(text):
+    """Normalize text by removing non-alphanumeric characters and converting to uppercase."""
+    return re.sub(r'\W+', '', text).upper()
+
+
+def extract_name_details(text):
+    """Extract name details from the given text after 'Name' keyword."""
+    name_match = re.search(r"Name:?[\s-]*(\w+)", text, re.IGNORECASE)
+    if name_match:
+        # Extract the name and normalize it
+        name_details = name_match.group(1)
+        return normalize_text(name_details)
+    return None
+
+
+def name_key(text):
+    """
+    Indexed exit-matching key for a visitor's ID text.
+
+    :return: The first NAME_KEY_LENGTH characters of the normalized name, or
+        NO_NAME_KEY if the text has no name.
+    """
+    name_details = extract_name_details(text) if text else None
+    return name_details[:NAME_KEY_LENGTH] if name_details else NO_NAME_KEY
@@ -0,0 +1,237 @@
+"""
+Cheap on-device quality check for captured frames.
+
+Every frame the Pi uploads costs uplink time and a ``detect_text`` or
+``detect_faces`` call, including frames that cannot yield anything: a black
+frame from a covered lens, a motion-blurred ID card, or a second batch of
+the same scene after an accidental double press. ``QualityGate`` scores each
+frame on a small grayscale copy before it is written for upload:
+
+* brightness: mean pixel value,
+* sharpness: variance of the Laplacian, low for blurred or featureless frames,
+* a 64-bit difference hash (dHash), compared against the frames the same
+  camera took in the last few seconds to catch repeats.
+
+A whole-frame dHash cannot tell two visitors holding the same ID card
+template apart, so a repeat is never a reason to drop one frame on its own.
+``QualityGate.is_double_press`` drops a batch only when at least two cameras
+run the check and all of them saw a repeat within ``duplicate_window``;
+camera 1 (ID cards) is left out of it by default. A repeat seen by fewer
+cameras only marks the batch as a suspected repeat, and it is uploaded.
+
+All three come from one draft-mode JPEG decode and a few vectorized NumPy
+operations, a few milliseconds per frame on a Pi 4. Thresholds are set per
+camera with ``QualityThresholds``; sharpness is measured at
+``analysis_width``, so its threshold depends on that width, not on the
+camera resolution.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from io import BytesIO
+
+from gatex_metrics import NULL_METRICS
+
+# Why a frame was rejected. DUPLICATE is given to every frame of a double pressed batch.
+DARK = 'dark'
+BRIGHT = 'bright'
+BLURRED = 'blurred'
+DUPLICATE = 'duplicate'
+
+
+class QualityThresholds:
+    """
+    Limits a camera's frames must meet to be uploaded.
+
+    :param min_brightness: Lowest accepted mean pixel value, 0-255.
+    :param max_brightness: Highest accepted mean pixel value, 0-255.
+    :param min_sharpness: Lowest accepted Laplacian variance at ``analysis_width``.
+    :param max_hash_distance: Frames whose dHash differs from a recent one in
+        at most this many of 64 bits are repeats. None leaves the camera out
+        of double press detection.
+    :param duplicate_window: Seconds a frame is remembered for the repeat
+        check; long enough for a double press, short enough that the next
+        visitor is never compared.
+    :param history: Accepted frames remembered per camera.
+    :param analysis_width: Width of the grayscale copy that is scored.
+    """
+
+    def __init__(self, min_brightness=35, max_brightness=235, min_sharpness=40.0, max_hash_distance=4,
+                 duplicate_window=5.0, history=4, analysis_width=320):
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_sharpness = min_sharpness
+        self.max_hash_distance = max_hash_distance
+        self.duplicate_window = duplicate_window
+        self.history = history
+        self.analysis_width = analysis_width
+
+    def __repr__(self):
+        return (f"QualityThresholds(brightness={self.min_brightness}-{self.max_brightness}, "
+                f"min_sharpness={self.min_sharpness}, max_hash_distance={self.max_hash_distance}, "
+                f"duplicate_window={self.duplicate_window})")
+
+
+class QualityVerdict:
+    """
+    Scores of one frame and whether it passed; ``reason`` is None when it did.
+
+    ``repeat`` is True if the frame matches one the camera took within the
+    duplicate window, False if not, and None if the camera skips the check.
+    """
+
+    __slots__ = ('reason', 'repeat', 'brightness', 'sharpness', 'phash', 'seconds')
+
+    def __init__(self, reason, brightness, sharpness, phash, seconds, repeat=None):
+        self.reason = reason
+        self.repeat = repeat
+        self.brightness = brightness
+        self.sharpness = sharpness
+        self.phash = phash
+        self.seconds = seconds
+
+    @property
+    def ok(self):
+        return self.reason is None
+
+    def __repr__(self):
+        return (f"QualityVerdict({self.reason or 'ok'}, repeat={self.repeat}, brightness={self.brightness:.0f}, "
+                f"sharpness={self.sharpness:.0f}, phash={self.phash:016x})")
+
+
+def hash_distance(a, b):
+    """Number of differing bits between two 64-bit hashes."""
+    return bin(a ^ b).count('1')
+
+
+def score_frame(data, analysis_width=320):
+    """
+    Score JPEG bytes.
+
+    :return: ``(brightness, sharpness, phash)``
+    """
+    import numpy as np
+    from PIL import Image
+
+    img = Image.open(BytesIO(data))
+    # Let libjpeg decode straight to grayscale at 1/2, 1/4 or 1/8 scale
+    img.draft('L', (analysis_width, max(1, analysis_width * img.height // max(img.width, 1))))
+    img = img.convert('L')
+    if img.width > analysis_width:
+        img = img.resize((analysis_width, max(1, analysis_width * img.height // img.width)), Image.BILINEAR)
+
+    pixels = np.asarray(img, dtype=np.float32)
+    brightness = float(pixels.mean())
+
+    # 4-neighbour Laplacian over the interior, as shifted slices instead of a convolution
+    laplacian = (pixels[:-2, 1:-1] + pixels[2:, 1:-1] + pixels[1:-1, :-2] + pixels[1:-1, 2:]
+                 - 4.0 * pixels[1:-1, 1:-1])
+    sharpness = float(laplacian.var()) if laplacian.size else 0.0
+
+    # dHash: whether each pixel of a 9x8 copy is brighter than its left neighbour
+    small = np.asarray(img.resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = np.packbits((small[:, 1:] > small[:, :-1]).ravel())
+    phash = int.from_bytes(bits.tobytes(), 'big')
+    return brightness, sharpness, phash
+
+
+class QualityGate:
+    """
+    Accepts or rejects frames per camera and remembers recently accepted ones.
+
+    :param thresholds: Mapping of camera name to ``QualityThresholds``.
+    :param default: Thresholds for cameras not in ``thresholds``. None lets
+        their frames through unchecked.
+    :param metrics: ``gatex_metrics.Metrics`` receiving ``quality_check``
+        timings and ``frames_rejected``, ``double_presses`` and
+        ``suspected_repeats`` counts.
+    :param min_repeat_cameras: Cameras that must run the repeat check, and
+        all agree, before a batch is dropped as a double press.
+    """
+
+    def __init__(self, thresholds=None, default=None, metrics=None, clock=time.monotonic, min_repeat_cameras=2):
+        self.thresholds = dict(thresholds or {})
+        self.default = default
+        self.min_repeat_cameras = min_repeat_cameras
+        self.metrics = metrics or NULL_METRICS
+        self._clock = clock
+        self._recent = {}
+        self._lock = threading.Lock()
+
+    def check(self, camera_name, data):
+        """
+        Score a frame and decide whether it is good enough to upload. Frames
+        that pass are remembered for the repeat check of later ones.
+
+        :return: QualityVerdict, or None if the camera has no thresholds.
+        """
+        limits = self.thresholds.get(camera_name, self.default)
+        if limits is None:
+            return None
+        start = time.perf_counter()
+        brightness, sharpness, phash = score_frame(data, limits.analysis_width)
+        now = self._clock()
+
+        reason = None
+        if brightness < limits.min_brightness:
+            reason = DARK
+        elif brightness > limits.max_brightness:
+            reason = BRIGHT
+        elif sharpness < limits.min_sharpness:
+            reason = BLURRED
+        repeat = None
+        if limits.max_hash_distance is not None:
+            with self._lock:
+                recent = self._recent.setdefault(camera_name, deque(maxlen=limits.history))
+                while recent and now - recent[0][0] > limits.duplicate_window:
+                    recent.popleft()
+                repeat = any(hash_distance(phash, seen) <= limits.max_hash_distance for _, seen in recent)
+                if reason is None:
+                    recent.append((now, phash))
+
+        seconds = time.perf_counter() - start
+        self.metrics.record('quality_check', seconds * 1000)
+        verdict = QualityVerdict(reason, brightness, sharpness, phash, seconds, repeat)
+        if reason:
+            self.metrics.count('frames_rejected')
+            logging.info("Rejected frame from %s: %r", camera_name, verdict)
+        return verdict
+
+    def is_double_press(self, verdicts):
+        """
+        Whether a batch repeats the previous one, judged from its cameras' verdicts.
+
+        True only if at least ``min_repeat_cameras`` cameras run the repeat
+        check and every one of them saw a repeat, so one look-alike frame (the
+        same ID card template, an empty lane) never drops a visitor.
+        """
+        checked = self._repeats(verdicts)
+        if len(checked) >= self.min_repeat_cameras and all(checked):
+            self.metrics.count('double_presses')
+            return True
+        return False
+
+    def is_suspected_repeat(self, verdicts):
+        """
+        Whether some camera saw a repeat in a batch that is not a double press.
+
+        Such a batch is uploaded anyway; this only counts and reports it.
+        """
+        checked = self._repeats(verdicts)
+        if any(checked) and not (len(checked) >= self.min_repeat_cameras and all(checked)):
+            self.metrics.count('suspected_repeats')
+            return True
+        return False
+
+    @staticmethod
+    def _repeats(verdicts):
+        return [verdict.repeat for verdict in verdicts if verdict is not None and verdict.repeat is not None]
+
+    def forget(self, camera_name=None):
+        """Drop the remembered frames of one camera, or of all of them."""
+        with self._lock:
+            if camera_name is None:
+                self._recent.clear()
+            else:
+                self._recent.pop(camera_name, None)
@@ -0,0 +1,112 @@
+"""
+Per-device, per-day attendance rollups maintained alongside trans.
+
+``trans_rollup`` holds one row per (device_id, date, hour of entry) with the
+number of visits that entered, how many of them have exited, and the total
+and longest dwell time of those that exited. sqlRekognitionLambda updates it
+in the same transaction as the visit: ``record_entry`` when a visit is
+created and ``record_exit`` when ``process_exit`` closes one. Daily figures
+(visits, still inside, average and max dwell) and the hourly histogram are
+then a read of at most 24 rows per device and day instead of every visit.
+
+Exits are counted against the hour the visit entered, so a day's "inside"
+is visits minus exits of that day's visits. A late image that moves a
+visit's entry_time earlier leaves it counted in its first hour.
+``rebuild`` recomputes the table from trans in bulk, for the initial fill
+and after manual edits:
+
+    python gatex_jobs.py rebuild-rollups --since 2024-01-01
+"""
+import logging
+
+logger = logging.getLogger()
+
+# Seconds from entry to exit. exit_time carries no date, so an exit earlier in
+# the day than the entry is taken to be on the next day.
+DWELL_SECONDS = "MOD(TIME_TO_SEC(exit_time) - TIME_TO_SEC(entry_time) + 86400, 86400)"
+
+
+def record_entry(cursor, device_id, date, entry_time):
+    """Count a new visit in its entry hour."""
+    cursor.execute("""
+        INSERT INTO trans_rollup (device_id, date, hour, visits)
+        VALUES (%s, %s, HOUR(%s), 1)
+        ON DUPLICATE KEY UPDATE visits = visits + 1
+    """, (device_id, date, entry_time))
+
+
+def record_exit(cursor, device_id, batch_id):
+    """
+    Count the exit of a visit whose exit_time was just set, with its dwell time.
+
+    Reads the visit's own row, so it must run after the UPDATE that closed it.
+    """
+    cursor.execute(f"""
+        INSERT INTO trans_rollup (device_id, date, hour, visits, exits, dwell_seconds_total, dwell_seconds_max)
+        SELECT device_id, date, HOUR(entry_time), 0, 1, {DWELL_SECONDS}, {DWELL_SECONDS}
+        FROM trans
+        WHERE device_id = %s AND batch_id = %s AND exit_time IS NOT NULL
+        ON DUPLICATE KEY UPDATE
+            exits = exits + 1,
+            dwell_seconds_total = dwell_seconds_total + VALUES(dwell_seconds_total),
+            dwell_seconds_max = GREATEST(dwell_seconds_max, VALUES(dwell_seconds_max))
+    """, (device_id, batch_id))
+
+
+def rebuild(cursor, since=None):
+    """
+    Recompute trans_rollup from trans, for every date or from ``since`` on. The caller commits.
+
+    :return: Number of rollup rows written.
+    """
+    where, params = ("WHERE date >= %s", (since,)) if since else ("", ())
+    cursor.execute(f"DELETE FROM trans_rollup {where}", params)
+    cursor.execute(f"""
+        INSERT INTO trans_rollup (device_id, date, hour, visits, exits, dwell_seconds_total, dwell_seconds_max)
+        SELECT device_id, date, HOUR(entry_time), COUNT(*), COUNT(exit_time),
+               COALESCE(SUM(IF(exit_time IS NULL, 0, {DWELL_SECONDS})), 0),
+               COALESCE(MAX(IF(exit_time IS NULL, 0, {DWELL_SECONDS})), 0)
+        FROM trans
+        {where}
+        GROUP BY device_id, date, HOUR(entry_time)
+    """, params)
+    return cursor.rowcount
+
+
+def daily_summary(cursor, device_ids, start, end):
+    """
+    Daily attendance for ``device_ids`` between ``start`` and ``end`` (inclusive).
+
+    :return: Rows of (device_id, date, visits, inside, avg_dwell_seconds, max_dwell_seconds).
+    """
+    placeholders = ", ".join(["%s"] * len(device_ids))
+    cursor.execute(f"""
+        SELECT device_id, date, SUM(visits) AS visits, SUM(visits) - SUM(exits) AS inside,
+               SUM(dwell_seconds_total) / NULLIF(SUM(exits), 0) AS avg_dwell_seconds,
+               MAX(dwell_seconds_max) AS max_dwell_seconds
+        FROM trans_rollup
+        WHERE device_id IN ({placeholders}) AND date BETWEEN %s AND %s
+        GROUP BY device_id, date
+        ORDER BY device_id, date
+    """, (*device_ids, start, end))
+    return cursor.fetchall()
+
+
+def hourly_histogram(cursor, device_ids, date):
+    """
+    Entries per hour of ``date`` across ``device_ids``.
+
+    :return: List of 24 counts, index = hour of day.
+    """
+    placeholders = ", ".join(["%s"] * len(device_ids))
+    cursor.execute(f"""
+        SELECT hour, SUM(visits) AS visits
+        FROM trans_rollup
+        WHERE device_id IN ({placeholders}) AND date = %s
+        GROUP BY hour
+    """, (*device_ids, date))
+    histogram = [0] * 24
+    for row in cursor.fetchall():
+        hour, visits = (row['hour'], row['visits']) if isinstance(row, dict) else row
+        histogram[hour] = int(visits)
+    return histogram
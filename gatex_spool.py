@@ -0,0 +1,244 @@
+"""
+Durable on-disk upload spool for the Gatex edge device.
+
+Captured photos are moved into a spool directory and recorded in an index
+file before anything touches the network. A small pool of uploader threads
+drains the spool with exponential backoff, ID card (camera1) images first,
+and a file is only deleted once S3 has accepted it. Nothing in here imports
+boto3, so the spool can be exercised offline with any object exposing
+``upload_file(filename, bucket, key)``.
+"""
+import json
+import logging
+import os
+import random
+import shutil
+import threading
+import time
+
+from gatex_metrics import NULL_METRICS
+
+INDEX_FILE = 'index.json'
+
+# Lower values are uploaded first.
+PRIORITY_ID_CARD = 0
+PRIORITY_DEFAULT = 1
+
+
+def priority_for_key(key):
+    """camera1 captures the visitor's ID card, which the Lambda needs first."""
+    return PRIORITY_ID_CARD if 'camera1_' in key else PRIORITY_DEFAULT
+
+
+class UploadSpool:
+    """
+    Persistent queue of files waiting to be uploaded to S3.
+
+    :param spool_dir: Directory holding the spooled files and the index file.
+    :param s3_client: Client used for uploads (boto3 S3 client or a stub).
+    :param bucket_name: Destination bucket.
+    :param workers: Number of concurrent uploader threads.
+    :param high_water: Fraction of the spool filesystem that may be in use
+        before ``wait_for_capacity()`` starts blocking capture.
+    :param base_backoff: Delay in seconds after the first failed attempt.
+    :param max_backoff: Upper bound for the retry delay.
+    :param metrics: ``gatex_metrics.Metrics`` receiving ``upload`` timings
+        and ``upload_failures`` counts.
+    """
+
+    def __init__(self, spool_dir, s3_client, bucket_name, workers=2, high_water=0.85,
+                 base_backoff=2.0, max_backoff=300.0, metrics=None):
+        self.spool_dir = spool_dir
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.workers = workers
+        self.high_water = high_water
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.metrics = metrics or NULL_METRICS
+
+        self._cond = threading.Condition()
+        self._in_flight = set()
+        self._stopped = False
+        self._threads = []
+
+        os.makedirs(spool_dir, exist_ok=True)
+        self._entries = self._load_index()
+
+    # -- index -------------------------------------------------------------
+
+    def _index_path(self):
+        return os.path.join(self.spool_dir, INDEX_FILE)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), 'r') as file:
+                entries = json.load(file)
+        except FileNotFoundError:
+            entries = {}
+        except ValueError:
+            logging.error("Spool index is corrupt. Rebuilding it from the spool directory.")
+            entries = {}
+
+        # Drop entries whose file is gone and adopt files the index missed,
+        # e.g. after a power cut between the move and the index write.
+        entries = {name: entry for name, entry in entries.items()
+                   if os.path.exists(os.path.join(self.spool_dir, name))}
+        for name in os.listdir(self.spool_dir):
+            if name != INDEX_FILE and not name.endswith('.tmp') and name not in entries:
+                entries[name] = self._new_entry(name)
+        return entries
+
+    def _save_index(self):
+        # Caller holds self._cond. Write-then-rename so a crash never leaves a
+        # half-written index behind.
+        tmp_path = self._index_path() + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(self._entries, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self._index_path())
+
+    @staticmethod
+    def _new_entry(key):
+        return {
+            'key': key,
+            'priority': priority_for_key(key),
+            'attempts': 0,
+            'next_attempt': 0.0,
+            'enqueued_at': time.time(),
+        }
+
+    # -- producer side -----------------------------------------------------
+
+    def enqueue(self, file_path, key=None):
+        """
+        Move a file into the spool and schedule it for upload.
+
+        :param file_path: Path of the captured file. It is moved, not copied.
+        :param key: S3 object key. Defaults to the file name.
+        """
+        key = key or os.path.basename(file_path)
+        spool_path = os.path.join(self.spool_dir, key)
+        shutil.move(file_path, spool_path)
+        with self._cond:
+            self._entries[key] = self._new_entry(key)
+            self._save_index()
+            self._cond.notify_all()
+        logging.info("Spooled %s. spool_depth: %d", key, self.depth())
+
+    def adopt(self, directory, suffix='.jpeg'):
+        """Spool files left behind in ``directory`` by an earlier run."""
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(suffix):
+                self.enqueue(os.path.join(directory, name))
+
+    def depth(self):
+        with self._cond:
+            return len(self._entries)
+
+    def disk_usage(self):
+        """Fraction of the spool filesystem currently in use."""
+        usage = shutil.disk_usage(self.spool_dir)
+        return usage.used / usage.total
+
+    def wait_for_capacity(self, poll_interval=1.0):
+        """
+        Block while the spool filesystem is above the high-water mark.
+
+        Capture calls this before taking a batch, so a long outage slows the
+        gate down instead of filling the SD card.
+        """
+        usage = self.disk_usage()
+        if usage < self.high_water:
+            return
+        logging.warning("Spool disk usage %.0f%% above high-water mark. Throttling capture.", usage * 100)
+        while usage >= self.high_water and not self._stopped:
+            with self._cond:
+                self._cond.wait(poll_interval)
+            usage = self.disk_usage()
+        logging.info("Spool disk usage back to %.0f%%. Resuming capture.", usage * 100)
+
+    # -- consumer side -----------------------------------------------------
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"spool-upload-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def drain(self, timeout=None):
+        """Wait until the spool is empty. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._entries:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _next_due(self):
+        """Pick the most urgent entry that is due. Caller holds self._cond."""
+        now = time.time()
+        due = [(entry['priority'], entry['enqueued_at'], name)
+               for name, entry in self._entries.items()
+               if name not in self._in_flight and entry['next_attempt'] <= now]
+        if not due:
+            pending = [entry['next_attempt'] for name, entry in self._entries.items()
+                       if name not in self._in_flight]
+            return None, (min(pending) - now if pending else None)
+        return min(due)[2], None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                name = None
+                while not self._stopped:
+                    name, wait = self._next_due()
+                    if name:
+                        break
+                    self._cond.wait(wait)
+                if self._stopped:
+                    return
+                self._in_flight.add(name)
+                entry = dict(self._entries[name])
+            self._upload(name, entry)
+
+    def _upload(self, name, entry):
+        spool_path = os.path.join(self.spool_dir, name)
+        start = time.monotonic()
+        try:
+            self.s3_client.upload_file(spool_path, self.bucket_name, entry['key'])
+        except Exception as e:
+            self.metrics.count('upload_failures')
+            attempts = entry['attempts'] + 1
+            delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+            delay *= random.uniform(0.5, 1.0)
+            logging.error("Failed to upload %s (attempt %d): %s. Retrying in %.1fs", entry['key'], attempts, e, delay)
+            with self._cond:
+                self._in_flight.discard(name)
+                if name in self._entries:
+                    self._entries[name]['attempts'] = attempts
+                    self._entries[name]['next_attempt'] = time.time() + delay
+                    self._save_index()
+                self._cond.notify_all()
+            return
+
+        upload_time = time.monotonic() - start
+        self.metrics.record('upload', upload_time * 1000)
+        os.remove(spool_path)
+        with self._cond:
+            self._in_flight.discard(name)
+            self._entries.pop(name, None)
+            self._save_index()
+            self._cond.notify_all()
+        logging.info("Uploaded %s in %.3fs. spool_depth: %d", entry['key'], upload_time, self.depth())
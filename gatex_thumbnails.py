@@ -0,0 +1,141 @@
+"""
+Object storage for visitor face thumbnails.
+
+Thumbnails used to live in ``trans.visitor_image_thumbnail`` as MEDIUMBLOBs,
+so every ``SELECT *`` on trans pulled JPEG bytes over the wire and the
+table's buffer pool footprint grew with each visitor. They are now written
+to an object store under a key derived only from (device_id, batch_id), and
+trans keeps the key and the image dimensions. The key being deterministic
+makes retried and redelivered invocations overwrite the same object instead
+of leaking new ones.
+
+``S3ThumbnailStore`` is the production backend; ``LocalThumbnailStore``
+writes to a directory, for tests and benchmarks. ``store_from_env`` picks
+one from THUMBNAIL_BUCKET or THUMBNAIL_DIR.
+"""
+import logging
+import os
+
+logger = logging.getLogger()
+
+DEFAULT_PREFIX = 'thumbnails/'
+
+
+def thumbnail_key(device_id, batch_id, prefix=DEFAULT_PREFIX):
+    """Object key of a visit's thumbnail, e.g. ``thumbnails/000111/42.jpg``."""
+    return f"{prefix}{int(device_id):06d}/{int(batch_id)}.jpg"
+
+
+def jpeg_size(data):
+    """
+    Read (width, height) from a JPEG's frame header without decoding it.
+
+    :return: (width, height), or None if no frame header is found.
+    """
+    pos = 2  # Skip SOI
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # Fill byte
+            pos += 1
+            continue
+        length = int.from_bytes(data[pos + 2:pos + 4], 'big')
+        # SOF0-SOF15 carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) share the range
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if pos + 9 > len(data):
+                return None
+            height = int.from_bytes(data[pos + 5:pos + 7], 'big')
+            width = int.from_bytes(data[pos + 7:pos + 9], 'big')
+            return width, height
+        pos += 2 + length
+    return None
+
+
+class StoredThumbnail:
+    """Reference to a stored thumbnail, as written to trans."""
+
+    __slots__ = ('key', 'width', 'height')
+
+    def __init__(self, key, width=None, height=None):
+        self.key = key
+        self.width = width
+        self.height = height
+
+    def __repr__(self):
+        return f"StoredThumbnail({self.key!r}, {self.width}x{self.height})"
+
+
+class S3ThumbnailStore:
+    """
+    Thumbnails in an S3 bucket.
+
+    Use a bucket, or a prefix excluded from the upload notification, that does
+    not trigger sqlRekognitionLambda.
+    """
+
+    def __init__(self, s3_client, bucket_name, prefix=DEFAULT_PREFIX):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+
+    def put(self, key, data):
+        self.s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=data, ContentType='image/jpeg')
+
+    def get(self, key):
+        return self.s3_client.get_object(Bucket=self.bucket_name, Key=key)['Body'].read()
+
+
+class LocalThumbnailStore:
+    """Thumbnails as files under ``root``, laid out like the S3 keys."""
+
+    def __init__(self, root, prefix=DEFAULT_PREFIX):
+        self.root = root
+        self.prefix = prefix
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, key):
+        with open(self._path(key), 'rb') as file:
+            return file.read()
+
+
+def store_thumbnail(store, device_id, batch_id, data):
+    """
+    Write a thumbnail and return its reference.
+
+    :return: StoredThumbnail, or None if ``data`` is empty (no face was found).
+    """
+    if not data:
+        return None
+    key = thumbnail_key(device_id, batch_id, store.prefix)
+    store.put(key, data)
+    width, height = jpeg_size(data) or (None, None)
+    return StoredThumbnail(key, width, height)
+
+
+def store_from_env(s3_client=None):
+    """
+    Build the configured store: THUMBNAIL_BUCKET (with optional THUMBNAIL_PREFIX) or THUMBNAIL_DIR.
+
+    :param s3_client: Client for the S3 backend; created with boto3 if not given.
+    :return: A store, or None if neither variable is set.
+    """
+    prefix = os.environ.get('THUMBNAIL_PREFIX', DEFAULT_PREFIX)
+    if os.environ.get('THUMBNAIL_BUCKET'):
+        if s3_client is None:
+            import boto3
+            s3_client = boto3.client('s3')
+        return S3ThumbnailStore(s3_client, os.environ['THUMBNAIL_BUCKET'], prefix)
+    if os.environ.get('THUMBNAIL_DIR'):
+        return LocalThumbnailStore(os.environ['THUMBNAIL_DIR'], prefix)
+    return None
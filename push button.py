@@ -1,17 +1,27 @@
-import RPi.GPIO as GPIO
 import time
 import os
 import boto3
 import datetime
 import logging
+import queue
+import threading
+from gatex_batch import write_batch_archive
+from gatex_camera import CaptureEngine
+from gatex_encode import EncodeProfile, encode_batch
+from gatex_gpio import RPiGPIOTrigger
+from gatex_metrics import Metrics
+from gatex_quality import QualityGate, QualityThresholds
+from gatex_spool import UploadSpool
 
 # GPIO Pin Setup
 button_pin = 27
 s3_bucket_name = 'raspberrypi4b-images'
 s3 = boto3.client('s3')
-
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(button_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # Using pull-up resistor
+# Presses closer together than this are treated as contact bounce
+debounce_seconds = 0.2
+# Presses left waiting this long behind a capture or a throttled spool are
+# dropped rather than captured as a new batch of whoever is there by then
+stale_press_seconds = 1.0
 
 # Device ID
 device_id = "000111"
@@ -23,12 +33,58 @@ camera_usb_ports = {
    # '/dev/video4': 'camera3'
 }
 
+# Re-encoding applied to each camera's photos before upload. Rekognition reads
+# text and faces fine well below 1080p, and every byte costs uplink time.
+encode_profiles = {
+    'camera1': EncodeProfile(max_size=(1280, 720), quality=85, grayscale=True),  # ID card
+    'camera2': EncodeProfile(max_size=(1280, 720), quality=80),  # Face
+    'camera3': EncodeProfile(max_size=(1280, 720), quality=85),  # Number plate
+}
+
+# Frames that are too dark, too bright or blurred are retaken once, then kept
+# in quality_reject_dir (newest 200) instead of being uploaded. A batch whose
+# face and plate frames both repeat the ones taken in the last 5 seconds is a
+# double press and is not uploaded; with only one of them connected, a repeat
+# is logged as a suspected repeat and the batch is uploaded. Camera 1 stays
+# out of that check: ID cards of one template look alike to a whole-frame hash. Sharpness is the
+# Laplacian variance of a 320 px wide grayscale copy; tune these from the
+# frames that land in quality_reject_dir.
+quality_thresholds = {
+    'camera1': QualityThresholds(min_brightness=40, min_sharpness=60.0, max_hash_distance=None),  # ID card text needs a sharp frame
+    'camera2': QualityThresholds(min_brightness=30, min_sharpness=25.0),  # Face
+    'camera3': QualityThresholds(min_brightness=25, min_sharpness=40.0),  # Number plate
+}
+
+# When True, each batch is uploaded as one archive with a manifest so the
+# Lambda processes the whole visitor in a single invocation. When False,
+# every camera image is uploaded as its own object.
+batch_upload = False
+
+# Cameras are opened once in main() and kept streaming between presses
+engine = None
+
 # Configure logging
 logging.basicConfig(filename='/home/rahultanwar/PythonFiles/camera_log.txt', level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Flag to control capture within debounce period
-is_capturing = False
+# Finished batches waiting to be uploaded. Bounded so a stalled uplink blocks
+# the next capture instead of piling up batches in memory.
+BATCH_QUEUE_SIZE = 8
+batch_queue = queue.Queue(maxsize=BATCH_QUEUE_SIZE)
+
+# Photos are spooled to disk before upload so a network outage never loses
+# them. Capture is throttled once the SD card passes the high-water mark.
+photo_dir = '/home/rahultanwar/PythonFiles'
+
+# Stage timings (trigger, capture, encode, upload), one EMF line per batch.
+# Summarize with: python gatex_metrics.py /home/rahultanwar/PythonFiles/metrics.jsonl
+metrics = Metrics('Gatex/Edge', {'DeviceId': device_id}, path=f"{photo_dir}/metrics.jsonl")
+
+quality_gate = QualityGate(quality_thresholds, metrics=metrics)
+quality_reject_dir = f"{photo_dir}/rejected"
+
+spool = UploadSpool('/home/rahultanwar/PythonFiles/spool', s3, s3_bucket_name,
+                    workers=2, high_water=0.85, metrics=metrics)
 
 
 def save_batch_counter():
@@ -48,75 +104,101 @@ def load_batch_counter():
 batch_counter = load_batch_counter()
 
 
-def take_photo(camera_name):
-    global batch_counter
-    now = datetime.datetime.now()
-    timestamp_formatted = now.strftime("%Y_%m_%d_%H_%M_%S")
-
-    logging.info(
-        f"device_id: {device_id}, batch_counter: {batch_counter}, camera_name: {camera_name}, timestamp_formatted: {timestamp_formatted}")
-
-    image_path = f"/home/rahultanwar/PythonFiles/{device_id}batch{batch_counter}{camera_name}_{timestamp_formatted}.jpeg"
-
-    camera_usb_port = [usb_port for usb_port,
-                       name in camera_usb_ports.items() if name == camera_name]
-    if not camera_usb_port:
-        logging.error(f"Camera {camera_name} not found in the USB ports.")
-        return
+def image_path_for(camera_name, batch_id, timestamp_formatted):
+    return f"{photo_dir}/{device_id}batch{batch_id}{camera_name}_{timestamp_formatted}.jpeg"
 
-    try:
-        os.system(
-            f'fswebcam -d {camera_usb_port[0]} -r 1920x1080 --no-banner {image_path}')
-    except Exception as e:
-        logging.error(f"Failed to capture photo from {camera_name}: {str(e)}")
-        return
 
-    try:
-        s3.upload_file(image_path, s3_bucket_name,
-                       f"{device_id}batch{batch_counter}{camera_name}_{timestamp_formatted}.jpeg")
-    except Exception as e:
-        logging.error(
-            f"Failed to upload photo from {camera_name} to S3: {str(e)}")
-        return
+def batch_worker():
+    """Drain finished batches from batch_queue, encode them and hand them to the spool."""
+    while True:
+        batch = batch_queue.get()
+        try:
+            queue_wait = time.monotonic() - batch['queued_at']
+            metrics.record('queue_wait', queue_wait * 1000)
+            bytes_saved, encode_time = encode_batch(batch['images'], encode_profiles)
+            metrics.record('encode', encode_time * 1000)
+            metrics.count('bytes_saved', bytes_saved)
+            if batch_upload and batch['images']:
+                archive_path = write_batch_archive(photo_dir, device_id, batch['batch_id'],
+                                                   batch['timestamp'], batch['images'])
+                for image_path in batch['images'].values():
+                    os.remove(image_path)
+                spool.enqueue(archive_path)
+            else:
+                for image_path in batch['images'].values():
+                    spool.enqueue(image_path)
+            logging.info(
+                "Batch %s spooled. queue_wait: %.3fs, encode: %.3fs, bytes_saved: %s, queue_depth: %d, spool_depth: %d",
+                batch['batch_id'], queue_wait, encode_time, bytes_saved, batch_queue.qsize(), spool.depth())
+        except Exception as e:
+            logging.error("Batch worker failed on batch %s: %s", batch['batch_id'], e)
+        finally:
+            # Uploads finish on the spool threads, so their timings go out with a later batch's line
+            metrics.flush(batch_id=batch['batch_id'], images=len(batch['images']))
+            batch_queue.task_done()
+
+
+def start_workers():
+    threading.Thread(target=batch_worker, name="batch", daemon=True).start()
+    spool.start()
+
+
+def capture_photos(press=None):
+    global batch_counter
 
-    logging.info(f"Photo captured and uploaded to S3: {image_path}")
+    logging.info("Button pressed detected.")
+    if press is not None:
+        metrics.record('trigger_latency', press.latency() * 1000)
+        logging.info("Trigger latency: %.1fms", press.latency() * 1000)
 
+    logging.info("Starting photo capture process.")
 
-def capture_photos():
-    global batch_counter, is_capturing
+    # Block here rather than filling the SD card while the uplink is down.
+    spool.wait_for_capacity()
 
-    logging.info(f"Button pressed detected. is_capturing: {is_capturing}")
+    # Claim the batch number at press time so the next press can start a new
+    # batch while this one is still being uploaded.
+    batch_id = batch_counter
+    batch_counter += 1
+    save_batch_counter()  # Save the updated batch_counter immediately after increment
 
-    if is_capturing:
-        logging.info(
-            "Capture already in progress. Ignoring this button press.")
+    capture_start = time.monotonic()
+    timestamp_formatted = datetime.datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
+    logging.info("device_id: %s, batch_counter: %s, timestamp_formatted: %s", device_id, batch_id, timestamp_formatted)
+    # All cameras are captured in parallel and share the batch timestamp
+    paths = {camera_name: image_path_for(camera_name, batch_id, timestamp_formatted)
+             for camera_name in camera_usb_ports.values()}
+    images = {camera_name: path for camera_name, path in engine.capture(paths).items() if path}
+    capture_time = time.monotonic() - capture_start
+    metrics.record('capture', capture_time * 1000)
+    metrics.count('cameras_failed', len(paths) - len(images))
+
+    if not images:
+        logging.warning("No usable photos for batch %s. Nothing to upload.", batch_id)
         return
 
-    logging.info("Starting photo capture process.")
-    is_capturing = True
+    batch_queue.put({'batch_id': batch_id, 'timestamp': timestamp_formatted, 'images': images,
+                     'queued_at': time.monotonic()})
+    logging.info("Photo capture completed for batch %s. capture: %.3fs, queue_depth: %d",
+                 batch_id, capture_time, batch_queue.qsize())
 
-    for camera_usb_port, camera_name in camera_usb_ports.items():
-        take_photo(camera_name)
-        # Wait for 3 seconds before capturing from the next camera
-        time.sleep(5)
 
-    batch_counter += 1
-    save_batch_counter()  # Save the updated batch_counter immediately after increment
-    logging.info(
-        f"Photo capture completed for batch {batch_counter}. Incrementing batch_counter.")
+def main():
+    global engine
+    # Pick up photos stranded by earlier runs that uploaded inline.
+    spool.adopt(photo_dir, suffix=('.jpeg', '.zip'))
+    start_workers()
+    engine = CaptureEngine.open_v4l2(camera_usb_ports, gate=quality_gate, reject_dir=quality_reject_dir)
+    trigger = RPiGPIOTrigger(button_pin, debounce=debounce_seconds)
+    try:
+        while True:
+            # Presses arrive from the GPIO edge interrupt, no polling needed
+            press = trigger.wait(max_age=stale_press_seconds)
+            capture_photos(press)
+    except KeyboardInterrupt:
+        trigger.close()  # Clean up GPIO settings
+        engine.close()
 
-    # Delay to ensure no re-triggering happens immediately
-    time.sleep(1)  # You may adjust this based on your observation
-    is_capturing = False
-    logging.info(
-        "Reset is_capturing flag and ready for the next button press.")
 
-try:
-    while True:
-        button_state = GPIO.input(button_pin)
-        if button_state == False:  # Button is pressed
-            capture_photos()  # Call the function to handle photo capture
-            time.sleep(0.5)  # Debounce delay; adjust as necessary
-        time.sleep(0.1)  # Short delay to reduce CPU usage
-except KeyboardInterrupt:
-    GPIO.cleanup()  # Clean up GPIO settings
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -137,7 +137,6 @@ async function handleSubmit(event) {
   try {
     const formData = new FormData(document.getElementById("filterForm"));
     let filterData = Object.fromEntries(formData);
-    userDataPromise = null; // Reset userDataPromise
     dataProcessing(filterData);
   } catch (error) {
     console.error("Error submitting form:", error);
@@ -146,122 +145,94 @@ async function handleSubmit(event) {
 
 let myChart = null; // Single instance of the chart
 
-async function dataProcessing(filterData) {
-  try {
-    const userData = await fetchUserData();
-    let transData = [...userData.transData];
-
-    // Initialize sets to collect unique years and months in the dataset.
-    let uniqueYears = new Set();
-    let uniqueMonths = new Set();
+// Daily visit counts per device from the server-side rollup, instead of every
+// trans row. start/end are YYYY-MM-DD; dates come back as dd/mm/yyyy.
+async function fetchDailyRollup(start, end) {
+  const params = new URLSearchParams({ start, end });
+  const response = await fetch("/api/getDailyRollup?" + params.toString());
+  if (!response.ok) {
+    throw new Error("Fetch failed with status " + response.status);
+  }
+  const data = await response.json();
+  return data.daily.map((row) => {
+    const [date, month, year] = row.date.split("/").map(Number);
+    return { year, month, date, visits: Number(row.visits) };
+  });
+}
 
-    // Populate the uniqueYears and uniqueMonths sets.
-    for (let item of transData) {
-      if (item.year) {
-        uniqueYears.add(item.year.toString()); // Convert to string to ensure consistency
-      }
-      if (filterData.year) {
-        if (item.year == filterData.year && item.month) {
-          uniqueMonths.add(item.month.toString()); // Convert to string to ensure consistency
-        }
-      }
-    }
+function showNoData(message) {
+  document.getElementById("message").innerText = message;
+  if (myChart) {
+    myChart.destroy();
+    myChart = null;
+  }
+}
 
-    if (filterData.year && !uniqueYears.has(filterData.year)) {
-      document.getElementById("message").innerText =
-        "No data available for the selected year.";
-      if (myChart) {
-        myChart.destroy();
-        myChart = null;
-      }
-      return;
+async function dataProcessing(filterData) {
+  try {
+    const year = parseInt(filterData.year, 10);
+    const month = parseInt(filterData.month, 10);
+    const pad = (value) => String(value).padStart(2, "0");
+
+    // Ask only for the days the chart shows
+    let start = "1970-01-01";
+    let end = "9999-12-31";
+    if (year && month) {
+      const daysInMonth = new Date(year, month, 0).getDate();
+      start = `${year}-${pad(month)}-01`;
+      end = `${year}-${pad(month)}-${pad(daysInMonth)}`;
+    } else if (year) {
+      start = `${year}-01-01`;
+      end = `${year}-12-31`;
     }
+    const rollup = await fetchDailyRollup(start, end);
 
-    // If a month is selected, check if it exists within the selected year in the dataset.
-    if (filterData.month && !uniqueMonths.has(filterData.month)) {
-      document.getElementById("message").innerText =
-        "No data available for the selected month.";
-      if (myChart) {
-        myChart.destroy();
-        myChart = null;
-      }
+    if (rollup.length === 0) {
+      showNoData(
+        year && !month
+          ? "No data available for the selected year."
+          : "No data available for the selected month."
+      );
       return;
     }
-
-    // Filtering logic
-    let filteredData = transData.filter(
-      (item) =>
-        (!filterData.project_name ||
-          item.project_name == filterData.project_name) &&
-        (!filterData.building_name ||
-          item.building_name == filterData.building_name) &&
-        (!filterData.year || item.year == filterData.year) &&
-        (!filterData.month || item.month == filterData.month)
-    );
-
-    if (filteredData.length === 0) {
-      document.getElementById("message").innerText =
-        "No data available for the selected month.";
-      if (myChart) {
-        myChart.destroy();
-        myChart = null;
-      }
-    }
     document.getElementById("message").innerText = "";
 
     let labels = [];
-    let dataCounts = {};
+    let field;
 
-    if (!filterData.year) {
+    if (!year) {
       // Handling years if none is selected
-      const years = filteredData.map((item) => item.year);
+      const years = rollup.map((item) => item.year);
       const minYear = Math.min(...years);
       const maxYear = Math.max(...years);
       labels = Array.from(
         { length: maxYear - minYear + 5 }, // Adjust length to add 2 years on each side
         (_, i) => i + minYear - 2 // Start from 2 years before minYear
       );
-      dataCounts = labels.reduce((acc, year) => {
-        acc[year] = 0;
-        return acc;
-      }, {});
-      filteredData.forEach((item) => {
-        if (dataCounts.hasOwnProperty(item.year)) {
-          dataCounts[item.year] += 1;
-        }
-      });
-    } else if (filterData.year && !filterData.month) {
+      field = "year";
+    } else if (!month) {
       // Handle months
       labels = Array.from({ length: 12 }, (_, i) => i + 1);
-      dataCounts = labels.reduce((acc, month) => {
-        acc[month] = 0;
-        return acc;
-      }, {});
-      filteredData.forEach((item) => {
-        if (dataCounts.hasOwnProperty(item.month)) {
-          dataCounts[item.month] += 1;
-        }
-      });
+      field = "month";
     } else {
       // Handle dates
-      const daysInMonth = (year, month) => new Date(year, month, 0).getDate();
-      let year = parseInt(filterData.year, 10);
-      let month = parseInt(filterData.month, 10);
       labels = Array.from(
-        { length: daysInMonth(year, month) },
+        { length: new Date(year, month, 0).getDate() },
         (_, i) => i + 1
       );
-      dataCounts = labels.reduce((acc, date) => {
-        acc[date] = 0;
-        return acc;
-      }, {});
-      filteredData.forEach((item) => {
-        if (dataCounts.hasOwnProperty(item.date)) {
-          dataCounts[item.date] += 1;
-        }
-      });
+      field = "date";
     }
 
+    const dataCounts = labels.reduce((acc, label) => {
+      acc[label] = 0;
+      return acc;
+    }, {});
+    rollup.forEach((item) => {
+      if (dataCounts.hasOwnProperty(item[field])) {
+        dataCounts[item[field]] += item.visits;
+      }
+    });
+
     // Create the chart
     createChart(labels, dataCounts);
   } catch (error) {
@@ -5,6 +5,10 @@ const path = require("path");
 const db = require("./conn/connection");
 const app = express();
 
+// Public base URL (e.g. a CloudFront distribution) of THUMBNAIL_BUCKET, where
+// the ingestion Lambda now stores face thumbnails under visitor_thumbnail_key
+const thumbnailBaseUrl = process.env.THUMBNAIL_BASE_URL || "";
+
 app.use(cookieParser());
 app.use(express.json());
 app.use(express.urlencoded({ extended: false }));
@@ -363,7 +367,10 @@ async function getTransData(deviceIdArray) {
     db.query(sqlTrans, deviceIdArray, (err, transResults) => {
       if (err) return reject(err);
       transResults.forEach((trans) => {
-        if (trans.visitor_image_thumbnail) {
+        if (trans.visitor_thumbnail_key && thumbnailBaseUrl) {
+          trans.visitor_image_thumbnail_data_url =
+            thumbnailBaseUrl.replace(/\/$/, "") + "/" + trans.visitor_thumbnail_key;
+        } else if (trans.visitor_image_thumbnail) {
           let base64Image = Buffer.from(trans.visitor_image_thumbnail).toString(
             "base64"
           );
@@ -444,3 +451,65 @@ app.get("/api/getUserData", ensureAuthenticated, async (req, res) => {
     res.status(500).send("Internal Server Error");
   }
 });
+
+// Daily visits, visitors still inside, and average/max dwell per device, read
+// from trans_rollup (maintained by the ingestion Lambda) instead of every
+// trans row. ?start=YYYY-MM-DD&end=YYYY-MM-DD, plus ?date= for the hourly
+// histogram of one day.
+app.get("/api/getDailyRollup", ensureAuthenticated, async (req, res) => {
+  try {
+    const user = await getUserFromDB(req.session.user);
+    const deviceIdArray = user && user.device_id ? JSON.parse(user.device_id) : [];
+    if (deviceIdArray.length === 0) {
+      return res.json({ daily: [], hourly: [] });
+    }
+    const daily = await getDailyRollup(deviceIdArray, req.query.start, req.query.end);
+    const hourly = req.query.date
+      ? await getHourlyRollup(deviceIdArray, req.query.date)
+      : [];
+    res.json({ daily, hourly });
+  } catch (error) {
+    console.error("Error:", error);
+    res.status(500).send("Internal Server Error");
+  }
+});
+
+async function getDailyRollup(deviceIdArray, start, end) {
+  return new Promise((resolve, reject) => {
+    const placeholders = deviceIdArray.map(() => "?").join(",");
+    const sql = `
+      SELECT device_id, date, SUM(visits) AS visits, SUM(visits) - SUM(exits) AS inside,
+             SUM(dwell_seconds_total) / NULLIF(SUM(exits), 0) AS avg_dwell_seconds,
+             MAX(dwell_seconds_max) AS max_dwell_seconds
+      FROM trans_rollup
+      WHERE device_id IN (${placeholders}) AND date BETWEEN ? AND ?
+      GROUP BY device_id, date
+      ORDER BY device_id, date`;
+    db.query(sql, [...deviceIdArray, start, end], (err, results) => {
+      if (err) return reject(err);
+      results.forEach((row) => {
+        row.date = formatDate(row.date);
+      });
+      resolve(results);
+    });
+  });
+}
+
+async function getHourlyRollup(deviceIdArray, date) {
+  return new Promise((resolve, reject) => {
+    const placeholders = deviceIdArray.map(() => "?").join(",");
+    const sql = `
+      SELECT hour, SUM(visits) AS visits
+      FROM trans_rollup
+      WHERE device_id IN (${placeholders}) AND date = ?
+      GROUP BY hour`;
+    db.query(sql, [...deviceIdArray, date], (err, results) => {
+      if (err) return reject(err);
+      const histogram = new Array(24).fill(0);
+      results.forEach((row) => {
+        histogram[row.hour] = Number(row.visits);
+      });
+      resolve(histogram);
+    });
+  });
+}
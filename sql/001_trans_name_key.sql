@@ -0,0 +1,7 @@
+-- Normalized visitor name key for indexed exit matching.
+-- Filled by sqlRekognitionLambda at entry time; backfill existing rows with
+--   python gatex_jobs.py backfill-name-key
+-- NULL means "not computed yet", '' means the ID text has no name.
+ALTER TABLE trans
+    ADD COLUMN name_key VARCHAR(10) NULL,
+    ADD INDEX idx_trans_exit_lookup (device_id, name_key, exit_time);
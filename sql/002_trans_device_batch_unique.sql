@@ -0,0 +1,5 @@
+-- One trans row per (device_id, batch_id), so camera writes can upsert.
+-- Merge existing duplicates first, otherwise the ALTER fails:
+--   python gatex_jobs.py dedupe-batches
+ALTER TABLE trans
+    ADD UNIQUE KEY uq_trans_device_batch (device_id, batch_id);
@@ -0,0 +1,6 @@
+-- Entry date and time as one value, so the overdue query can range-scan
+-- across midnight instead of comparing time-of-day strings over all history.
+-- STORED generated column: existing rows are filled by the ALTER itself.
+ALTER TABLE trans
+    ADD COLUMN entry_at DATETIME AS (TIMESTAMP(date, entry_time)) STORED,
+    ADD INDEX idx_trans_overdue (email_sent, exit_time, entry_at);
@@ -0,0 +1,21 @@
+-- Due-alert store for overstay emails, plus a per-customer overstay limit.
+-- sqlRekognitionLambda schedules a row per new visit and deletes it on exit;
+-- gatex-email-notification pops the rows whose due_at has passed.
+-- NULL overstay_minutes means the default (OVERSTAY_MINUTES, 120).
+ALTER TABLE customer_master
+    ADD COLUMN overstay_minutes INT NULL;
+
+CREATE TABLE overstay_alert (
+    device_id INT NOT NULL,
+    batch_id INT NOT NULL,
+    due_at DATETIME NOT NULL,
+    PRIMARY KEY (device_id, batch_id),
+    INDEX idx_overstay_alert_due (due_at)
+);
+
+-- Schedule the visits that are open and not alerted yet, with the default
+-- limit. Run after sql/003_trans_entry_at.sql.
+INSERT IGNORE INTO overstay_alert (device_id, batch_id, due_at)
+SELECT device_id, batch_id, entry_at + INTERVAL 120 MINUTE
+FROM trans
+WHERE email_sent = 0 AND exit_time IS NULL;
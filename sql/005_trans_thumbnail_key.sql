@@ -0,0 +1,9 @@
+-- Face thumbnails move to an object store (THUMBNAIL_BUCKET); trans keeps
+-- the object key and the image size. Existing blobs are copied out and
+-- cleared in chunks afterwards with
+--   THUMBNAIL_BUCKET=... python gatex_jobs.py migrate-thumbnails
+-- visitor_image_thumbnail stays until every reader uses the key.
+ALTER TABLE trans
+    ADD COLUMN visitor_thumbnail_key VARCHAR(255) NULL,
+    ADD COLUMN visitor_thumbnail_width SMALLINT UNSIGNED NULL,
+    ADD COLUMN visitor_thumbnail_height SMALLINT UNSIGNED NULL;
@@ -0,0 +1,14 @@
+-- Per-device, per-day, per-entry-hour attendance rollup, kept up to date by
+-- sqlRekognitionLambda (see gatex_rollup.py). After creating it and
+-- deploying the Lambda, fill it from history with
+--   python gatex_jobs.py rebuild-rollups
+CREATE TABLE trans_rollup (
+    device_id INT NOT NULL,
+    date DATE NOT NULL,
+    hour TINYINT UNSIGNED NOT NULL,
+    visits INT UNSIGNED NOT NULL DEFAULT 0,
+    exits INT UNSIGNED NOT NULL DEFAULT 0,
+    dwell_seconds_total BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    dwell_seconds_max INT UNSIGNED NOT NULL DEFAULT 0,
+    PRIMARY KEY (device_id, date, hour)
+);
@@ -0,0 +1,15 @@
+-- Before alerts were leased, a notifier run that died between claiming
+-- visits (email_sent = 2) and recording the send left them claimed with their
+-- overstay_alert row already deleted, so they were never alerted. The notifier
+-- does not re-send claimed visits on its own, since SES may have accepted
+-- their digest; run this only after checking that it did not. It puts the
+-- open ones back to pending with an alert due now, like
+-- gatex_jobs.py requeue-claims does for single visits.
+INSERT IGNORE INTO overstay_alert (device_id, batch_id, due_at)
+SELECT device_id, batch_id, NOW()
+FROM trans
+WHERE email_sent = 2 AND exit_time IS NULL;
+
+UPDATE trans
+SET email_sent = 0
+WHERE email_sent = 2 AND exit_time IS NULL;
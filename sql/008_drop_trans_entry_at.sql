@@ -0,0 +1,8 @@
+-- trans.entry_at and idx_trans_overdue served the notifier's overdue scan of
+-- trans, which reads the overstay_alert queue instead since
+-- sql/004_overstay_alert.sql; 004's backfill was the last reader of entry_at.
+-- The index only cost a write on every trans insert and email_sent update.
+-- Run after sql/004_overstay_alert.sql.
+ALTER TABLE trans
+    DROP INDEX idx_trans_overdue,
+    DROP COLUMN entry_at;
@@ -0,0 +1,65 @@
+-- Reference schema of the Gatex tables, as used by sqlRekognitionLambda,
+-- gatex-email-notification and the registration dashboard. Use it to create
+-- a local database for benchmarks and stress runs; production is migrated
+-- with the numbered files in this directory.
+
+CREATE TABLE IF NOT EXISTS trans (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    device_id INT NOT NULL,
+    batch_id INT NOT NULL,
+    date DATE NOT NULL,
+    day VARCHAR(10),
+    entry_time TIME NOT NULL,
+    exit_time TIME NULL,
+    visitor_ID_Details TEXT,
+    vehicle_no VARCHAR(64),
+    visitor_image_thumbnail MEDIUMBLOB,  -- legacy, see visitor_thumbnail_key
+    visitor_thumbnail_key VARCHAR(255) NULL,
+    visitor_thumbnail_width SMALLINT UNSIGNED NULL,
+    visitor_thumbnail_height SMALLINT UNSIGNED NULL,
+    email_sent TINYINT NOT NULL DEFAULT 0,  -- 0 pending, 2 claimed by a notifier run, 1 sent
+    name_key VARCHAR(10) NULL,
+    UNIQUE KEY uq_trans_device_batch (device_id, batch_id),
+    INDEX idx_trans_exit_lookup (device_id, name_key, exit_time)
+);
+
+CREATE TABLE IF NOT EXISTS customer_master (
+    customer_id VARCHAR(64) PRIMARY KEY,
+    customer_login VARCHAR(255),
+    customer_password VARCHAR(255),
+    device_id JSON,
+    customer_name VARCHAR(255),
+    customer_type VARCHAR(64),
+    customer_address TEXT,
+    contact_person_name VARCHAR(255),
+    contact_person_emailID VARCHAR(255),
+    contact_person_phone VARCHAR(32),
+    overstay_minutes INT NULL  -- NULL: the default overstay limit
+);
+
+CREATE TABLE IF NOT EXISTS location_master (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    customer_id VARCHAR(64),
+    device_id JSON,
+    project_name VARCHAR(255),
+    building_name VARCHAR(255)
+);
+
+CREATE TABLE IF NOT EXISTS overstay_alert (
+    device_id INT NOT NULL,
+    batch_id INT NOT NULL,
+    due_at DATETIME NOT NULL,
+    PRIMARY KEY (device_id, batch_id),
+    INDEX idx_overstay_alert_due (due_at)
+);
+
+CREATE TABLE IF NOT EXISTS trans_rollup (
+    device_id INT NOT NULL,
+    date DATE NOT NULL,
+    hour TINYINT UNSIGNED NOT NULL,
+    visits INT UNSIGNED NOT NULL DEFAULT 0,
+    exits INT UNSIGNED NOT NULL DEFAULT 0,
+    dwell_seconds_total BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    dwell_seconds_max INT UNSIGNED NOT NULL DEFAULT 0,
+    PRIMARY KEY (device_id, date, hour)
+);
@@ -1,20 +1,33 @@
-# Import necessary libraries
-import boto3  # AWS SDK for Python to use AWS services like Rekognition and S3
+# Import necessary libraries. boto3, PIL and mysql.connector are heavy and only imported on the code paths that
+# use them, so they stay out of the cold start init of invocations that never reach those paths.
 import re  # Regular expression library for string matching
-import mysql.connector  # MySQL database connector to interact with MySQL database
 import logging  # Logging library to log messages
 import os  # OS library to interact with the operating system, like reading environment variables
+import json  # JSON parsing for SQS-wrapped S3 events
+import time  # Monotonic clock for invocation timing
+from concurrent.futures import ThreadPoolExecutor  # Bounded thread pool for concurrent detector calls
+from urllib.parse import unquote_plus  # S3 event keys are URL-encoded
 from io import BytesIO  # BytesIO for in-memory binary streams
-from PIL import Image  # Python Imaging Library to work with images
 from datetime import datetime  # Datetime library for handling date and time
+import gatex_alerts  # Due-alert store read by the overstay notifier
+from gatex_batch import BATCH_KEY_PATTERN, BatchFormatError, read_batch_archive  # One-object-per-batch upload format
+from gatex_cache import DetectionCache  # Cache for Rekognition responses
+from gatex_clients import LazyClient  # boto3 clients built on first use
+from gatex_db import ConnectionManager  # MySQL connection kept warm across invocations
+from gatex_directory import DeviceDirectory  # Per-customer overstay limits
+from gatex_matcher import ExitMatcher  # OCR-tolerant fuzzy exit matching
+from gatex_metrics import Metrics, log_event  # Stage timings emitted as CloudWatch EMF lines
+from gatex_names import name_key  # Visitor name key for indexed exit matching
+import gatex_rollup  # Per-device daily rollups read by the dashboard
+from gatex_thumbnails import StoredThumbnail, store_from_env, store_thumbnail  # Face thumbnails outside trans
 
 # Initialize logging to capture and log messages for debugging and tracking
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS service clients for Rekognition and S3
-rekognition_client = boto3.client('rekognition')
-s3_client = boto3.client('s3')
+# AWS service clients for Rekognition and S3, created on their first call and then kept for the container's life
+rekognition_client = LazyClient('rekognition')
+s3_client = LazyClient('s3')
 
 # Read database credentials from environment variables for security
 DB_HOST = os.environ['DB_HOST']
@@ -22,308 +35,550 @@ DB_USER = os.environ['DB_USER']
 DB_PASSWORD = os.environ['DB_PASSWORD']
 DB_DATABASE = os.environ['DB_DATABASE']
 
-def detect_number_plate(bucket_name, image_key):
+# Created once per container so warm invocations reuse the open MySQL connection. mysql.connector is imported on
+# the first connect.
+db = ConnectionManager(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_DATABASE)
+
+# Fallback for exits whose ID text was misread: trigram similarity against open visits, kept warm per device.
+# A fuzzy match is only taken when it is a plausible OCR misread and clearly better than the runner-up, since
+# a wrong one closes another visitor's visit. EXIT_MATCH_THRESHOLD is the minimum similarity (0-1).
+exit_matcher = ExitMatcher(threshold=float(os.environ.get('EXIT_MATCH_THRESHOLD', '0.7')))
+
+# Rekognition responses are cached per image so repeated detector calls on the same object are free.
+# Set DETECTION_CACHE_BUCKET (a bucket other than the upload bucket) to keep them across retries and redeliveries.
+detection_cache = DetectionCache(s3_client, sidecar_bucket=os.environ.get('DETECTION_CACHE_BUCKET'))
+
+# Customer overstay limits for scheduling alerts. The master tables change rarely, so their checksum is only
+# checked once a minute; OVERSTAY_MINUTES applies to customers without their own limit.
+device_directory = DeviceDirectory(checksum_interval=60.0,
+                                   default_overstay_minutes=int(os.environ.get('OVERSTAY_MINUTES', '120')))
+
+# Face thumbnails go to THUMBNAIL_BUCKET (or THUMBNAIL_DIR) and trans keeps only their key and size.
+# Without either variable they are still stored in trans.visitor_image_thumbnail.
+thumbnail_store = store_from_env(s3_client)
+
+# Rekognition, S3 and DB timings, printed as one EMF line per invocation for CloudWatch to pick up
+metrics = Metrics('Gatex/Lambda', {'Function': 'sqlRekognitionLambda'})
+
+def rekognition_image(bucket_name, image_key, image_bytes=None):
+    """
+    Builds the Image argument for Rekognition calls.
+
+    Images unpacked from a batch archive are passed inline as Bytes, everything else is read by Rekognition from S3.
+    """
+    if image_bytes is not None:
+        return {'Bytes': image_bytes}
+    return {'S3Object': {'Bucket': bucket_name, 'Name': image_key}}
+
+def timed_call(metric_name, call, **kwargs):
+    """
+    Calls an AWS client method and records its latency under metric_name. Cache hits never get here.
+    """
+    with metrics.span(metric_name):
+        return call(**kwargs)
+
+def detect_number_plate(bucket_name, image_key, image_bytes=None):
     """
     Detects text in an image stored in an S3 bucket that resembles a vehicle's number plate.
 
     :param bucket_name: Name of the S3 bucket where the image is stored.
     :param image_key: The key (path) to the image file in the S3 bucket.
-    :return: A string containing the detected number plate text. If error occurs, returns an empty string.
+    :param image_bytes: Image content, when it has already been fetched (batch mode).
+    :return: A string containing the detected number plate text, or None if Rekognition found no text. Client
+        errors (throttling, a missing object) are raised so the record is retried instead of stored as empty.
     """
     # Log the action of detecting a number plate
-    logger.info(f"Detecting number plate for image: {image_key} in bucket: {bucket_name}")
-    try:
-        # Use AWS Rekognition to detect text in the image
-        response = rekognition_client.detect_text(
-            Image={'S3Object': {'Bucket': bucket_name, 'Name': image_key}}
-        )
-        # Compile detected text that is classified as 'LINE' which might represent number plates
-        detected_text = ' '.join([text['DetectedText'] for text in response['TextDetections'] if text['Type'] == 'LINE'])
-        # Log the detected text
-        logger.info(f"Detected number plate text: {detected_text}")
-        return detected_text
-    except Exception as e:
-        # Log any errors that occur during the detection process
-        logger.error(f"An error occurred in detect_number_plate: {str(e)}")
-        return ""
+    logger.info("Detecting number plate for image: %s in bucket: %s", image_key, bucket_name)
+    # Use AWS Rekognition to detect text in the image
+    response = detection_cache.get_or_call(
+        'detect_text', bucket_name, image_key, image_bytes,
+        lambda: timed_call('rekognition_detect_text', rekognition_client.detect_text,
+                           Image=rekognition_image(bucket_name, image_key, image_bytes))
+    )
+    # Compile detected text that is classified as 'LINE' which might represent number plates
+    detected_text = ' '.join([text['DetectedText'] for text in response['TextDetections'] if text['Type'] == 'LINE'])
+    # The full text is only worth formatting when debugging
+    log_event(logger, logging.DEBUG, 'number_plate_text', key=image_key, text=detected_text)
+    return detected_text or None
 
-def detect_photo_id_text(bucket_name, image_key):
+def detect_photo_id_text(bucket_name, image_key, image_bytes=None):
     """
     Detects text in an image stored in an S3 bucket that resembles text on a photo ID.
 
     :param bucket_name: Name of the S3 bucket where the image is stored.
     :param image_key: The key (path) to the image file in the S3 bucket.
-    :return: A string containing the detected photo ID text. If an error occurs, returns an empty string.
+    :param image_bytes: Image content, when it has already been fetched (batch mode).
+    :return: A string containing the detected photo ID text, or None if Rekognition found no text. Client errors
+        are raised so the record is retried instead of stored as empty.
     """
     # Log the action of detecting photo ID text
-    logger.info(f"Detecting photo ID text for image: {image_key} in bucket: {bucket_name}")
+    logger.info("Detecting photo ID text for image: %s in bucket: %s", image_key, bucket_name)
+    # Use AWS Rekognition to detect text in the image
+    response = detection_cache.get_or_call(
+        'detect_text', bucket_name, image_key, image_bytes,
+        lambda: timed_call('rekognition_detect_text', rekognition_client.detect_text,
+                           Image=rekognition_image(bucket_name, image_key, image_bytes))
+    )
+    # Compile detected text that is classified as 'LINE', likely representing ID text
+    detected_text = ' '.join([text['DetectedText'] for text in response['TextDetections'] if text['Type'] == 'LINE'])
+    # The full text is only worth formatting when debugging, and carries the visitor's ID details
+    log_event(logger, logging.DEBUG, 'photo_id_text', key=image_key, text=detected_text)
+    return detected_text or None
+
+# Face thumbnails are stored at most this size, at an explicit JPEG quality
+THUMBNAIL_MAX_SIZE = (256, 256)
+THUMBNAIL_QUALITY = 85
+
+# Rekognition rejects inline images larger than this; bigger ones are read from S3 instead
+REKOGNITION_MAX_BYTES = 5 * 1024 * 1024
+
+def crop_faces(image_bytes, face_details):
+    """
+    Crops every face in face_details out of a JPEG as a bounded-size thumbnail.
+
+    The image is decoded in JPEG draft mode at the smallest scale that still gives the smallest face enough pixels
+    for a full-size thumbnail, so a 1080p frame is rarely decoded at full resolution.
+
+    :param image_bytes: The original JPEG bytes.
+    :param face_details: FaceDetails list from Rekognition detect_faces.
+    :return: A list of JPEG byte strings, one per face.
+    """
+    from PIL import Image  # Only camera 2 invocations crop faces, so only they load PIL
+
+    img = Image.open(BytesIO(image_bytes))
+    full_width, full_height = img.size  # Read from the header, nothing decoded yet
+
+    # Scale so the smallest face still covers THUMBNAIL_MAX_SIZE after the reduced decode
+    boxes = [face['BoundingBox'] for face in face_details]
+    smallest_face = min(min(box['Width'] * full_width, box['Height'] * full_height) for box in boxes)
+    scale = min(1.0, max(THUMBNAIL_MAX_SIZE) / max(smallest_face, 1))
+    img.draft('RGB', (int(full_width * scale), int(full_height * scale)))
+
+    thumbnails = []
+    for box in boxes:
+        # Rekognition can return boxes that extend past the frame edge
+        left = max(0.0, box['Left'])
+        top = max(0.0, box['Top'])
+        right = min(1.0, box['Left'] + box['Width'])
+        bottom = min(1.0, box['Top'] + box['Height'])
+        face = img.crop((int(left * img.width), int(top * img.height),
+                         int(right * img.width), int(bottom * img.height)))
+        if face.mode != 'RGB':
+            face = face.convert('RGB')
+        face.thumbnail(THUMBNAIL_MAX_SIZE, Image.LANCZOS)
+        img_byte_arr = BytesIO()
+        face.save(img_byte_arr, format='JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+        thumbnails.append(img_byte_arr.getvalue())
+    return thumbnails
+
+def detect_and_crop_faces(bucket_name, image_key, image_bytes=None, all_faces=True):
+    """
+    Detects faces in an image stored in an S3 bucket and crops them into thumbnails.
+
+    The object is fetched from S3 once and the same bytes are sent to Rekognition and used for cropping.
+
+    :param bucket_name: Name of the S3 bucket where the image is stored.
+    :param image_key: The key (path) to the image file in the S3 bucket.
+    :param image_bytes: Image content, when it has already been fetched (batch mode).
+    :param all_faces: Crop every detected face instead of only the first one.
+    :return: A list of cropped face thumbnails as JPEG bytes. Empty if no face is detected or the image cannot be
+        decoded. S3 and Rekognition errors are raised so the record is retried.
+    """
+    # Log the action of detecting and cropping faces from the image
+    logger.info("Detecting face for image: %s in bucket: %s", image_key, bucket_name)
+    # Retrieve the image from S3 once unless it was passed in
+    if image_bytes is None:
+        with metrics.span('s3_get_object'):
+            s3_response = s3_client.get_object(Bucket=bucket_name, Key=image_key)
+            image_bytes = s3_response['Body'].read()
+    rekognition_bytes = image_bytes if len(image_bytes) <= REKOGNITION_MAX_BYTES else None
+
+    # Use AWS Rekognition to detect faces in the image
+    response = detection_cache.get_or_call(
+        'detect_faces', bucket_name, image_key, rekognition_bytes,
+        lambda: timed_call('rekognition_detect_faces', rekognition_client.detect_faces,
+                           Image=rekognition_image(bucket_name, image_key, rekognition_bytes))
+    )
+
+    # Check if any faces were detected
+    face_details = response['FaceDetails']
+    if not face_details:
+        # Log if no face is detected
+        logger.error("No face detected")
+        return []
+    if not all_faces:
+        face_details = face_details[:1]
     try:
-        # Use AWS Rekognition to detect text in the image
-        response = rekognition_client.detect_text(
-            Image={'S3Object': {'Bucket': bucket_name, 'Name': image_key}}
-        )
-        # Compile detected text that is classified as 'LINE', likely representing ID text
-        detected_text = ' '.join([text['DetectedText'] for text in response['TextDetections'] if text['Type'] == 'LINE'])
-        # Log the detected text
-        logger.info(f"Detected photo ID text: {detected_text}")
-        return detected_text
+        return crop_faces(image_bytes, face_details)
     except Exception as e:
-        # Log any errors that occur during the detection process
-        logger.error(f"An error occurred in detect_photo_id_text: {str(e)}")
-        return ""
+        # A corrupt image stays corrupt, so retrying would not help
+        logger.error("Could not crop faces from %s: %s", image_key, e)
+        return []
 
-def detect_and_crop_face(bucket_name, image_key):
+def detect_and_crop_face(bucket_name, image_key, image_bytes=None):
     """
     Detects faces in an image stored in an S3 bucket and crops the first detected face from the image.
 
     :param bucket_name: Name of the S3 bucket where the image is stored.
     :param image_key: The key (path) to the image file in the S3 bucket.
-    :return: A byte array of the cropped face image. If no face is detected or an error occurs, returns an empty byte array.
+    :param image_bytes: Image content, when it has already been fetched (batch mode).
+    :return: A byte array of the cropped face image, or None if no face is detected.
     """
-    # Log the action of detecting and cropping a face from the image
-    logger.info(f"Detecting face for image: {image_key} in bucket: {bucket_name}")
-    try:
-        # Use AWS Rekognition to detect faces in the image
-        response = rekognition_client.detect_faces(
-            Image={'S3Object': {'Bucket': bucket_name, 'Name': image_key}}
-        )
-        # Retrieve the image from S3
-        s3_response = s3_client.get_object(Bucket=bucket_name, Key=image_key)
-        img = Image.open(BytesIO(s3_response['Body'].read()))
-
-        # Check if any faces were detected
-        if len(response['FaceDetails']) > 0:
-            # Get bounding box of the first detected face
-            box = response['FaceDetails'][0]['BoundingBox']
-            # Calculate coordinates of the bounding box relative to the image size
-            x1 = int(box['Left'] * img.width)
-            y1 = int(box['Top'] * img.height)
-            x2 = int((box['Left'] + box['Width']) * img.width)
-            y2 = int((box['Top'] + box['Height']) * img.height)
-            # Crop the image to the bounding box
-            img_cropped = img.crop((x1, y1, x2, y2))
-            # Convert cropped image to byte array
-            img_byte_arr = BytesIO()
-            img_cropped.save(img_byte_arr, format='JPEG')
-            img_byte_arr = img_byte_arr.getvalue()
-        else:
-            # Log if no face is detected
-            logger.error("No face detected")
-            img_byte_arr = b''
-        return img_byte_arr
-    except Exception as e:
-        # Log any errors that occur during the face detection and cropping process
-        logger.error(f"An error occurred in detect_and_crop_face: {str(e)}")
-        return b''
-
-def normalize_text(text):
-    """Normalize text by removing non-alphanumeric characters and converting to uppercase."""
-    return re.sub(r'\W+', '', text).upper()
-
-def extract_name_details(text):
-    """Extract name details from the given text after 'Name' keyword."""
-    name_match = re.search(r"Name:?[\s-]*(\w+)", text, re.IGNORECASE)
-    if name_match:
-        # Extract the name and normalize it
-        name_details = name_match.group(1)
-        return normalize_text(name_details)
-    return None
+    thumbnails = detect_and_crop_faces(bucket_name, image_key, image_bytes, all_faces=False)
+    return thumbnails[0] if thumbnails else None
 
-def process_exit(conn, cursor, device_id, extracted_text, exit_time):
-    # Assuming extracted_text handling is correct and focusing on visitor_id_details being None...
-    new_name_details = extract_name_details(extracted_text)
+def process_exit(conn, cursor, device_id, batch_id, extracted_text, exit_time):
+    """
+    Records an exit if the name on the ID card matches an open visit on this device.
+
+    The batch's own row never counts: cameras 2 and 3 of the same batch may already have opened it as an entry.
 
-    if new_name_details:
-        logger.info(f"Extracted Name for comparison: {new_name_details}")
+    The exact match is an indexed lookup on (device_id, name_key, exit_time) using the key stored at entry time.
+    If several open visits share the key, the most recent one is closed. Without an exact match, the trigram
+    matcher tries open visits whose key is similar enough to allow for OCR misreads.
+    """
+    new_name_key = name_key(extracted_text)
+
+    if new_name_key:
+        logger.info("Extracted Name for comparison: %s", new_name_key)
 
         cursor.execute("""
-            SELECT batch_id, visitor_id_details
+            SELECT batch_id
             FROM trans
-            WHERE device_id = %s AND exit_time IS NULL
-        """, (device_id,))
-        logger.info(f"Searching for matching records with device_id={device_id} and NULL exit time...")
-
-        for row in cursor.fetchall():
-            if row['visitor_id_details']:
-                existing_name_details = extract_name_details(row['visitor_id_details'])
-                if existing_name_details and new_name_details[:10] == existing_name_details[:10]:
-                    logger.info(f"Name match found. Updating exit time for batch_id={row['batch_id']} and the exit time is:{exit_time}")
-                    cursor.execute("""
-                        UPDATE trans
-                        SET exit_time = %s
-                        WHERE device_id = %s AND batch_id = %s
-                    """, (exit_time, device_id, row['batch_id']))
-                    conn.commit()
-                    return True
-            else:
-                logger.info("Record has no visitor_id_details. Skipping comparison.")
+            WHERE device_id = %s AND name_key = %s AND exit_time IS NULL AND batch_id <> %s
+            ORDER BY date DESC, entry_time DESC
+            LIMIT 1
+        """, (device_id, new_name_key, batch_id))
+        logger.info("Searching for matching records with device_id=%s and NULL exit time...", device_id)
+
+        row = cursor.fetchone()
+        if row:
+            logger.info("Name match found. Updating exit time for batch_id=%s and the exit time is:%s", row['batch_id'], exit_time)
+            # A concurrent invocation may have closed the visit since the SELECT; only count the exit once
+            cursor.execute("""
+                UPDATE trans
+                SET exit_time = %s
+                WHERE device_id = %s AND batch_id = %s AND exit_time IS NULL
+            """, (exit_time, device_id, row['batch_id']))
+            closed = cursor.rowcount
+            exit_matcher.visit_closed(device_id, row['batch_id'])
+            if closed == 1:
+                gatex_alerts.cancel(cursor, device_id, row['batch_id'])  # The visitor left, no overstay email
+                gatex_rollup.record_exit(cursor, device_id, row['batch_id'])  # Count the exit and its dwell time
+                return True
+
+        for score, match_id in exit_matcher.candidates(cursor, device_id, new_name_key, batch_id):
+            # The index may be stale, so only close the visit if it is still open
+            cursor.execute("""
+                UPDATE trans
+                SET exit_time = %s
+                WHERE device_id = %s AND batch_id = %s AND exit_time IS NULL
+            """, (exit_time, device_id, match_id))
+            closed = cursor.rowcount
+            exit_matcher.visit_closed(device_id, match_id)
+            if closed == 1:
+                gatex_alerts.cancel(cursor, device_id, match_id)  # The visitor left, no overstay email
+                gatex_rollup.record_exit(cursor, device_id, match_id)  # Count the exit and its dwell time
+                logger.info("Fuzzy name match found (score %.2f). Updating exit time for batch_id=%s and the exit time is:%s",
+                            score, match_id, exit_time)
+                return True
 
     else:
         logger.warning("No 'Name' found in the extracted text for exit processing.")
-    
+
     logger.info("No matching record found for exit. Proceeding with usual workflow.")
     return False
 
 
-def update_or_insert_db(cursor, conn, device_id, batch_id, camera_number, bucket_name, file_name, date, entry_time):
+# Which trans column each camera fills
+CAMERA_COLUMNS = {
+    '1': 'visitor_ID_Details',  # Camera 1 captures visitor ID details
+    '2': 'visitor_image_thumbnail',  # Camera 2 captures visitor image thumbnails
+    '3': 'vehicle_no',  # Camera 3 captures vehicle numbers
+}
+
+# Regular expression to parse per-image file names for required components
+IMAGE_KEY_PATTERN = re.compile(r'(\d{6})batch(\d+)camera(\d+)_(\d{4})_(\d{2})_(\d{2})_(\d{2})_(\d{2})_(\d{2})\.jpeg')
+
+# Rekognition and S3 calls for the records of one event run on this many threads
+DETECTION_WORKERS = int(os.environ.get('DETECTION_WORKERS', '8'))
+detection_pool = ThreadPoolExecutor(max_workers=DETECTION_WORKERS)
+
+def detect_camera(bucket_name, file_name, camera_number, image_bytes=None):
+    """
+    Runs the detector for one camera image and returns the value for its trans column.
+
+    None means the detector found nothing, and keeps whatever the column already holds. S3 and Rekognition errors
+    propagate, so the record goes into batchItemFailures instead of being stored as an empty detection.
+    """
+    if camera_number == '1':
+        return detect_photo_id_text(bucket_name, file_name, image_bytes)
+    if camera_number == '2':
+        return detect_and_crop_face(bucket_name, file_name, image_bytes)
+    if camera_number == '3':
+        return detect_number_plate(bucket_name, file_name, image_bytes)
+    logger.error("Unknown camera number %s in %s", camera_number, file_name)
+    return None
+
+def update_or_insert_db(cursor, device_id, batch_id, date, entry_time, detected):
     """
-    Updates or inserts a record in the database based on the detected information from images.
-    Ensures that all records with the same batch_id have the same entry_time.
+    Updates or inserts the trans record of a batch with the detected information from its images.
+
+    Runs as a single upsert on the (device_id, batch_id) unique key, so concurrent camera invocations for the same
+    batch merge into one row instead of racing between a SELECT and an INSERT.
+
+    :param detected: Mapping of camera number to the detected value for that camera's column.
     """
-    # Convert year, month, and date to integers and compute the day of the week for the given date
+    # Compute the day of the week for the given date
     computed_day = datetime.strptime(date, '%Y-%m-%d').strftime('%A')
+    columns = {CAMERA_COLUMNS[camera]: value for camera, value in detected.items() if camera in CAMERA_COLUMNS}
+    thumbnail = columns.get('visitor_image_thumbnail')
+    if isinstance(thumbnail, StoredThumbnail):
+        # Stored in the thumbnail store already; only the reference goes into trans
+        columns['visitor_image_thumbnail'] = None
+    else:
+        thumbnail = None
+    if detected.get('1'):
+        # Computed once here so exits can use an indexed lookup instead of re-parsing every open visit
+        columns['name_key'] = name_key(detected['1'])
 
     logger.info("Starting update_or_insert_db")
-    try:
-        # Check if there is already an entry for this batch_id
-        cursor.execute("SELECT entry_time FROM trans WHERE batch_id = %s", (batch_id,))
-        row = cursor.fetchone()
+    insert_new_record(cursor, device_id, batch_id, date, computed_day, entry_time,
+                      columns.get('visitor_ID_Details'), columns.get('vehicle_no'),
+                      columns.get('visitor_image_thumbnail'), columns.get('name_key'), thumbnail)
+    if columns.get('name_key'):
+        exit_matcher.visit_opened(device_id, batch_id, columns['name_key'])
+    logger.info("Database operation completed successfully.")
+
+def insert_new_record(cursor, device_id, batch_id, date, day, entry_time, visitor_id_details, vehicle_no, visitor_image_thumbnail, visitor_name_key=None, thumbnail=None):
+    """
+    Inserts a new record into the database with the given details, or merges them into the existing record of the
+    same (device_id, batch_id).
 
-        # If there's already an entry for this batch_id, use the entry_time from that record
-        if row:
-            entry_time = row['entry_time']  # This sets entry_time to the first recorded entry_time for this batch_id
-
-        # Execute the appropriate action based on camera_number
-        if camera_number == '1':
-            # Camera 1 captures visitor ID details
-            visitor_id_details = detect_photo_id_text(bucket_name, file_name)
-            if row:
-                # Update existing record
-                sql = "UPDATE trans SET visitor_ID_Details = %s WHERE batch_id = %s"
-                cursor.execute(sql, (visitor_id_details, batch_id))
-            else:
-                # Insert new record
-                insert_new_record(cursor, device_id, batch_id, date, computed_day, entry_time, visitor_id_details, None, None)
-        elif camera_number == '2':
-            # Camera 2 captures visitor image thumbnails
-            visitor_image_thumbnail = detect_and_crop_face(bucket_name, file_name)
-            if row:
-                # Update existing record
-                sql = "UPDATE trans SET visitor_image_thumbnail = %s WHERE batch_id = %s"
-                cursor.execute(sql, (visitor_image_thumbnail, batch_id))
-            else:
-                # Insert new record
-                insert_new_record(cursor, device_id, batch_id, date, computed_day, entry_time, None, None, visitor_image_thumbnail)
-        elif camera_number == '3':
-            # Camera 3 captures vehicle numbers
-            vehicle_no = detect_number_plate(bucket_name, file_name)
-            if row:
-                # Update existing record
-                sql = "UPDATE trans SET vehicle_no = %s WHERE batch_id = %s"
-                cursor.execute(sql, (vehicle_no, batch_id))
-            else:
-                # Insert new record
-                insert_new_record(cursor, device_id, batch_id, date, computed_day, entry_time, None, vehicle_no, None)
-
-        # Commit the transaction to make changes persistent
-        conn.commit()
-        logger.info("Database operation completed successfully.")
-    except Exception as e:
-        logger.error(f"An error occurred during database operation: {str(e)}")
-        conn.rollback()
+    On a merge, columns given here replace the stored ones, columns passed as None keep their stored value (so
+    callers pass None, never '', for something not detected), and the row keeps the earliest date and entry_time
+    seen for the batch. A new visit also gets its overstay alert scheduled, due once the customer's overstay limit
+    has passed since entry_time, and is counted in trans_rollup.
 
-def insert_new_record(cursor, device_id, batch_id, date, day, entry_time, visitor_id_details, vehicle_no, visitor_image_thumbnail):
-    """
-    Inserts a new record into the database with the given details.
+    :param thumbnail: StoredThumbnail whose key and size are recorded instead of visitor_image_thumbnail bytes.
+
+    :return: True if a new record was inserted, False if an existing one was updated.
     """
+    # MySQL applies ON DUPLICATE KEY assignments left to right, and later ones see earlier results. day and
+    # entry_time are assigned before date so all three compare against the stored (date, entry_time).
     sql = """
     INSERT INTO trans
-    (device_id, batch_id, date, day, entry_time, visitor_ID_Details, vehicle_no, visitor_image_thumbnail)
+    (device_id, batch_id, date, day, entry_time, visitor_ID_Details, vehicle_no, visitor_image_thumbnail, name_key,
+     visitor_thumbnail_key, visitor_thumbnail_width, visitor_thumbnail_height)
     VALUES
-    (%s, %s, %s, %s, %s, %s, %s, %s)
+    (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        day = IF((VALUES(date), VALUES(entry_time)) < (date, entry_time), VALUES(day), day),
+        entry_time = IF((VALUES(date), VALUES(entry_time)) < (date, entry_time), VALUES(entry_time), entry_time),
+        date = IF((VALUES(date), VALUES(entry_time)) < (date, entry_time), VALUES(date), date),
+        visitor_ID_Details = COALESCE(VALUES(visitor_ID_Details), visitor_ID_Details),
+        vehicle_no = COALESCE(VALUES(vehicle_no), vehicle_no),
+        visitor_image_thumbnail = COALESCE(VALUES(visitor_image_thumbnail), visitor_image_thumbnail),
+        name_key = COALESCE(VALUES(name_key), name_key),
+        visitor_thumbnail_key = COALESCE(VALUES(visitor_thumbnail_key), visitor_thumbnail_key),
+        visitor_thumbnail_width = COALESCE(VALUES(visitor_thumbnail_width), visitor_thumbnail_width),
+        visitor_thumbnail_height = COALESCE(VALUES(visitor_thumbnail_height), visitor_thumbnail_height)
+    """
+    thumbnail = thumbnail or StoredThumbnail(None)
+    cursor.execute(sql, (device_id, batch_id, date, day, entry_time, visitor_id_details, vehicle_no, visitor_image_thumbnail, visitor_name_key,
+                         thumbnail.key, thumbnail.width, thumbnail.height))
+    # MySQL reports 1 affected row for an insert and 2 for an update
+    inserted = cursor.rowcount == 1
+    if inserted:
+        minutes = device_directory.overstay_minutes(cursor, device_id)
+        gatex_alerts.schedule(cursor, device_id, batch_id, gatex_alerts.due_time(date, entry_time, minutes))
+        gatex_rollup.record_entry(cursor, device_id, date, entry_time)
+    return inserted
+
+def process_batch(conn, cursor, device_id, batch_id, date, entry_time, detected):
     """
-    cursor.execute(sql, (device_id, batch_id, date, day, entry_time, visitor_id_details, vehicle_no, visitor_image_thumbnail))
+    Writes everything detected for one batch inside the caller's transaction.
+
+    Camera 1 text is checked against open visits first; a match records the exit and nothing else is written.
+
+    :param detected: Mapping of camera number ('1', '2', '3') to its detected value.
+    :return: True if the batch was an exit, False if it was recorded as an entry.
+    """
+    visitor_id_details = detected.get('1')
+    if visitor_id_details:
+        logger.info("Camera 1 detected. Processing image for exit: device_id=%s, batch_id=%s", device_id, batch_id)
+        exit_time = entry_time  # The photo name has the exit time in the same format
+        if process_exit(conn, cursor, device_id, batch_id, visitor_id_details, exit_time):
+            logger.info("Exit processed successfully.")
+            return True
+        logger.info("Exit workflow did not find a match. Continuing with usual workflow.")
+    elif '1' in detected:
+        logger.error("Failed to extract text for exit processing.")
+
+    update_or_insert_db(cursor, device_id, batch_id, date, entry_time, detected)
+    return False
+
+def parse_records(event):
+    """
+    Flattens an S3 event, or an SQS event whose messages carry S3 events, into a list of uploaded objects.
+
+    :return: A list of dicts with item_id (the SQS messageId, if any), bucket, key and etag, and the set of SQS
+        message IDs whose body could not be read.
+    """
+    objects = []
+    unreadable = set()
+    for record in event.get('Records', []):
+        if 's3' in record:
+            s3_records = [(None, record)]
+        else:
+            # SQS-fronted: the message body is the original S3 notification
+            message_id = record.get('messageId')
+            try:
+                s3_records = [(message_id, r) for r in json.loads(record['body']).get('Records', [])]
+            except (KeyError, ValueError) as e:
+                logger.error("Unreadable SQS message %s: %s", message_id, e)
+                unreadable.add(message_id)
+                s3_records = []
+        for item_id, s3_record in s3_records:
+            objects.append({
+                'item_id': item_id,
+                'bucket': s3_record['s3']['bucket']['name'],
+                'key': unquote_plus(s3_record['s3']['object']['key']),
+                'etag': s3_record['s3']['object'].get('eTag'),
+            })
+    return objects, unreadable
+
+def detect_object(item):
+    """
+    Parses an uploaded object's key and runs its detectors. Runs on the detection pool.
+
+    :return: The item with device_id, batch_id, date, entry_time and detected filled in,
+        or None if the key is not a Gatex upload.
+    """
+    file_name, bucket_name = item['key'], item['bucket']
+    detection_cache.remember_etag(bucket_name, file_name, item['etag'])
+
+    # Batch archives carry every camera of a visitor in one object
+    batch_match = BATCH_KEY_PATTERN.match(file_name)
+    image_match = IMAGE_KEY_PATTERN.match(file_name)
+    if batch_match:
+        device_id, batch_id, year, month, day, hours, minutes, seconds = batch_match.groups()
+        with metrics.span('s3_get_object'):
+            s3_response = s3_client.get_object(Bucket=bucket_name, Key=file_name)
+            archive = s3_response['Body'].read()
+        manifest, images = read_batch_archive(archive)
+        logger.info("Processing batch archive %s with cameras %s", file_name, sorted(images))
+        detected = {camera: detect_camera(bucket_name, file_name, camera, image_bytes)
+                    for camera, image_bytes in images.items()}
+    elif image_match:
+        device_id, batch_id, camera_number, year, month, day, hours, minutes, seconds = image_match.groups()
+        detected = {camera_number: detect_camera(bucket_name, file_name, camera_number)}
+    else:
+        # Log an error if the file name does not match the expected format
+        logger.error("Filename format mismatch: %s", file_name)
+        return None
+
+    if thumbnail_store is not None and detected.get('2'):
+        # Written here, on the detection pool, so the DB transaction only carries the key
+        with metrics.span('thumbnail_put'):
+            detected['2'] = store_thumbnail(thumbnail_store, device_id, batch_id, detected['2'])
+
+    item.update(device_id=device_id, batch_id=batch_id, date=f"{year}-{month}-{day}",
+                entry_time=f"{hours}:{minutes}:{seconds}", detected=detected)
+    return item
 
 def lambda_handler(event,context):
     """
     AWS Lambda function handler to process images uploaded to an S3 bucket.
 
+    Every record of the event is processed: detection runs concurrently on a bounded thread pool, then the
+    database is written once per batch. Accepts S3 notifications directly or through SQS.
+
     :param event: Event data that triggered the Lambda function.
     :param context: Runtime information provided by AWS Lambda.
-    :return: A dictionary containing the status code and body message.
+    :return: A dictionary containing the status code, body message and, for SQS, the failed message IDs in the
+        batchItemFailures format so only those are retried.
     """
     # Log the start of the Lambda function handler
     logger.info("Starting lambda_handler")
-
-    # Extract file name and bucket name from the event that triggered the Lambda function
-    file_name = event['Records'][0]['s3']['object']['key']
-    bucket_name = event['Records'][0]['s3']['bucket']['name']
-
-    # Regular expression to parse the file name for required components
-    match = re.match(r'(\d{6})batch(\d+)camera(\d+)_(\d{4})_(\d{2})_(\d{2})_(\d{2})_(\d{2})_(\d{2})\.jpeg', file_name)
-
-    # Validate the file name format
-    if not match:
-        # Log an error if the file name does not match the expected format
-        logger.error(f"Filename format mismatch: {file_name}")
+    invocation_start = time.perf_counter()
+    detection_cache.begin_invocation()
+
+    items, failed_ids = parse_records(event)
+    logger.info("Processing %d uploaded objects", len(items))
+    mismatched = 0
+    exits = 0
+
+    # Fan out the Rekognition and S3 calls
+    futures = [(item, detection_pool.submit(detect_object, item)) for item in items]
+    batches = {}
+    for item, future in futures:
+        try:
+            with metrics.span('detect_wait'):
+                result = future.result()
+        except BatchFormatError as e:
+            # Retrying cannot fix a malformed archive
+            logger.error("Invalid batch archive %s: %s", item['key'], e)
+            mismatched += 1
+            continue
+        except Exception as e:
+            logger.error("Detection failed for %s: %s", item['key'], e)
+            failed_ids.add(item['item_id'])
+            continue
+        if result is None:
+            mismatched += 1
+            continue
+        batches.setdefault((result['device_id'], result['batch_id']), []).append(result)
+
+    # One transaction per batch; images of the same batch in this event are merged into one write
+    for (device_id, batch_id), batch_items in batches.items():
+        detected = {}
+        for batch_item in batch_items:
+            detected.update(batch_item['detected'])
+        first = min(batch_items, key=lambda batch_item: batch_item['entry_time'])
+        try:
+            # Concurrent invocations upserting the same batch can deadlock; db.run repeats the batch when they do
+            with metrics.span('db_batch'):
+                if db.run(lambda conn, cursor: process_batch(conn, cursor, device_id, batch_id, first['date'],
+                                                             first['entry_time'], detected),
+                          dictionary=True):
+                    exits += 1
+        except Exception as e:
+            # Log any errors encountered when interacting with the database
+            logger.error("Database error for device_id=%s, batch_id=%s: %s", device_id, batch_id, e)
+            failed_ids.update(batch_item['item_id'] for batch_item in batch_items)
+
+    db.log_stats()
+    detection_cache.log_stats()
+    metrics.record('invocation', (time.perf_counter() - invocation_start) * 1000)
+    metrics.count('objects', len(items))
+    metrics.count('failed_records', len(failed_ids))
+    metrics.flush(batches=len(batches), exits=exits)
+
+    failures = [{'itemIdentifier': item_id} for item_id in sorted(failed_ids, key=str) if item_id is not None]
+    if None in failed_ids:
+        # Records delivered straight from S3 have no SQS message to retry, only Lambda's async retry of the
+        # whole event, which needs the invocation to fail
+        raise RuntimeError(f"{len(failed_ids)} records failed")
+    if items and mismatched == len(items):
         return {
             'statusCode': 400,
-            'body': 'Filename format mismatch'
+            'body': 'Filename format mismatch',
+            'batchItemFailures': failures
         }
-
-    # If the file name format is valid, extract components from the file name
-    if match:
-        device_id, batch_id, camera_number, year, month, date, hours, minutes, seconds = match.groups()
-        date=year+"-"+month+"-"+date
-        entry_time=hours+":"+minutes+":"+seconds
-
-    # Establish a connection to the MySQL database
-    conn = mysql.connector.connect(
-        host=DB_HOST,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        database=DB_DATABASE
-    )
-    # Create a cursor for executing database queries
-    cursor = conn.cursor(dictionary=True)
-    if camera_number == '1':
-        logger.info(f"Camera 1 detected. Processing image for exit: {file_name}")
-        exit_time = entry_time  # Assuming the photo name has the exit time in the same format
-
-        extracted_text = detect_photo_id_text(bucket_name, file_name)
-        if not extracted_text:
-            logger.error("Failed to extract text for exit processing.")
-        else:
-            if process_exit(conn,cursor, device_id, extracted_text, exit_time):
-                logger.info("Exit processed successfully.")
-                cursor.close()
-                conn.close()
-                return {
-                    'statusCode': 200,
-                    'body': 'Exit processed successfully.'
-                }
-            else:
-                logger.info("Exit workflow did not find a match. Continuing with usual workflow.")
+    if failed_ids:
+        return {
+            'statusCode': 500,
+            'body': f"{len(failed_ids)} records failed",
+            'batchItemFailures': failures
+        }
+    if exits and exits == len(batches):
+        body = 'Exit processed successfully.'
     else:
-        try:
-            # Perform the database update or insertion based on the detected information
-            update_or_insert_db(cursor, conn, device_id, batch_id, camera_number, bucket_name, file_name,date, entry_time)
-            
-        except Exception as e:
-            # Log any errors encountered when interacting with the database
-            logger.error(f"Database error: {str(e)}")
-        
-        finally:
-            # Close the cursor and database connection
-            cursor.close()
-            conn.close()
-            logger.info("Cursor and connection closed.") 
-    try:
-        # Perform the database update or insertion based on the detected information
-        update_or_insert_db(cursor, conn, device_id, batch_id, camera_number, bucket_name, file_name,date, entry_time)
-            
-    except Exception as e:
-        # Log any errors encountered when interacting with the database
-        logger.error(f"Database error: {str(e)}")
-        
-    finally:
-        # Close the cursor and database connection
-        cursor.close()
-        conn.close()
-        logger.info("Cursor and connection closed.")
-        
+        body = 'Data Processed Successfully!'
     # Return a successful response after processing the data
     return {
         'statusCode': 200,
-        'body': 'Data Processed Successfully!'
+        'body': body,
+        'batchItemFailures': failures
     }
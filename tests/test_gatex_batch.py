@@ -0,0 +1,112 @@
+"""
+Batch archive round-trip between the Pi writer and the Lambda reader, and
+rejection of malformed archives. Run from the repository root with
+``python -m pytest``.
+"""
+import json
+import os
+import zipfile
+from io import BytesIO
+
+import pytest
+
+from gatex_batch import (BATCH_KEY_PATTERN, MANIFEST_NAME, BatchFormatError, batch_key,
+                         read_batch_archive, write_batch_archive)
+
+TIMESTAMP = '2024_01_01_08_00_00'
+
+
+@pytest.fixture
+def images(tmp_path):
+    paths = {}
+    for camera in ('camera1', 'camera2', 'camera3'):
+        path = tmp_path / f"000111batch7{camera}_{TIMESTAMP}.jpeg"
+        path.write_bytes(b'\xff\xd8' + camera.encode() + b'\xff\xd9')
+        paths[camera] = str(path)
+    return paths
+
+
+def archive_bytes(files):
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def manifest(**fields):
+    return json.dumps(dict({'version': 1, 'device_id': '000111', 'batch_id': 7,
+                            'timestamp': TIMESTAMP, 'images': []}, **fields))
+
+
+def test_batch_key_matches_lambda_pattern():
+    match = BATCH_KEY_PATTERN.search(batch_key('000111', 7, TIMESTAMP))
+
+    assert match.groups() == ('000111', '7', '2024', '01', '01', '08', '00', '00')
+
+
+def test_archive_round_trip(images, tmp_path):
+    path = write_batch_archive(str(tmp_path), '000111', 7, TIMESTAMP, images)
+
+    assert os.path.basename(path) == batch_key('000111', 7, TIMESTAMP)
+    assert not os.path.exists(path + '.tmp')
+    with open(path, 'rb') as file:
+        manifest, read_images = read_batch_archive(file.read())
+
+    assert manifest['device_id'] == '000111'
+    assert manifest['batch_id'] == 7
+    assert manifest['timestamp'] == TIMESTAMP
+    assert [entry['camera'] for entry in manifest['images']] == ['camera1', 'camera2', 'camera3']
+    assert sorted(read_images) == ['1', '2', '3']
+    for camera, image_path in images.items():
+        with open(image_path, 'rb') as file:
+            assert read_images[camera[-1]] == file.read()
+
+
+def test_images_are_stored_uncompressed(images, tmp_path):
+    path = write_batch_archive(str(tmp_path), '000111', 7, TIMESTAMP, images)
+
+    with zipfile.ZipFile(path) as archive:
+        assert {info.compress_type for info in archive.infolist()} == {zipfile.ZIP_STORED}
+        assert archive.namelist()[-1] == MANIFEST_NAME
+
+
+def test_truncated_archive_is_rejected(images, tmp_path):
+    path = write_batch_archive(str(tmp_path), '000111', 7, TIMESTAMP, images)
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    with pytest.raises(BatchFormatError):
+        read_batch_archive(data[:len(data) // 2])
+
+
+def test_archive_without_manifest_is_rejected():
+    data = archive_bytes({f"000111batch7camera1_{TIMESTAMP}.jpeg": b'jpeg'})
+
+    with pytest.raises(BatchFormatError):
+        read_batch_archive(data)
+
+
+def test_unknown_manifest_version_is_rejected():
+    data = archive_bytes({MANIFEST_NAME: manifest(version=2)})
+
+    with pytest.raises(BatchFormatError, match="Unsupported manifest version"):
+        read_batch_archive(data)
+
+
+def test_unexpected_image_name_is_rejected():
+    data = archive_bytes({
+        'photo.jpeg': b'jpeg',
+        MANIFEST_NAME: manifest(images=[{'camera': 'camera1', 'name': 'photo.jpeg', 'size': 4}]),
+    })
+
+    with pytest.raises(BatchFormatError, match="Unexpected image name"):
+        read_batch_archive(data)
+
+
+def test_image_missing_from_archive_is_rejected():
+    name = f"000111batch7camera1_{TIMESTAMP}.jpeg"
+    data = archive_bytes({MANIFEST_NAME: manifest(images=[{'camera': 'camera1', 'name': name, 'size': 4}])})
+
+    with pytest.raises(BatchFormatError):
+        read_batch_archive(data)
@@ -0,0 +1,183 @@
+"""
+DetectionCache against a stub S3 client: the in-memory tier, ETag-based
+image identity, the durable sidecar tier and falling back to a plain call
+when S3 misbehaves. Run from the repository root with ``python -m pytest``.
+"""
+import io
+
+import pytest
+
+from gatex_cache import DetectionCache
+
+
+class NoSuchKey(Exception):
+    pass
+
+
+class StubS3:
+    class exceptions:
+        NoSuchKey = NoSuchKey
+
+    def __init__(self):
+        self.objects = {}
+        self.etags = {}
+        self.calls = []
+        self.error = None
+
+    def _call(self, operation):
+        self.calls.append(operation)
+        if self.error:
+            raise self.error
+
+    def head_object(self, Bucket, Key):
+        self._call('head_object')
+        return {'ETag': f'"{self.etags[(Bucket, Key)]}"'}
+
+    def get_object(self, Bucket, Key):
+        self._call('get_object')
+        if (Bucket, Key) not in self.objects:
+            raise NoSuchKey(Key)
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._call('put_object')
+        self.objects[(Bucket, Key)] = Body.encode()
+
+
+class Detector:
+    """Stands in for a Rekognition call and counts how often it runs."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {'TextDetections': [{'DetectedText': 'KA01AB1234'}],
+                'ResponseMetadata': {'RequestId': f"request-{self.calls}"}}
+
+
+@pytest.fixture
+def s3():
+    s3 = StubS3()
+    s3.etags[('gatex-uploads', 'plate.jpeg')] = 'etag-1'
+    return s3
+
+
+@pytest.fixture
+def detector():
+    return Detector()
+
+
+def test_repeat_call_is_served_from_memory(s3, detector):
+    cache = DetectionCache(s3)
+
+    first = cache.get_or_call('detect_text', 'gatex-uploads', 'plate.jpeg', None, detector)
+    second = cache.get_or_call('detect_text', 'gatex-uploads', 'plate.jpeg', None, detector)
+
+    assert detector.calls == 1
+    assert first == second == {'TextDetections': [{'DetectedText': 'KA01AB1234'}]}
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert s3.calls == ['head_object']
+
+
+def test_operations_are_cached_separately(s3, detector):
+    cache = DetectionCache(s3)
+
+    cache.get_or_call('detect_text', 'gatex-uploads', 'plate.jpeg', None, detector)
+    cache.get_or_call('detect_faces', 'gatex-uploads', 'plate.jpeg', None, detector)
+
+    assert detector.calls == 2
+
+
+def test_etag_from_event_skips_head_object(s3, detector):
+    cache = DetectionCache(s3)
+    cache.remember_etag('gatex-uploads', 'plate.jpeg', '"etag-1"')
+
+    cache.get_or_call('detect_text', 'gatex-uploads', 'plate.jpeg', None, detector)
+
+    assert s3.calls == []
+    assert cache.cache_key('detect_text', 'gatex-uploads', 'plate.jpeg') == \
+        'detect_text/gatex-uploads/plate.jpeg@etag-1'
+
+
+def test_overwritten_object_is_not_served_stale(s3, detector):
+    cache = DetectionCache(s3)
+    cache.remember_etag('gatex-uploads', 'plate.jpeg', 'etag-1')
+    cache.get_or_call('detect_text', 'gatex-uploads', 'plate.jpeg', None, detector)
+
+    cache.remember_etag('gatex-uploads', 'plate.jpeg', 'etag-2')
+    cache.get_or_call('detect_text', 'gatex-uploads', 'plate.jpeg', None, detector)
+
+    assert detector.calls == 2
+
+
+def test_inline_bytes_are_keyed_by_content(s3, detector):
+    cache = DetectionCache(s3)
+
+    cache.get_or_call('detect_text', 'gatex-uploads', 'a.jpeg', b'jpeg', detector)
+    cache.get_or_call('detect_text', 'gatex-uploads', 'b.jpeg', b'jpeg', detector)
+    cache.get_or_call('detect_text', 'gatex-uploads', 'a.jpeg', b'other', detector)
+
+    assert detector.calls == 2
+    assert s3.calls == []
+
+
+def test_sidecar_survives_a_new_invocation(s3, detector):
+    warm = DetectionCache(s3, sidecar_bucket='gatex-cache')
+    warm.get_or_call('detect_text', 'gatex-uploads', 'plate.jpeg', None, detector)
+
+    cold = DetectionCache(s3, sidecar_bucket='gatex-cache')
+    result = cold.get_or_call('detect_text', 'gatex-uploads', 'plate.jpeg', None, detector)
+
+    assert detector.calls == 1
+    assert result == {'TextDetections': [{'DetectedText': 'KA01AB1234'}]}
+    assert (cold.hits, cold.durable_hits, cold.misses) == (0, 1, 0)
+    assert all(key.startswith('detection-cache/') for bucket, key in s3.objects)
+
+
+def test_begin_invocation_clears_memory_and_counters(s3, detector):
+    cache = DetectionCache(s3)
+    cache.get_or_call('detect_text', 'gatex-uploads', 'plate.jpeg', None, detector)
+
+    cache.begin_invocation()
+    cache.get_or_call('detect_text', 'gatex-uploads', 'plate.jpeg', None, detector)
+
+    assert detector.calls == 2
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_failing_head_object_calls_through(s3, detector):
+    s3.error = ConnectionError("Could not connect to the endpoint URL")
+    cache = DetectionCache(s3)
+
+    cache.get_or_call('detect_text', 'gatex-uploads', 'plate.jpeg', None, detector)
+    cache.get_or_call('detect_text', 'gatex-uploads', 'plate.jpeg', None, detector)
+
+    assert detector.calls == 2
+    assert cache.misses == 2
+
+
+def test_failing_sidecar_falls_back_to_detector(s3, detector):
+    cache = DetectionCache(s3, sidecar_bucket='gatex-cache')
+    cache.remember_etag('gatex-uploads', 'plate.jpeg', 'etag-1')
+    s3.error = ConnectionError("Could not connect to the endpoint URL")
+
+    result = cache.get_or_call('detect_text', 'gatex-uploads', 'plate.jpeg', None, detector)
+
+    assert detector.calls == 1
+    assert result == {'TextDetections': [{'DetectedText': 'KA01AB1234'}]}
+    assert s3.calls == ['get_object', 'put_object']
+
+
+def test_detector_errors_are_not_cached(s3):
+    cache = DetectionCache(s3)
+
+    def throttled():
+        raise RuntimeError("ThrottlingException")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_call('detect_text', 'gatex-uploads', 'plate.jpeg', None, throttled)
+    detector = Detector()
+    cache.get_or_call('detect_text', 'gatex-uploads', 'plate.jpeg', None, detector)
+
+    assert detector.calls == 1
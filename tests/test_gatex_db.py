@@ -0,0 +1,193 @@
+"""
+ConnectionManager against a fake DB-API connection: reuse across warm
+invocations, the idle ping and reconnect, and dropping a connection whose
+rollback fails. Run from the repository root with ``python -m pytest``.
+"""
+import pytest
+
+import gatex_db
+from gatex_db import ConnectionManager
+
+
+class FakeError(Exception):
+    def __init__(self, message, errno=None):
+        super().__init__(message)
+        self.errno = errno
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self):
+        self.pings = 0
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = False
+        self.ping_error = None
+        self.rollback_error = None
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if self.ping_error:
+            raise self.ping_error
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+        if self.rollback_error:
+            raise self.rollback_error
+
+    def close(self):
+        self.closed = True
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(gatex_db.time, 'monotonic', clock)
+    monkeypatch.setattr(gatex_db.time, 'sleep', lambda seconds: None)
+    return clock
+
+
+@pytest.fixture
+def opened():
+    return []
+
+
+@pytest.fixture
+def manager(clock, opened):
+    def connect(**kwargs):
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+    return ConnectionManager(connect=connect, ping_after=5.0)
+
+
+def test_connection_is_reused_across_invocations(manager, opened):
+    for _ in range(3):
+        with manager.transaction() as (conn, cursor):
+            pass
+
+    assert len(opened) == 1
+    assert opened[0].commits == 3
+    assert manager.connects == 1
+    assert manager.reuses == 2
+
+
+def test_recently_used_connection_is_not_pinged(manager, opened, clock):
+    with manager.transaction():
+        pass
+    clock.now += 4.0
+    with manager.transaction():
+        pass
+
+    assert opened[0].pings == 0
+
+
+def test_idle_connection_is_pinged_and_kept_when_alive(manager, opened, clock):
+    with manager.transaction():
+        pass
+    clock.now += 60.0
+    with manager.transaction() as (conn, cursor):
+        assert conn is opened[0]
+
+    assert opened[0].pings == 1
+    assert len(opened) == 1
+
+
+def test_idle_connection_that_fails_ping_is_replaced(manager, opened, clock):
+    with manager.transaction():
+        pass
+    opened[0].ping_error = FakeError("MySQL server has gone away")
+    clock.now += 60.0
+    with manager.transaction() as (conn, cursor):
+        assert conn is opened[1]
+
+    assert opened[0].closed
+    assert manager.connects == 2
+
+
+def test_error_rolls_back_and_keeps_connection(manager, opened):
+    with pytest.raises(ValueError):
+        with manager.transaction():
+            raise ValueError("bad record")
+    with manager.transaction() as (conn, cursor):
+        assert conn is opened[0]
+
+    assert opened[0].rollbacks == 1
+    assert opened[0].commits == 1
+
+
+def test_connection_is_discarded_when_rollback_fails(manager, opened):
+    with pytest.raises(ValueError):
+        with manager.transaction():
+            opened[0].rollback_error = FakeError("Lost connection during query")
+            raise ValueError("bad record")
+
+    assert opened[0].closed
+    with manager.transaction() as (conn, cursor):
+        assert conn is opened[1]
+
+
+def test_cursor_is_closed_after_transaction(manager):
+    with manager.transaction() as (conn, cursor):
+        pass
+
+    assert cursor.closed
+
+
+def test_run_retries_deadlocks(manager, opened):
+    attempts = []
+
+    def work(conn, cursor):
+        attempts.append(conn)
+        if len(attempts) < 3:
+            raise FakeError("Deadlock found when trying to get lock", errno=1213)
+        return 'done'
+
+    assert manager.run(work) == 'done'
+    assert len(attempts) == 3
+    assert manager.deadlocks == 2
+    assert opened[0].rollbacks == 2
+    assert opened[0].commits == 1
+
+
+def test_run_gives_up_after_deadlock_retries(manager):
+    def work(conn, cursor):
+        raise FakeError("Lock wait timeout exceeded", errno=1205)
+
+    with pytest.raises(FakeError):
+        manager.run(work)
+    assert manager.deadlocks == manager.deadlock_retries
+
+
+def test_run_does_not_retry_other_errors(manager):
+    attempts = []
+
+    def work(conn, cursor):
+        attempts.append(1)
+        raise FakeError("Duplicate entry", errno=1062)
+
+    with pytest.raises(FakeError):
+        manager.run(work)
+    assert len(attempts) == 1
@@ -0,0 +1,63 @@
+"""
+ButtonTrigger debounce and stale press handling with SimulatedTrigger and a
+fake clock. Run from the repository root with ``python -m pytest``.
+"""
+import pytest
+
+import gatex_gpio
+from gatex_gpio import SimulatedTrigger
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(gatex_gpio.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_bounce_within_window_is_one_press(clock):
+    trigger = SimulatedTrigger(debounce=0.2)
+    trigger.press()
+    clock[0] += 0.05
+    trigger.press()
+
+    assert trigger.presses.qsize() == 1
+
+
+def test_fresh_press_is_returned(clock):
+    trigger = SimulatedTrigger(debounce=0.2)
+    trigger.press()
+    clock[0] += 0.5
+
+    assert trigger.wait(timeout=0, max_age=1.0).pressed_at == 1000.0
+
+
+def test_presses_queued_during_capture_are_discarded(clock):
+    trigger = SimulatedTrigger(debounce=0.2)
+    trigger.press()
+    clock[0] += 0.5
+    trigger.press()
+    clock[0] += 2.0
+    trigger.press()
+
+    press = trigger.wait(timeout=0, max_age=1.0)
+
+    assert press.pressed_at == 1002.5
+    assert trigger.stale_presses == 2
+
+
+def test_only_stale_presses_times_out(clock):
+    trigger = SimulatedTrigger(debounce=0.2)
+    trigger.press()
+    clock[0] += 5.0
+
+    assert trigger.wait(timeout=0, max_age=1.0) is None
+    assert trigger.stale_presses == 1
+
+
+def test_without_max_age_every_press_is_returned(clock):
+    trigger = SimulatedTrigger(debounce=0.2)
+    trigger.press()
+    clock[0] += 5.0
+
+    assert trigger.wait(timeout=0) is not None
@@ -0,0 +1,152 @@
+"""
+SesSender and RateLimiter against a stub SES client and a fake clock:
+throttling retries with backoff, permanent failures recorded on the email,
+and the token bucket holding the send rate. Run from the repository root
+with ``python -m pytest``.
+"""
+import threading
+
+import pytest
+
+import gatex_mailer
+from gatex_mailer import Email, RateLimiter, SesSender
+
+
+class ClientError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code, 'Message': code}}
+
+
+class StubSES:
+    """Sends succeed unless ``errors`` maps a recipient to codes to raise first."""
+
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.sent = []
+        self.attempts = []
+        self._lock = threading.Lock()
+
+    def send_email(self, Source, Destination, Message):
+        recipient = Destination['ToAddresses'][0]
+        with self._lock:
+            self.attempts.append(recipient)
+            codes = self.errors.get(recipient)
+            if codes:
+                raise ClientError(codes.pop(0))
+            self.sent.append((recipient, Message['Subject']['Data']))
+            return {'MessageId': f"stub-{len(self.sent)}"}
+
+
+class Clock:
+    """Fake monotonic clock that ``time.sleep`` advances."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(gatex_mailer.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(gatex_mailer.time, 'sleep', clock.sleep)
+    monkeypatch.setattr(gatex_mailer.random, 'uniform', lambda low, high: high)
+    return clock
+
+
+def emails(*recipients):
+    return [Email(recipient, f"Overstay alert for {recipient}", "Visitor has overstayed.")
+            for recipient in recipients]
+
+
+def test_all_emails_are_sent(clock):
+    ses = StubSES()
+    sender = SesSender(ses, 'gate@example.com', max_rate=100.0)
+
+    result = sender.send_all(emails('a@example.com', 'b@example.com', 'c@example.com'))
+
+    assert all(email.sent for email in result)
+    assert sorted(recipient for recipient, subject in ses.sent) == \
+        ['a@example.com', 'b@example.com', 'c@example.com']
+
+
+def test_empty_list_sends_nothing(clock):
+    assert SesSender(StubSES(), 'gate@example.com').send_all([]) == []
+
+
+def test_throttled_email_is_retried_with_backoff(clock):
+    ses = StubSES({'a@example.com': ['Throttling', 'MaxSendingRateExceeded']})
+    sender = SesSender(ses, 'gate@example.com', max_rate=100.0, workers=1, base_backoff=0.5)
+
+    [email] = sender.send_all(emails('a@example.com'))
+
+    assert email.sent
+    assert ses.attempts == ['a@example.com'] * 3
+    assert clock.sleeps == [0.5, 1.0]
+
+
+def test_throttling_gives_up_after_max_attempts(clock):
+    ses = StubSES({'a@example.com': ['Throttling'] * 5})
+    sender = SesSender(ses, 'gate@example.com', max_rate=100.0, workers=1, max_attempts=3)
+
+    [email] = sender.send_all(emails('a@example.com'))
+
+    assert not email.sent
+    assert gatex_mailer.error_code(email.error) == 'Throttling'
+    assert len(ses.attempts) == 3
+
+
+def test_permanent_error_is_recorded_not_retried(clock):
+    ses = StubSES({'bad@example.com': ['MessageRejected']})
+    sender = SesSender(ses, 'gate@example.com', max_rate=100.0)
+
+    bad, good = sender.send_all(emails('bad@example.com', 'good@example.com'))
+
+    assert not bad.sent
+    assert gatex_mailer.error_code(bad.error) == 'MessageRejected'
+    assert ses.attempts.count('bad@example.com') == 1
+    assert good.sent
+
+
+def test_rate_limiter_allows_a_burst_then_paces(clock):
+    limiter = RateLimiter(2.0)
+
+    limiter.acquire()
+    limiter.acquire()
+    assert clock.sleeps == []
+
+    limiter.acquire()
+    assert clock.sleeps == [0.5]
+
+
+def test_rate_limiter_refills_while_idle(clock):
+    limiter = RateLimiter(2.0)
+    limiter.acquire()
+    limiter.acquire()
+
+    clock.now += 10.0
+    limiter.acquire()
+    limiter.acquire()
+
+    # The bucket never holds more than one second's worth of tokens
+    assert clock.sleeps == []
+    limiter.acquire()
+    assert clock.sleeps == [0.5]
+
+
+def test_sender_respects_max_rate(clock):
+    ses = StubSES()
+    sender = SesSender(ses, 'gate@example.com', max_rate=2.0, workers=1)
+
+    sender.send_all(emails(*(f"{i}@example.com" for i in range(6))))
+
+    # Two go out at once, the other four wait half a second each
+    assert clock.now - 1000.0 == pytest.approx(2.0)
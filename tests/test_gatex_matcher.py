@@ -0,0 +1,100 @@
+"""
+ExitMatcher.pick on hand-built trigram indexes: OCR misreads are matched,
+similar names of different people and ambiguous probes are not, and the
+batch being processed is never its own exit. Run from the repository root
+with ``python -m pytest``.
+"""
+import pytest
+
+import gatex_matcher
+from gatex_matcher import ExitMatcher, TrigramIndex
+
+
+def index_of(visits):
+    index = TrigramIndex()
+    for visit_id, name in visits.items():
+        index.add(visit_id, name)
+    return index
+
+
+@pytest.fixture
+def matcher():
+    return ExitMatcher()
+
+
+@pytest.mark.parametrize('probe', [
+    'RAJESHKUMAR',
+    'RAJE5HKUMAR',  # folded digit
+    'RAJESHKUMAP',  # confusable letter
+    'RAJESHKMAR',   # dropped letter in a full-length key
+])
+def test_misread_of_open_visit_is_matched(matcher, probe):
+    index = index_of({'12': 'RAJESHKUMAR', '13': 'PRIYA'})
+
+    assert [visit_id for score, visit_id in matcher.pick(index, probe)] == ['12']
+
+
+def test_confusable_swap_matches_short_name(matcher):
+    index = index_of({'12': 'PRIYA'})
+
+    assert matcher.pick(index, 'RRIYA') == [(1.0, '12')]
+
+
+@pytest.mark.parametrize('name, probe', [
+    ('MOHAMMED', 'MOHAMMAD'),
+    ('ANITA', 'ANKITA'),
+])
+def test_similar_name_of_another_person_is_not_matched(matcher, name, probe):
+    assert matcher.pick(index_of({'12': name}), probe) == []
+
+
+def test_short_name_is_never_matched_fuzzily(matcher):
+    assert len('ALI') < gatex_matcher.MIN_FUZZY_LENGTH
+    assert matcher.pick(index_of({'12': 'ALI'}), 'ALI') == []
+
+
+def test_ambiguous_probe_is_not_matched(matcher):
+    index = index_of({'12': 'RAJESHKUMAR', '13': 'RAJESHKUMAP'})
+
+    assert matcher.pick(index, 'RAJESHKUMAB') == []
+
+
+def test_same_name_open_twice_picks_latest_visit(matcher):
+    index = index_of({'9': 'RAJESHKUMAR', '10': 'RAJESHKUMAR'})
+
+    assert matcher.pick(index, 'RAJE5HKUMAR') == [(1.0, '10')]
+
+
+def test_current_batch_is_excluded(matcher):
+    assert matcher.pick(index_of({'12': 'RAJESHKUMAR'}), 'RAJESHKUMAR', exclude=12) == []
+
+    index = index_of({'11': 'RAJESHKUMAR', '12': 'RAJESHKUMAR'})
+    assert matcher.pick(index, 'RAJESHKUMAR', exclude=12) == [(1.0, '11')]
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    def execute(self, query, params=None):
+        self.queries += 1
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_candidates_keeps_index_between_calls(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(gatex_matcher.time, 'monotonic', lambda: now[0])
+    matcher = ExitMatcher(refresh_seconds=300.0)
+    cursor = FakeCursor([{'batch_id': 12, 'name_key': 'RAJESHKUMAR'}])
+
+    assert matcher.candidates(cursor, '000111', 'RAJE5HKUMAR') == [(1.0, '12')]
+    matcher.visit_closed('000111', 12)
+    assert matcher.candidates(cursor, '000111', 'RAJE5HKUMAR') == []
+    assert cursor.queries == 1
+
+    now[0] += 301.0
+    assert matcher.candidates(cursor, '000111', 'RAJE5HKUMAR') == [(1.0, '12')]
+    assert cursor.queries == 2
@@ -0,0 +1,47 @@
+"""
+QualityGate's double press decision from per-camera verdicts: a batch is
+only dropped when enough cameras agree it repeats the previous one. Run from
+the repository root with ``python -m pytest``.
+"""
+import pytest
+
+from gatex_quality import QualityGate, QualityVerdict
+
+
+def verdict(repeat):
+    return QualityVerdict(None, 120.0, 300.0, 0, 0.002, repeat=repeat)
+
+
+@pytest.fixture
+def gate():
+    return QualityGate()
+
+
+def test_all_checked_cameras_repeating_is_a_double_press(gate):
+    verdicts = [verdict(None), verdict(True), verdict(True)]
+
+    assert gate.is_double_press(verdicts)
+    assert not gate.is_suspected_repeat(verdicts)
+
+
+@pytest.mark.parametrize('verdicts', [
+    [verdict(None), verdict(True)],                 # camera3 not connected
+    [verdict(None), verdict(True), None],           # camera3 failed
+    [verdict(None), verdict(True), verdict(False)],  # cameras disagree
+])
+def test_repeat_without_quorum_is_only_suspected(gate, verdicts):
+    assert not gate.is_double_press(verdicts)
+    assert gate.is_suspected_repeat(verdicts)
+
+
+def test_fresh_batch_is_neither(gate):
+    verdicts = [verdict(None), verdict(False), verdict(False)]
+
+    assert not gate.is_double_press(verdicts)
+    assert not gate.is_suspected_repeat(verdicts)
+
+
+def test_single_camera_quorum_can_be_configured():
+    gate = QualityGate(min_repeat_cameras=1)
+
+    assert gate.is_double_press([verdict(None), verdict(True)])
@@ -0,0 +1,209 @@
+"""
+UploadSpool against a stub S3 client: ID card priority, backoff after a
+failed upload, deleting only after S3 accepted a file, rebuilding the index
+and capture throttling. Run from the repository root with ``python -m pytest``.
+"""
+import json
+import os
+
+import pytest
+
+import gatex_spool
+from gatex_spool import INDEX_FILE, UploadSpool
+
+
+class StubS3:
+    """Records uploads; ``failures`` makes the next N calls raise."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.uploaded = []
+        self.present_during_upload = []
+
+    def upload_file(self, filename, bucket, key):
+        self.present_during_upload.append(os.path.exists(filename))
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Could not connect to the endpoint URL")
+        self.uploaded.append((bucket, key))
+
+
+def capture(directory, name, data=b'jpeg'):
+    path = os.path.join(str(directory), name)
+    with open(path, 'wb') as file:
+        file.write(data)
+    return path
+
+
+def read_index(spool_dir):
+    with open(os.path.join(str(spool_dir), INDEX_FILE)) as file:
+        return json.load(file)
+
+
+@pytest.fixture
+def s3():
+    return StubS3()
+
+
+@pytest.fixture
+def spool_dir(tmp_path):
+    return str(tmp_path / 'spool')
+
+
+@pytest.fixture
+def spool(spool_dir, s3):
+    spool = UploadSpool(spool_dir, s3, 'gatex-uploads', workers=1)
+    yield spool
+    spool.stop(timeout=5)
+
+
+def upload_next(spool):
+    """Run one worker step synchronously."""
+    with spool._cond:
+        name, _ = spool._next_due()
+        spool._in_flight.add(name)
+        entry = dict(spool._entries[name])
+    spool._upload(name, entry)
+    return name
+
+
+def test_id_card_is_uploaded_first(spool, s3, tmp_path):
+    spool.enqueue(capture(tmp_path, '000111batch7camera2_2024_01_01_08_00_00.jpeg'))
+    spool.enqueue(capture(tmp_path, '000111batch7camera3_2024_01_01_08_00_00.jpeg'))
+    spool.enqueue(capture(tmp_path, '000111batch7camera1_2024_01_01_08_00_00.jpeg'))
+
+    spool.start()
+    assert spool.drain(timeout=5)
+
+    keys = [key for bucket, key in s3.uploaded]
+    assert keys[0] == '000111batch7camera1_2024_01_01_08_00_00.jpeg'
+    assert keys[1:] == ['000111batch7camera2_2024_01_01_08_00_00.jpeg',
+                        '000111batch7camera3_2024_01_01_08_00_00.jpeg']
+
+
+def test_failed_upload_is_kept_and_backed_off(spool, s3, spool_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(gatex_spool.random, 'uniform', lambda low, high: high)
+    monkeypatch.setattr(gatex_spool.time, 'time', lambda: 1000.0)
+    s3.failures = 1
+    spool.enqueue(capture(tmp_path, '000111batch7camera1_2024_01_01_08_00_00.jpeg'))
+
+    name = upload_next(spool)
+
+    assert os.path.exists(os.path.join(spool_dir, name))
+    entry = read_index(spool_dir)[name]
+    assert entry['attempts'] == 1
+    assert entry['next_attempt'] == 1000.0 + spool.base_backoff
+    # Not due again until the backoff has passed
+    with spool._cond:
+        assert spool._next_due() == (None, spool.base_backoff)
+
+
+def test_backoff_doubles_and_is_capped(spool, s3, tmp_path, monkeypatch):
+    monkeypatch.setattr(gatex_spool.random, 'uniform', lambda low, high: high)
+    monkeypatch.setattr(gatex_spool.time, 'time', lambda: 1000.0)
+    spool.max_backoff = 5.0
+    s3.failures = 3
+    spool.enqueue(capture(tmp_path, '000111batch7camera2_2024_01_01_08_00_00.jpeg'))
+
+    delays = []
+    for _ in range(3):
+        name = upload_next(spool)
+        delays.append(spool._entries[name]['next_attempt'] - 1000.0)
+        spool._entries[name]['next_attempt'] = 0.0
+
+    assert delays == [2.0, 4.0, 5.0]
+
+
+def test_file_is_deleted_only_after_upload(spool, s3, spool_dir, tmp_path):
+    spool.enqueue(capture(tmp_path, '000111batch7camera1_2024_01_01_08_00_00.jpeg'))
+
+    name = upload_next(spool)
+
+    assert s3.present_during_upload == [True]
+    assert s3.uploaded == [('gatex-uploads', name)]
+    assert not os.path.exists(os.path.join(spool_dir, name))
+    assert read_index(spool_dir) == {}
+    assert spool.depth() == 0
+
+
+def test_corrupt_index_is_rebuilt_from_directory(spool_dir, s3):
+    os.makedirs(spool_dir)
+    capture(spool_dir, '000111batch7camera1_2024_01_01_08_00_00.jpeg')
+    capture(spool_dir, '000111batch7camera2_2024_01_01_08_00_00.jpeg')
+    with open(os.path.join(spool_dir, INDEX_FILE), 'w') as file:
+        file.write('{"000111batch7camera1_2024_01_01_08_0')
+
+    spool = UploadSpool(spool_dir, s3, 'gatex-uploads')
+
+    assert spool.depth() == 2
+    assert spool._entries['000111batch7camera1_2024_01_01_08_00_00.jpeg']['priority'] == gatex_spool.PRIORITY_ID_CARD
+    assert spool._entries['000111batch7camera2_2024_01_01_08_00_00.jpeg']['priority'] == gatex_spool.PRIORITY_DEFAULT
+
+
+def test_missing_index_adopts_files_and_skips_partial_writes(spool_dir, s3):
+    os.makedirs(spool_dir)
+    capture(spool_dir, '000111batch7camera2_2024_01_01_08_00_00.jpeg')
+    capture(spool_dir, INDEX_FILE + '.tmp', b'{}')
+
+    spool = UploadSpool(spool_dir, s3, 'gatex-uploads')
+
+    assert list(spool._entries) == ['000111batch7camera2_2024_01_01_08_00_00.jpeg']
+
+
+def test_index_entries_without_file_are_dropped(spool_dir, s3):
+    uploaded = '000111batch6camera2_2024_01_01_07_00_00.jpeg'
+    pending = '000111batch7camera2_2024_01_01_08_00_00.jpeg'
+    os.makedirs(spool_dir)
+    capture(spool_dir, pending)
+    with open(os.path.join(spool_dir, INDEX_FILE), 'w') as file:
+        json.dump({
+            uploaded: UploadSpool._new_entry(uploaded),
+            pending: dict(UploadSpool._new_entry(pending), attempts=4),
+        }, file)
+
+    spool = UploadSpool(spool_dir, s3, 'gatex-uploads')
+
+    assert list(spool._entries) == [pending]
+    # Surviving entries keep their retry state
+    assert spool._entries[pending]['attempts'] == 4
+
+
+def test_adopt_spools_orphaned_captures(spool, spool_dir, tmp_path):
+    capture(tmp_path, '000111batch7camera1_2024_01_01_08_00_00.jpeg')
+    capture(tmp_path, '000111batch7camera2_2024_01_01_08_00_00.jpeg')
+    capture(tmp_path, 'notes.txt')
+
+    spool.adopt(str(tmp_path))
+
+    assert sorted(read_index(spool_dir)) == ['000111batch7camera1_2024_01_01_08_00_00.jpeg',
+                                             '000111batch7camera2_2024_01_01_08_00_00.jpeg']
+    assert not os.path.exists(tmp_path / '000111batch7camera1_2024_01_01_08_00_00.jpeg')
+    assert os.path.exists(tmp_path / 'notes.txt')
+
+
+def test_wait_for_capacity_returns_at_once_below_high_water(spool, monkeypatch):
+    monkeypatch.setattr(spool, 'disk_usage', lambda: 0.5)
+    monkeypatch.setattr(spool._cond, 'wait', lambda timeout=None: pytest.fail("should not wait"))
+
+    spool.wait_for_capacity()
+
+
+def test_wait_for_capacity_blocks_until_usage_drops(spool, monkeypatch):
+    readings = iter([0.95, 0.9, 0.86, 0.6])
+    monkeypatch.setattr(spool, 'disk_usage', lambda: next(readings))
+    waits = []
+    monkeypatch.setattr(spool._cond, 'wait', lambda timeout=None: waits.append(timeout))
+
+    spool.wait_for_capacity(poll_interval=0.5)
+
+    assert waits == [0.5, 0.5, 0.5]
+
+
+def test_wait_for_capacity_gives_up_when_stopped(spool, monkeypatch):
+    monkeypatch.setattr(spool, 'disk_usage', lambda: 0.99)
+
+    def wait(timeout=None):
+        spool._stopped = True
+    monkeypatch.setattr(spool._cond, 'wait', wait)
+
+    spool.wait_for_capacity()